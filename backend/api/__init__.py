@@ -1,3 +1,5 @@
 from .app import create_app, run_server
+from .event_bus import EventBus, event_bus
+from .finalize_job import FinalizeJob, FinalizeJobs, finalize_jobs
 
-__all__ = ['create_app', 'run_server']
+__all__ = ['create_app', 'run_server', 'EventBus', 'event_bus', 'FinalizeJob', 'FinalizeJobs', 'finalize_jobs']
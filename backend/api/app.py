@@ -1,17 +1,230 @@
 import os
+import threading
 import time
 import requests
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 from datetime import datetime
+from typing import Optional
+
+# Servidor WSGI de producción (opcional: sin él se usa el servidor de Werkzeug)
+try:
+    from waitress import serve as waitress_serve
+    WAITRESS_AVAILABLE = True
+except ImportError:
+    WAITRESS_AVAILABLE = False
 
 from ..camera_manager import camera_manager
 from ..video_processor import video_processor, VideoChunk
+from ..upload_manager import upload_manager
 from ..config.settings import SystemConfig, CameraConfig
+from ..metrics import metrics, format_metric
+from .event_bus import (event_bus, EVENT_CHUNK_FINALIZED, EVENT_CHUNK_UPLOADED, EVENT_UPLOAD_FAILED,
+                        EVENT_CAMERA_STALLED, EVENT_FPS_UPDATE, EVENT_SESSION_CANCELLED, EVENT_FINALIZE_PROGRESS)
+from .finalize_job import (FinalizeJob, finalize_jobs, STAGE_UPLOADING, STAGE_WAITING_SERVER,
+                           STAGE_NOTIFYING, JOB_COMPLETED, JOB_CANCELLED, JOB_FAILED)
 
 # Variable global para rastrear cancelaciones por fallo de cámaras
 camera_failure_detected = False
 
+EVENT_KEEPALIVE_SECONDS = 15  # Comentario SSE periódico: mantiene la conexión y detecta clientes desconectados
+CAMERA_MONITOR_INTERVAL = 1.0  # Periodo (s) de los eventos de FPS y de detección de cámaras detenidas
+PREVIEW_RESEND_SECONDS = 2.0  # Sin JPEG nuevo (cámara quieta), se reenvía el último para mantener viva la conexión
+PREVIEW_SNAPSHOT_WAIT_SECONDS = 1.0  # Espera máxima al primer JPEG de una instantánea si la vista previa estaba parada
+FINALIZE_POLL_SECONDS = 1.0  # Revisión del diario mientras se esperan confirmaciones (además de los avisos de envío)
+
+
+def _chunk_event_data(chunk: VideoChunk) -> dict:
+    """Datos de un chunk que se envían en los eventos"""
+    return {
+        'session_id': chunk.session_id,
+        'camera_id': chunk.camera_id,
+        'sequence_number': chunk.sequence_number,
+        'duration_seconds': round(chunk.duration_seconds, 3),
+        'frame_count': chunk.frame_count,
+        'file_size_bytes': chunk.file_size_bytes
+    }
+
+
+def _publish_job(job: FinalizeJob):
+    event_bus.publish(EVENT_FINALIZE_PROGRESS, **job.to_dict())
+
+
+def _notify_session_end(job: FinalizeJob) -> bool:
+    """Avisar al servidor del fin de sesión. Retorna True si lo aceptó"""
+    try:
+        url = f"{SystemConfig.SERVER.base_url}{SystemConfig.SERVER.session_end_endpoint}"
+        end_response = requests.post(url, json={
+            'session_id': job.session_id,
+            'patient_id': job.patient_id,
+            'final_chunks_count': job.final_chunks,
+            'chunks_acked': job.chunks_acked,
+            'chunks_failed': job.chunks_failed,
+            'reason': 'session_completed'
+        }, timeout=10)
+        
+        if end_response.status_code == 200:
+            print("Sesión finalizada correctamente en el servidor (datos preservados)")
+            return True
+        elif end_response.status_code == 400:
+            print("Info: No había sesión activa en el servidor para finalizar")
+        else:
+            print(f"Warning: Respuesta inesperada del servidor al finalizar: {end_response.status_code}")
+    except Exception as e:
+        print(f"Error notificando fin de sesión al servidor: {e}")
+    return False
+
+
+def _run_finalize_job(job: FinalizeJob, since: Optional[datetime]):
+    """Hilo de finalización: últimos chunks, espera de las confirmaciones del servidor y session_end"""
+    try:
+        final_chunks = video_processor.stop_recording()
+        job.update(final_chunks=len(final_chunks), stage=STAGE_UPLOADING)
+        
+        # Encolar los chunks finales en el mismo gestor que los chunks regulares (se envían en paralelo)
+        if final_chunks:
+            print(f"Enviando {len(final_chunks)} chunks finales al servidor...")
+            for chunk in final_chunks:
+                event_bus.publish(EVENT_CHUNK_FINALIZED, final=True, **_chunk_event_data(chunk))
+                if upload_manager.enqueue(chunk):
+                    print(f"Chunk final encolado: Cámara {chunk.camera_id}, Duración: {chunk.duration_seconds:.2f}s")
+        _publish_job(job)
+        
+        # En el diario antes de esperar: si el cliente se reinicia, se envía al arrancar
+        if job.session_id and job.patient_id:
+            upload_manager.remember_session_end(job.session_id, job.patient_id, since, job.final_chunks)
+        _finish_session(job, since)
+        
+    except Exception as e:
+        print(f"Error finalizando la sesión {job.session_id}: {e}")
+        job.update(state=JOB_FAILED, error=str(e))
+    finally:
+        if not video_processor.recording_active:
+            upload_manager.set_active_session(None)
+        _publish_job(job)
+
+
+def _finish_session(job: FinalizeJob, since: Optional[datetime]):
+    """Esperar las confirmaciones de los chunks de la sesión y enviar session_end"""
+    # session_end solo cuando el servidor ha confirmado (o rechazado) todos los chunks de la sesión.
+    # Sin conexión se sigue esperando: los chunks quedan en disco y salen cuando el servidor vuelve
+    while not job.done:
+        progress = upload_manager.session_progress(job.session_id, job.patient_id, since)
+        stage = STAGE_UPLOADING if upload_manager.server_online else STAGE_WAITING_SERVER
+        if job.update(stage=stage, chunks_total=progress['total'], chunks_acked=progress['acked'],
+                      chunks_failed=progress['failed']):
+            _publish_job(job)
+        if progress['pending'] == 0:
+            break
+        job.wait(FINALIZE_POLL_SECONDS)
+    if job.done:
+        return  # Sesión cancelada mientras se esperaban las confirmaciones
+    
+    job.update(stage=STAGE_NOTIFYING)
+    job.update(session_end_sent=_notify_session_end(job))
+    if job.session_id and job.patient_id:
+        upload_manager.forget_session_end(job.session_id, job.patient_id, since)
+    job.update(state=JOB_COMPLETED)
+    print(f"Sesión {job.session_id} finalizada: {job.chunks_acked} chunks confirmados, "
+          f"{job.chunks_failed} rechazados ({job.to_dict()['elapsed_seconds']}s)")
+
+
+def _run_resumed_session_end(job: FinalizeJob, since: Optional[datetime]):
+    """Hilo de un session_end que quedó pendiente en una ejecución anterior del cliente"""
+    try:
+        _finish_session(job, since)
+    except Exception as e:
+        print(f"Error finalizando la sesión {job.session_id}: {e}")
+        job.update(state=JOB_FAILED, error=str(e))
+    finally:
+        _publish_job(job)
+
+
+def _recover_pending_sessions():
+    """Al arrancar: reanudar los chunks sin confirmar y los session_end que quedaron sin enviar"""
+    upload_manager.recover_pending()
+    for session_id, patient_id, since, final_chunks in upload_manager.pending_session_ends():
+        job = finalize_jobs.create(session_id, patient_id)
+        job.update(final_chunks=final_chunks, stage=STAGE_UPLOADING)
+        print(f"Reanudando la finalización de la sesión {session_id} (session_end pendiente)")
+        threading.Thread(target=_run_resumed_session_end, args=(job, since), name=f"finalizar-{job.job_id}",
+                         daemon=True).start()
+
+
+def _poke_finalize_job(chunk: VideoChunk, response=None):
+    job = finalize_jobs.active(chunk.session_id)
+    if job is not None:
+        job.poke()
+
+
+def _cancel_finalize_job(session_id: Optional[str]):
+    """La sesión se canceló: su trabajo de finalización termina sin enviar session_end"""
+    job = finalize_jobs.active(session_id) if session_id else None
+    if job is not None:
+        job.update(state=JOB_CANCELLED)
+
+
+def _directory_bytes(path: str) -> int:
+    """Bytes ocupados por los archivos de un directorio (recursivo)"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # Chunk borrado mientras se recorría el directorio
+    return total
+
+
+def _collect_metrics() -> str:
+    """Histogramas del camino crítico y estado actual de cámaras, grabación, envíos y disco (texto de Prometheus)"""
+    health = dict(sorted(camera_manager.get_camera_health().items()))
+    frame_totals = dict(sorted(video_processor.get_frame_totals().items()))
+    upload_stats = upload_manager.get_stats()
+    
+    dropped = []
+    for camera_id, camera_health in health.items():
+        dropped.append(({'camera': camera_id, 'stage': 'device'}, camera_health['frames_dropped']))
+        dropped.append(({'camera': camera_id, 'stage': 'ring_buffer'}, camera_health['frames_overwritten']))
+    for camera_id, totals in frame_totals.items():
+        dropped.append(({'camera': camera_id, 'stage': 'pacing'}, totals['paced_dropped']))
+        dropped.append(({'camera': camera_id, 'stage': 'encoder_process'}, totals['encoder_dropped']))
+    
+    blocks = [
+        format_metric("camera_capture_fps", "FPS medido por cámara (ventana deslizante)", "gauge",
+                      [({'camera': camera_id}, h['measured_fps']) for camera_id, h in health.items()]),
+        format_metric("camera_frames_captured_total", "Frames capturados por cámara", "counter",
+                      [({'camera': camera_id}, h['frames_captured']) for camera_id, h in health.items()]),
+        format_metric("frames_dropped_total", "Frames perdidos por cámara y etapa", "counter", dropped),
+        format_metric("frames_duplicated_total", "Frames repetidos para completar la rejilla de ritmo constante",
+                      "counter", [({'camera': camera_id}, totals['paced_duplicated'])
+                                  for camera_id, totals in frame_totals.items()]),
+        format_metric("recording_active", "1 mientras hay una grabación en curso", "gauge",
+                      [({}, int(video_processor.recording_active))]),
+        format_metric("upload_queue_depth", "Chunks esperando en la cola de envío", "gauge",
+                      [({}, upload_stats['queued'])]),
+        format_metric("upload_in_flight", "Chunks enviándose en este momento", "gauge",
+                      [({}, upload_stats['in_flight'])]),
+        format_metric("upload_chunks_total", "Chunks confirmados y rechazados por el servidor", "counter",
+                      [({'result': 'uploaded'}, upload_stats['uploaded']), ({'result': 'failed'}, upload_stats['failed'])]),
+        format_metric("upload_retries_total", "Reintentos de envío", "counter", [({}, upload_stats['retries'])]),
+        format_metric("upload_bytes_total", "Bytes de video confirmados por el servidor", "counter",
+                      [({}, upload_stats['bytes_uploaded'])]),
+        format_metric("upload_batches_total", "Lotes por número de chunk confirmados y enviados por separado", "counter",
+                      [({'result': 'uploaded'}, upload_stats['batches_uploaded']),
+                       ({'result': 'fallback'}, upload_stats['batch_fallbacks'])]),
+        format_metric("upload_bytes_resumed_total", "Bytes que no se reenviaron al reanudar envíos interrumpidos",
+                      "counter", [({}, upload_stats['bytes_resumed'])]),
+        format_metric("upload_bandwidth_limit_bytes_per_second", "Límite de ancho de banda de envío actual (0 = sin límite)",
+                      "gauge", [({}, upload_stats['bandwidth_limit_bytes_per_second'])]),
+        format_metric("upload_throttled_seconds_total", "Espera acumulada de los envíos por el limitador de ancho de banda",
+                      "counter", [({}, upload_stats['throttled_seconds'])]),
+        format_metric("temp_dir_bytes", "Bytes en disco de chunks sin enviar", "gauge",
+                      [({'dir': 'temp'}, _directory_bytes(SystemConfig.TEMP_VIDEO_DIR)),
+                       ({'dir': 'pending'}, _directory_bytes(SystemConfig.PENDING_VIDEO_DIR))]),
+    ]
+    return metrics.render() + "".join(blocks)
+
 
 def create_app() -> Flask:
     # Ajustar la ruta para que apunte a la carpeta 'frontend' en el directorio raíz
@@ -33,77 +246,79 @@ def create_app() -> Flask:
         """Servir otros archivos estáticos (JS, CSS, etc.)"""
         return send_from_directory(app.static_folder, path)
 
-    # Callback para envío de chunks al servidor
-    def upload_chunk_to_server(chunk: VideoChunk):
-        """Enviar chunk al servidor de procesamiento"""
+    # Callback para chunks que el servidor rechaza
+    def handle_rejected_chunk(chunk: VideoChunk, response):
+        """Cancelar la sesión si el servidor detecta un fallo de cámaras"""
+        event_bus.publish(EVENT_UPLOAD_FAILED, status_code=response.status_code if response is not None else None,
+                          error=upload_manager.get_stats().get('last_error'), **_chunk_event_data(chunk))
+        if response is None or response.status_code != 500:
+            return
         try:
-            url = f"{SystemConfig.SERVER.base_url}{SystemConfig.SERVER.upload_endpoint}" 
-            
-            # Preparar datos del chunk
-            files = {
-                'file': open(chunk.file_path, 'rb')  # Server espera 'file'
-            }
-            
-            data = {
-                'chunk_id': chunk.chunk_id,
-                'camera_id': chunk.camera_id,
-                'session_id': chunk.session_id,
-                'patient_id': chunk.patient_id,
-                'chunk_number': chunk.sequence_number,  # Server espera chunk_number
-                'duration_seconds': chunk.duration_seconds,
-                'timestamp': chunk.timestamp.isoformat(),
-                'file_size_bytes': chunk.file_size_bytes
-            }
+            error_data = response.json()
+        except ValueError:
+            return  # Si no se puede parsear como JSON, no es un fallo de cámaras
+        if error_data.get('error') == 'CAMERA_FAILURE_DETECTED':
+            print(f"FALLO DE CÁMARAS DETECTADO POR EL SERVIDOR")
+            print(f"Mensaje: {error_data.get('message', 'Error de cámaras')}")
+            print(f"Acción requerida: {error_data.get('action_required', 'Reiniciar switch')}")
+            
+            # Marcar que hubo un fallo de cámaras
+            global camera_failure_detected
+            camera_failure_detected = True
             
-            response = requests.post(url, files=files, data=data, timeout=30)
-            
-            if response.status_code == 200:
-                print(f"Chunk enviado exitosamente: {chunk.chunk_id}")
-                # Eliminar archivo local después del envío exitoso
-                try:
-                    os.remove(chunk.file_path)
-                except Exception as e:
-                    print(f"Error eliminando archivo local: {e}")
-            elif response.status_code == 500:
-                # Verificar si es un error de fallo de cámaras
-                try:
-                    error_data = response.json()
-                    if error_data.get('error') == 'CAMERA_FAILURE_DETECTED':
-                        print(f"FALLO DE CÁMARAS DETECTADO POR EL SERVIDOR")
-                        print(f"Mensaje: {error_data.get('message', 'Error de cámaras')}")
-                        print(f"Acción requerida: {error_data.get('action_required', 'Reiniciar switch')}")
-                        
-                        # Marcar que hubo un fallo de cámaras
-                        global camera_failure_detected
-                        camera_failure_detected = True
-                        
-                        # Cancelar la sesión actual inmediatamente
-                        try:
-                            print("Cancelando sesión local debido a fallo de cámaras...")
-                            video_processor.cancel_current_session()
-                            print("Sesión local cancelada por fallo de cámaras")
-                        except Exception as cancel_error:
-                            print(f"Error cancelando sesión local: {cancel_error}")
-                        
-                        return  # No continuar procesando este chunk
-                except:
-                    pass  # Si no se puede parsear como JSON, continuar con el manejo normal
-                    
-                print(f"Error 500 enviando chunk: {response.status_code} - {response.text}")
-            else:
-                print(f"Error enviando chunk: {response.status_code} - {response.text}")
-                
-        except Exception as e:
-            print(f"Error en upload_chunk_to_server: {e}")
-        finally:
-            # Cerrar archivo
+            # Cancelar la sesión actual inmediatamente y no enviar el resto de sus chunks
             try:
-                files['file'].close()
-            except:
-                pass
+                print("Cancelando sesión local debido a fallo de cámaras...")
+                video_processor.cancel_current_session()
+                upload_manager.discard_session(chunk.session_id)
+                upload_manager.set_active_session(None)
+                _cancel_finalize_job(chunk.session_id)
+                event_bus.publish(EVENT_SESSION_CANCELLED, session_id=chunk.session_id, reason='camera_failure',
+                                  message=error_data.get('message', 'Error de cámaras'))
+                print("Sesión local cancelada por fallo de cámaras")
+            except Exception as cancel_error:
+                print(f"Error cancelando sesión local: {cancel_error}")
     
-    # Registrar callback
-    video_processor.add_upload_callback(upload_chunk_to_server)
+    def monitor_cameras():
+        """Publicar el FPS medido y las cámaras que dejan de entregar frames (hilo en segundo plano)"""
+        stalled = set()
+        while True:
+            time.sleep(CAMERA_MONITOR_INTERVAL)
+            try:
+                health = camera_manager.get_camera_health()
+                stalled &= set(health)
+                for camera_id, camera_health in health.items():
+                    if camera_health['is_active']:
+                        stalled.discard(camera_id)
+                    elif camera_id not in stalled and camera_health['last_frame_received'] is not None:
+                        stalled.add(camera_id)
+                        event_bus.publish(EVENT_CAMERA_STALLED, camera_id=camera_id,
+                                          last_frame_age_seconds=camera_health['last_frame_age_seconds'],
+                                          attached=camera_health['attached'],
+                                          recording=video_processor.recording_active)
+                if health and event_bus.subscriber_count:
+                    event_bus.publish(EVENT_FPS_UPDATE, recording=video_processor.recording_active,
+                                      cameras={str(camera_id): camera_health['measured_fps']
+                                               for camera_id, camera_health in health.items()})
+            except Exception as e:
+                print(f"Error en el monitor de cámaras: {e}")
+    
+    # Registrar callbacks: los chunks se encolan en el gestor de envíos
+    upload_manager.add_error_callback(handle_rejected_chunk)
+    upload_manager.add_success_callback(
+        lambda chunk: event_bus.publish(EVENT_CHUNK_UPLOADED, upload=upload_manager.get_upload_report(chunk.chunk_id),
+                                        **_chunk_event_data(chunk)))
+    # Un chunk confirmado o rechazado puede completar la sesión que se está finalizando
+    upload_manager.add_success_callback(_poke_finalize_job)
+    upload_manager.add_error_callback(_poke_finalize_job)
+    upload_manager.start()
+    video_processor.add_upload_callback(
+        lambda chunk: event_bus.publish(EVENT_CHUNK_FINALIZED, **_chunk_event_data(chunk)))
+    video_processor.add_upload_callback(upload_manager.enqueue)
+    threading.Thread(target=monitor_cameras, name="monitor-camaras", daemon=True).start()
+    # Reanudar en segundo plano los chunks que quedaron sin confirmar (caída o servidor inaccesible)
+    # y los session_end que esperaban sus confirmaciones
+    threading.Thread(target=_recover_pending_sessions, daemon=True).start()
     
     # ENDPOINTS DE CÁMARAS
     
@@ -142,30 +357,34 @@ def create_app() -> Flask:
                 discovered = camera_manager.discover_cameras()
                 camera_ids = [cam.camera_id for cam in discovered]
             
-            initialized = []
-            errors = []
-            
-            for camera_id in camera_ids:
-                # Crear nueva configuración para cada cámara
-                config = CameraConfig(
+            # Crear nueva configuración para cada cámara
+            configs = {
+                camera_id: CameraConfig(
                     camera_id=camera_id,
                     resolution_width=SystemConfig.DEFAULT_CAMERA_CONFIG.resolution_width,
                     resolution_height=SystemConfig.DEFAULT_CAMERA_CONFIG.resolution_height,
                     fps=SystemConfig.DEFAULT_CAMERA_CONFIG.fps,
                     format=SystemConfig.DEFAULT_CAMERA_CONFIG.format
                 )
-                
-                if camera_manager.initialize_camera(camera_id, config):
-                    time.sleep(0.5)  # Espera para evitar conflictos de recursos USB
-                    initialized.append(camera_id)
-                else:
-                    errors.append(f"Error inicializando cámara {camera_id}")
+                for camera_id in camera_ids
+            }
+            
+            # En paralelo, con un límite de cámaras abriéndose a la vez (ver CameraInitConfig)
+            start = time.perf_counter()
+            results = camera_manager.initialize_cameras(configs)
+            total_ms = round((time.perf_counter() - start) * 1000, 1)
+            
+            initialized = [camera_id for camera_id in camera_ids if results[camera_id]['success']]
+            errors = [results[camera_id].get('error', f"Error inicializando cámara {camera_id}")
+                      for camera_id in camera_ids if not results[camera_id]['success']]
             
             return jsonify({
                 'success': len(errors) == 0,
                 'initialized_cameras': initialized,
                 'errors': errors,
-                'total_initialized': len(initialized)
+                'total_initialized': len(initialized),
+                'total_ms': total_ms,
+                'cameras': {str(camera_id): result for camera_id, result in results.items()}
             })
             
         except Exception as e:
@@ -178,13 +397,8 @@ def create_app() -> Flask:
     def camera_status():
         """Obtener estado de las cámaras"""
         try:
-            status = {}
-            for camera_id in camera_manager.cameras:
-                frame = camera_manager.get_frame(camera_id)
-                status[camera_id] = {
-                    'is_active': frame is not None,
-                    'last_frame_received': datetime.now().isoformat() if frame is not None else None
-                }
+            # Estado cacheado por el hilo de captura: no consume frames ni bloquea en el SDK
+            status = camera_manager.get_camera_health()
             
             return jsonify({
                 'success': True,
@@ -198,6 +412,23 @@ def create_app() -> Flask:
                 'error': str(e)
             }), 500
     
+    @app.route('/api/cameras/sync', methods=['GET'])
+    def camera_sync():
+        """Modo de sincronización y error de sincronización entre cámaras (grabación en curso o última)"""
+        try:
+            return jsonify({
+                'success': True,
+                'mode': SystemConfig.SYNC.mode,
+                'roles': {camera_id: camera.sync_role for camera_id, camera in list(camera_manager.cameras.items())},
+                'sync': video_processor.get_sync_stats()
+            })
+            
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+    
     # ENDPOINTS DE GRABACIÓN
     
     @app.route('/api/recording/start', methods=['POST'])
@@ -219,8 +450,27 @@ def create_app() -> Flask:
                     'error': 'No hay cámaras inicializadas. Inicialice las cámaras primero.'
                 }), 400
             
+            # La sesión anterior aún está cerrando sus últimos chunks
+            finalize_job = finalize_jobs.stopping()
+            if finalize_job is not None:
+                return jsonify({
+                    'success': False,
+                    'error': 'La sesión anterior todavía se está finalizando',
+                    'job': finalize_job.to_dict()
+                }), 409
+            
+            # Verificar que queda espacio en el almacén local (modo sin conexión)
+            storage_available, storage_error = upload_manager.storage.can_start_session()
+            if not storage_available:
+                return jsonify({
+                    'success': False,
+                    'error': storage_error,
+                    'storage': upload_manager.get_storage_status()
+                }), 507
+            
             # Iniciar sesión
             result_session_id = video_processor.start_session(patient_id, session_id)
+            upload_manager.set_active_session(session_id, list(camera_manager.cameras))
             
             # Notificar al servidor que la sesión inició (el servidor maneja automáticamente el cierre de sesiones anteriores)
             try:
@@ -278,10 +528,13 @@ def create_app() -> Flask:
             cameras_info = []
             try:
                 for camera_id, camera in camera_manager.cameras.items():
+                    health = camera.health.to_dict()
                     cameras_info.append({
                         'camera_id': camera_id,
-                        'is_connected': getattr(camera, 'is_connected', False),
-                        'is_recording': getattr(camera, 'is_recording', False)
+                        'is_connected': camera.attached,
+                        'is_recording': getattr(camera, 'is_recording', False),
+                        'is_active': health['is_active'],
+                        'measured_fps': health['measured_fps']
                     })
             except AttributeError:
                 # Si camera_manager.cameras no existe o está vacío
@@ -313,50 +566,45 @@ def create_app() -> Flask:
 
     @app.route('/api/recording/stop', methods=['POST'])
     def stop_recording():
-        """Finalizar grabación"""
+        """Finalizar grabación (en segundo plano)
+        
+        Responde 202 con el trabajo de finalización; su progreso se consulta en /api/recording/jobs/<job_id>
+        y se publica como evento finalize_progress.
+        """
         try:
+            # Solo se reutiliza el trabajo de la grabación que se está parando (p. ej. doble clic);
+            # los de sesiones anteriores que aún esperan confirmaciones no cuentan
+            start_time = video_processor.recording_start_time
+            job = finalize_jobs.for_recording(start_time) if start_time else None
+            if job is not None:
+                return jsonify({
+                    'success': True,
+                    'session_id': job.session_id,
+                    'job_id': job.job_id,
+                    'job': job.to_dict(),
+                    'message': 'La sesión ya se está finalizando'
+                }), 202
+            
+            if not video_processor.recording_active:
+                return jsonify({
+                    'success': False,
+                    'error': 'No hay ninguna grabación en curso'
+                }), 400
+            
             print("Procesando finalización de grabación...")
-            final_chunks = video_processor.stop_recording()
-            
-            # Enviar chunks finales inmediatamente al servidor
-            if final_chunks:
-                print(f"Enviando {len(final_chunks)} chunks finales al servidor...")
-                for chunk in final_chunks:
-                    try:
-                        # Usar el mismo callback que se usa para chunks regulares
-                        upload_chunk_to_server(chunk)
-                        print(f"Chunk final enviado: Cámara {chunk.camera_id}, Duración: {chunk.duration_seconds:.2f}s")
-                    except Exception as upload_error:
-                        print(f"Error enviando chunk final de cámara {chunk.camera_id}: {upload_error}")
-            
-            # Dar un momento para que se completen las subidas
-            time.sleep(2)
-            
-            # Notificar al servidor que la sesión terminó
-            try:
-                url = f"{SystemConfig.SERVER.base_url}{SystemConfig.SERVER.session_end_endpoint}"
-                end_response = requests.post(url, json={
-                    'session_id': video_processor.session_id,
-                    'patient_id': video_processor.patient_id,
-                    'final_chunks_count': len(final_chunks),
-                    'reason': 'session_completed'
-                }, timeout=10)
-                
-                if end_response.status_code == 200:
-                    print("Sesión finalizada correctamente en el servidor (datos preservados)")
-                elif end_response.status_code == 400:
-                    print("Info: No había sesión activa en el servidor para finalizar")
-                else:
-                    print(f"Warning: Respuesta inesperada del servidor al finalizar: {end_response.status_code}")
-            except Exception as e:
-                print(f"Error notificando fin de sesión al servidor: {e}")
+            # Chunks de la sesión: el session_id se puede repetir entre sesiones
+            since = datetime.fromtimestamp(start_time - 1) if start_time else None
+            job = finalize_jobs.create(video_processor.session_id, video_processor.patient_id, start_time)
+            threading.Thread(target=_run_finalize_job, args=(job, since), name=f"finalizar-{job.job_id}",
+                             daemon=True).start()
             
             return jsonify({
                 'success': True,
-                'session_id': video_processor.session_id,
-                'final_chunks_count': len(final_chunks),
-                'message': f'Grabación finalizada correctamente. {len(final_chunks)} chunks finales enviados.'
-            })
+                'session_id': job.session_id,
+                'job_id': job.job_id,
+                'job': job.to_dict(),
+                'message': 'Finalizando la grabación en segundo plano'
+            }), 202
             
         except Exception as e:
             return jsonify({
@@ -364,6 +612,21 @@ def create_app() -> Flask:
                 'error': str(e)
             }), 500
     
+    @app.route('/api/recording/jobs/<job_id>', methods=['GET'])
+    def finalize_job_status(job_id):
+        """Progreso de la finalización de una sesión"""
+        job = finalize_jobs.get(job_id)
+        if job is None:
+            return jsonify({
+                'success': False,
+                'error': f'Trabajo {job_id} no encontrado'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'job': job.to_dict()
+        })
+    
     @app.route('/api/recording/cancel', methods=['POST'])
     def cancel_recording():
         """Cancelar grabación"""
@@ -372,6 +635,10 @@ def create_app() -> Flask:
             patient_id = video_processor.patient_id
             
             video_processor.cancel_recording()
+            upload_manager.discard_session(session_id)
+            upload_manager.set_active_session(None)
+            _cancel_finalize_job(session_id)
+            event_bus.publish(EVENT_SESSION_CANCELLED, session_id=session_id, reason='cancelled_by_user')
             
             # Notificar al servidor que la sesión fue cancelada
             try:
@@ -423,6 +690,83 @@ def create_app() -> Flask:
     
     # ENDPOINTS DE SISTEMA
     
+    @app.route('/api/events', methods=['GET'])
+    def events():
+        """Eventos de grabación, envío y cámaras en tiempo real (Server-Sent Events)
+        
+        Un navegador que se reconecta envía Last-Event-ID y recibe los eventos que se perdió.
+        """
+        subscription = event_bus.subscribe(request.headers.get('Last-Event-ID'))
+        
+        def stream():
+            try:
+                yield "retry: 3000\n\n"
+                while True:
+                    event = subscription.get(timeout=EVENT_KEEPALIVE_SECONDS)
+                    yield event.to_sse() if event is not None else ": keepalive\n\n"
+            finally:
+                event_bus.unsubscribe(subscription)
+        
+        return Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    
+    @app.route('/api/cameras/<int:camera_id>/preview', methods=['GET'])
+    def camera_preview(camera_id):
+        """Vista previa en vivo de una cámara (MJPEG reducido, sirve como src de un <img>)
+        
+        El JPEG se codifica una sola vez por frame y lo comparten todos los visores de la cámara.
+        """
+        preview = camera_manager.get_preview(camera_id)
+        if preview is None:
+            return jsonify({
+                'success': False,
+                'error': f'Cámara {camera_id} no inicializada'
+            }), 404
+        
+        if not preview.add_viewer():
+            return jsonify({
+                'success': False,
+                'error': f'Máximo de {SystemConfig.PREVIEW.max_viewers} visores alcanzado para la cámara {camera_id}'
+            }), 503
+        
+        def stream():
+            try:
+                sequence = -1
+                while camera_id in camera_manager.cameras:
+                    sequence, jpeg = preview.wait_frame(sequence, timeout=PREVIEW_RESEND_SECONDS)
+                    if jpeg is None:
+                        continue
+                    yield (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                           + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+            finally:
+                preview.remove_viewer()
+        
+        return Response(stream(), mimetype='multipart/x-mixed-replace; boundary=frame',
+                        headers={'Cache-Control': 'no-cache, no-store', 'X-Accel-Buffering': 'no'})
+    
+    @app.route('/api/cameras/<int:camera_id>/snapshot', methods=['GET'])
+    def camera_snapshot(camera_id):
+        """Último JPEG de la vista previa de una cámara, para consultarlo periódicamente
+        
+        Con HTTP/1.1 el navegador abre como mucho 6 conexiones por host: un MJPEG por cámara más
+        /api/events las ocupan todas con 5 cámaras. Las instantáneas no dejan conexiones abiertas.
+        """
+        preview = camera_manager.get_preview(camera_id)
+        if preview is None:
+            return jsonify({
+                'success': False,
+                'error': f'Cámara {camera_id} no inicializada'
+            }), 404
+        
+        jpeg = preview.snapshot(timeout=PREVIEW_SNAPSHOT_WAIT_SECONDS)
+        if jpeg is None:
+            return jsonify({
+                'success': False,
+                'error': f'Vista previa de la cámara {camera_id} aún no disponible'
+            }), 503
+        
+        return Response(jpeg, mimetype='image/jpeg', headers={'Cache-Control': 'no-cache, no-store'})
+    
     @app.route('/api/system/health', methods=['GET'])
     def system_health():
         """Verificar estado del sistema"""
@@ -432,12 +776,15 @@ def create_app() -> Flask:
                 'status': 'healthy',
                 'timestamp': datetime.now().isoformat(),
                 'cameras_initialized': len(camera_manager.cameras),
+                'cameras_active': sum(1 for health in camera_manager.get_camera_health().values() if health['is_active']),
                 'recording_active': video_processor.recording_active,
                 'temp_dir': SystemConfig.TEMP_VIDEO_DIR,
                 'server_config': {
                     'base_url': SystemConfig.SERVER.base_url,
                     'upload_endpoint': SystemConfig.SERVER.upload_endpoint
-                }
+                },
+                'uploads': upload_manager.get_stats(),
+                'storage': upload_manager.get_storage_status()
             })
             
         except Exception as e:
@@ -447,6 +794,30 @@ def create_app() -> Flask:
                 'status': 'unhealthy'
             }), 500
     
+    @app.route('/api/system/storage', methods=['GET'])
+    def storage_status():
+        """Uso del almacén local de chunks pendientes y profundidad del backlog de envíos"""
+        try:
+            return jsonify({
+                'success': True,
+                'storage': upload_manager.get_storage_status()
+            })
+            
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+    
+    @app.route('/api/system/metrics', methods=['GET'])
+    def system_metrics():
+        """Métricas en formato de texto de Prometheus (histogramas por etapa, cola de envíos, disco)"""
+        try:
+            return Response(_collect_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+            
+        except Exception as e:
+            return Response(f"# Error recogiendo métricas: {e}\n", status=500, mimetype='text/plain')
+    
     @app.route('/api/system/cleanup', methods=['POST'])
     def cleanup_system():
         """Limpiar recursos del sistema"""
@@ -468,20 +839,44 @@ def create_app() -> Flask:
 
 
 def run_server(): # Ejecuta el servidor Flask
+    """Servir la API en este proceso, que es el único que abre las cámaras
+    
+    En modo "production" usa waitress: un proceso con un pool de hilos, así que todas las peticiones
+    comparten el mismo camera_manager, video_processor y upload_manager. No usar servidores con
+    varios procesos de trabajo (p. ej. gunicorn -w N): cada proceso crearía su propio gestor de cámaras.
+    """
     
     # Crear directorios necesarios
     SystemConfig.ensure_directories()
     
     app = create_app()
+    server_config = SystemConfig.API_SERVER
     
     print(f"Iniciando servidor de cámaras Orbbec...")
     print(f"URL: http://{SystemConfig.LOCAL_API_HOST}:{SystemConfig.LOCAL_API_PORT}")
     print(f"Directorio temporal: {SystemConfig.TEMP_VIDEO_DIR}")
     print(f"Servidor de procesamiento: {SystemConfig.SERVER.base_url}")
-
+    
+    if server_config.mode == "production":
+        if WAITRESS_AVAILABLE:
+            print(f"Servidor HTTP: waitress ({server_config.threads} hilos)")
+            waitress_serve(
+                app,
+                host=SystemConfig.LOCAL_API_HOST,
+                port=SystemConfig.LOCAL_API_PORT,
+                threads=server_config.threads,
+                connection_limit=server_config.connection_limit,
+                channel_timeout=server_config.channel_timeout_seconds,
+                ident="gait-capture"
+            )
+            return
+        print("waitress no está instalado (pip install waitress): usando el servidor de Werkzeug sin depurador")
+    
+    # Sin recargador: arrancaría un segundo proceso con su propio gestor de cámaras
     app.run(
         host=SystemConfig.LOCAL_API_HOST,
         port=SystemConfig.LOCAL_API_PORT,
-        debug=True,
+        debug=server_config.mode == "development",
+        use_reloader=False,
         threaded=True
     )
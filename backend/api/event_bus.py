@@ -0,0 +1,108 @@
+# Canal de eventos de la API local (Server-Sent Events)
+# El procesador de video, el gestor de envíos y el monitor de cámaras publican eventos;
+# cada navegador conectado a /api/events recibe los suyos en una cola propia en lugar de
+# consultar /api/recording/status cada 2 segundos.
+import json
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+EVENT_CHUNK_FINALIZED = "chunk_finalized"
+EVENT_CHUNK_UPLOADED = "chunk_uploaded"
+EVENT_UPLOAD_FAILED = "upload_failed"
+EVENT_CAMERA_STALLED = "camera_stalled"
+EVENT_FPS_UPDATE = "fps_update"
+EVENT_SESSION_CANCELLED = "session_cancelled"
+EVENT_FINALIZE_PROGRESS = "finalize_progress"
+
+
+@dataclass
+class Event:
+    """Evento publicado (id creciente para reanudar con Last-Event-ID)"""
+    event_id: int
+    event_type: str
+    data: Dict[str, Any]
+    timestamp: float
+
+    def to_sse(self) -> str:
+        payload = dict(self.data, timestamp=self.timestamp)
+        return f"id: {self.event_id}\nevent: {self.event_type}\ndata: {json.dumps(payload)}\n\n"
+
+
+class Subscription:
+    """Cola de eventos de un cliente. Si el cliente no lee, se descartan sus eventos más antiguos"""
+
+    def __init__(self, max_events: int):
+        self._queue: "queue.Queue[Event]" = queue.Queue(maxsize=max_events)
+        self.dropped = 0
+
+    def put(self, event: Event):
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: float) -> Optional[Event]:
+        """Siguiente evento, o None si no llega ninguno en timeout segundos"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    """Publicación de eventos a todos los clientes conectados (cualquier hilo puede publicar)"""
+
+    HISTORY_SIZE = 200  # Eventos recientes que se reenvían a un cliente que se reconecta
+    TRANSIENT_EVENTS = {EVENT_FPS_UPDATE}  # Solo valen en el momento: no se reenvían
+    SUBSCRIBER_QUEUE_SIZE = 500
+
+    def __init__(self):
+        self._subscriptions: List[Subscription] = []
+        self._history: Deque[Event] = deque(maxlen=self.HISTORY_SIZE)
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def publish(self, event_type: str, **data) -> Event:
+        with self._lock:
+            event = Event(self._next_id, event_type, data, time.time())
+            self._next_id += 1
+            if event_type not in self.TRANSIENT_EVENTS:
+                self._history.append(event)
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.put(event)
+        return event
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Subscription:
+        """Nueva suscripción; con last_event_id recibe primero los eventos que se perdió"""
+        subscription = Subscription(self.SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            if last_event_id and last_event_id.isdigit():
+                for event in self._history:
+                    if event.event_id > int(last_event_id):
+                        subscription.put(event)
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+
+# Instancia global del canal de eventos
+event_bus = EventBus()
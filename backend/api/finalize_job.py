@@ -0,0 +1,134 @@
+# Finalización de sesiones en segundo plano
+# POST /api/recording/stop responde en cuanto crea el trabajo. Detener la grabación, finalizar los
+# últimos chunks, esperar a que el servidor los confirme y avisar del fin de sesión ocurre en un hilo
+# aparte; el navegador consulta el progreso en /api/recording/jobs/<job_id> o recibe eventos.
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Etapas de un trabajo en curso
+STAGE_STOPPING = "stopping"  # Deteniendo la grabación y finalizando los últimos chunks
+STAGE_UPLOADING = "uploading"  # Esperando la confirmación del servidor de todos los chunks de la sesión
+STAGE_WAITING_SERVER = "waiting_for_server"  # Servidor no disponible: los chunks esperan en disco
+STAGE_NOTIFYING = "notifying"  # Enviando session_end
+
+# Estados
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_CANCELLED = "cancelled"  # Sesión cancelada mientras se finalizaba (no se envía session_end)
+JOB_FAILED = "failed"
+
+
+class FinalizeJob:
+    """Progreso de la finalización de una sesión (lo actualiza el hilo del trabajo)"""
+
+    def __init__(self, session_id: Optional[str], patient_id: Optional[str],
+                 recording_start_time: Optional[float] = None):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.patient_id = patient_id
+        self.recording_start_time = recording_start_time  # Distingue grabaciones con el mismo session_id
+        self.state = JOB_RUNNING
+        self.stage = STAGE_STOPPING
+        self.final_chunks = 0
+        self.chunks_total = 0
+        self.chunks_acked = 0
+        self.chunks_failed = 0
+        self.session_end_sent = False
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._changed = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.state != JOB_RUNNING
+
+    def update(self, **fields) -> bool:
+        """Cambiar campos y despertar a quien espera. Retorna True si cambió alguno"""
+        with self._changed:
+            changed = {name: value for name, value in fields.items() if getattr(self, name) != value}
+            for name, value in changed.items():
+                setattr(self, name, value)
+            if changed.get('state', JOB_RUNNING) != JOB_RUNNING:
+                self.finished_at = time.time()
+            self._changed.notify_all()
+        return bool(changed)
+
+    def poke(self):
+        """Despertar al hilo del trabajo (un chunk de la sesión se confirmó o se rechazó)"""
+        with self._changed:
+            self._changed.notify_all()
+
+    def wait(self, timeout: float):
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def to_dict(self) -> Dict[str, Any]:
+        finished = self.finished_at or time.time()
+        return {
+            'job_id': self.job_id,
+            'session_id': self.session_id,
+            'patient_id': self.patient_id,
+            'state': self.state,
+            'stage': self.stage if not self.done else None,
+            'final_chunks': self.final_chunks,
+            'chunks_total': self.chunks_total,
+            'chunks_acked': self.chunks_acked,
+            'chunks_failed': self.chunks_failed,
+            'session_end_sent': self.session_end_sent,
+            'error': self.error,
+            'elapsed_seconds': round(finished - self.created_at, 2)
+        }
+
+
+class FinalizeJobs:
+    """Trabajos de finalización recientes
+
+    Puede haber varios en curso: una sesión nueva puede empezar mientras la anterior espera sus confirmaciones.
+    """
+
+    MAX_JOBS = 20  # Trabajos terminados que se conservan para consultar su resultado
+
+    def __init__(self):
+        self._jobs: "OrderedDict[str, FinalizeJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, session_id: Optional[str], patient_id: Optional[str],
+               recording_start_time: Optional[float] = None) -> FinalizeJob:
+        job = FinalizeJob(session_id, patient_id, recording_start_time)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > self.MAX_JOBS:
+                oldest_id = next((job_id for job_id, old in self._jobs.items() if old.done), None)
+                if oldest_id is None:
+                    break
+                del self._jobs[oldest_id]
+        return job
+
+    def get(self, job_id: str) -> Optional[FinalizeJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active(self, session_id: Optional[str] = None) -> Optional[FinalizeJob]:
+        """Trabajo en curso más reciente (de esa sesión, si se indica)"""
+        with self._lock:
+            return next((job for job in reversed(self._jobs.values())
+                         if not job.done and (session_id is None or job.session_id == session_id)), None)
+
+    def stopping(self) -> Optional[FinalizeJob]:
+        """Trabajo que aún está deteniendo la grabación y cerrando los últimos chunks"""
+        with self._lock:
+            return next((job for job in self._jobs.values() if not job.done and job.stage == STAGE_STOPPING), None)
+
+    def for_recording(self, recording_start_time: Optional[float]) -> Optional[FinalizeJob]:
+        """Trabajo en curso de la grabación que empezó en recording_start_time"""
+        with self._lock:
+            return next((job for job in self._jobs.values()
+                         if not job.done and job.recording_start_time == recording_start_time), None)
+
+
+# Trabajos de finalización de la API
+finalize_jobs = FinalizeJobs()
@@ -1,3 +1,10 @@
-from .camera_manager import CameraManager, camera_manager, CameraInfo, OrbbecCamera
+from .camera_manager import CameraManager, camera_manager, CameraInfo
+from .base_camera import BaseCamera, CameraHealth, StreamProfile
+from .orbbec_camera import OrbbecCamera
+from .simulated_camera import SimulatedCamera
+from .frame_buffer import FrameRingBuffer, CapturedFrame
+from .frame_synchronizer import FrameSynchronizer
+from .preview_stream import PreviewStream
 
-__all__ = ['CameraManager', 'camera_manager', 'CameraInfo', 'OrbbecCamera']
+__all__ = ['CameraManager', 'camera_manager', 'CameraInfo', 'BaseCamera', 'CameraHealth', 'StreamProfile', 'OrbbecCamera',
+           'SimulatedCamera', 'FrameRingBuffer', 'CapturedFrame', 'FrameSynchronizer', 'PreviewStream']
@@ -0,0 +1,351 @@
+# Interfaz común de las cámaras (backends)
+# Cada backend solo implementa cómo abrir el dispositivo y cómo esperar el siguiente frame;
+# el hilo de captura, el buffer circular, los contadores y el estado de salud son comunes.
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Dict, Optional, Any, Tuple
+
+import numpy as np
+
+from ..config.settings import CameraConfig
+from ..metrics import metrics, SDK_WAIT_BUCKETS, FRAME_STAGE_BUCKETS
+from .frame_buffer import FrameRingBuffer, CapturedFrame, to_bgr
+from .frame_synchronizer import SYNC_MODE_FREE_RUN
+
+MAX_SYSTEM_CLOCK_SKEW = 2.0  # Diferencia (s) a partir de la cual no se confía en el timestamp de host del SDK
+
+# Etapas del hilo de captura, observadas por cada backend en _read_frame
+SDK_WAIT_SECONDS = metrics.histogram("camera_sdk_wait_seconds", "Espera por el siguiente frame del dispositivo",
+                                     SDK_WAIT_BUCKETS)
+FRAME_CONVERSION_SECONDS = metrics.histogram("camera_frame_conversion_seconds",
+                                             "Copia del frame del dispositivo al buffer de captura", FRAME_STAGE_BUCKETS)
+
+
+@dataclass(frozen=True)
+class StreamProfile:
+    """Perfil de color negociado con el dispositivo (se cachea por número de serie)"""
+    width: int
+    height: int
+    fps: int
+    format: str  # "RGB", "BGR" o "MJPG"
+
+    @staticmethod
+    def request_key(config: CameraConfig) -> Tuple[int, int, int, str]:
+        """Lo que se pidió al negociar: un perfil cacheado solo vale para la misma configuración"""
+        return config.resolution_width, config.resolution_height, config.fps, config.format.upper()
+
+
+class CameraHealth:
+    """Estado de salud de una cámara, actualizado por el hilo de captura
+
+    Los endpoints de estado lo leen sin tocar el SDK ni consumir frames.
+    """
+
+    FPS_WINDOW_FRAMES = 60  # Ventana deslizante para medir el FPS (~2 segundos a 30fps)
+    STALL_SECONDS = 1.0  # Sin frames durante este tiempo la cámara se considera detenida
+
+    def __init__(self):
+        self.last_frame_time: Optional[float] = None  # time.time() del último frame recibido
+        self.last_sdk_timestamp_us: Optional[int] = None  # Timestamp del dispositivo del último frame
+        self.consecutive_timeouts = 0
+        self.total_timeouts = 0
+        self._frame_times = deque(maxlen=self.FPS_WINDOW_FRAMES)
+
+    def record_frame(self, timestamp: float, sdk_timestamp_us: Optional[int] = None):
+        """Registrar un frame recibido (hilo de captura)"""
+        self._frame_times.append(timestamp)
+        self.last_frame_time = timestamp
+        self.last_sdk_timestamp_us = sdk_timestamp_us
+        self.consecutive_timeouts = 0
+
+    def record_timeout(self):
+        """Registrar una espera de frame sin resultado (hilo de captura)"""
+        self.consecutive_timeouts += 1
+        self.total_timeouts += 1
+
+    def reset(self):
+        """Reiniciar el estado (al arrancar la captura)"""
+        self.last_frame_time = None
+        self.last_sdk_timestamp_us = None
+        self.consecutive_timeouts = 0
+        self.total_timeouts = 0
+        self._frame_times.clear()
+
+    def measured_fps(self, now: Optional[float] = None) -> float:
+        """FPS medido sobre la ventana deslizante (0 si la cámara está detenida)"""
+        now = now if now is not None else time.time()
+        frame_times = self._frame_times
+        count = len(frame_times)
+        if count < 2 or self.last_frame_time is None or now - self.last_frame_time > self.STALL_SECONDS:
+            return 0.0
+        span = frame_times[-1] - frame_times[0]
+        return (count - 1) / span if span > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Instantánea serializable del estado"""
+        now = time.time()
+        last_frame_time = self.last_frame_time
+        age = now - last_frame_time if last_frame_time is not None else None
+        return {
+            'is_active': age is not None and age < self.STALL_SECONDS,
+            'last_frame_received': datetime.fromtimestamp(last_frame_time).isoformat() if last_frame_time else None,
+            'last_frame_age_seconds': round(age, 3) if age is not None else None,
+            'last_sdk_timestamp_us': self.last_sdk_timestamp_us,
+            'measured_fps': round(self.measured_fps(now), 2),
+            'consecutive_timeouts': self.consecutive_timeouts,
+            'total_timeouts': self.total_timeouts
+        }
+
+
+class BaseCamera:
+    """Cámara con hilo de captura propio que llena un FrameRingBuffer
+
+    Los backends implementan initialize(), _read_frame(), _frame_size_from_profile(),
+    get_real_fps(), is_initialized y, si tienen recursos propios, cleanup().
+    """
+
+    backend = "base"
+
+    def __init__(self, camera_id: int, config: CameraConfig):
+        self.camera_id = camera_id
+        self.config = config
+        self.is_recording = False
+
+        # Captura en hilo propio: cada cámara llena su buffer circular sin depender del resto
+        self.frame_buffer = FrameRingBuffer(config.frame_buffer_size)
+        self.capture_thread: Optional[threading.Thread] = None
+        self.capture_active = False
+        self.frames_captured = 0
+        self.frames_dropped = 0  # Frames que el dispositivo no entregó o no se pudieron convertir
+        self.frames_overwritten = 0  # Frames sobrescritos en el buffer antes de ser leídos
+        self._last_sdk_index = -1
+        self.health = CameraHealth()
+        self.sync_role = SYNC_MODE_FREE_RUN  # "free_run", "primary" o "secondary" (sincronización por cable)
+        self.serial_number = ""
+        self.stream_profile: Optional[StreamProfile] = None  # Perfil en uso tras initialize()
+        self.profile_cached = False  # True si initialize() reutilizó un perfil sin negociar
+        self.init_timings: Dict[str, float] = {}  # Duración (ms) de cada fase de la inicialización
+        self.attached = True  # False mientras el dispositivo está desconectado del USB
+        self._attach_lock = threading.Lock()
+        self._keep_buffer = False  # Al reconectar, el buffer conserva su numeración
+
+    def initialize(self, profile: Optional[StreamProfile] = None) -> bool:
+        """Abrir el dispositivo y arrancar la captura
+
+        profile es el perfil negociado en una inicialización anterior con la misma
+        configuración: si el backend puede usarlo directamente, no vuelve a negociar.
+        """
+        raise NotImplementedError
+
+    def detach(self):
+        """El dispositivo se ha desconectado: parar la captura y soltar el dispositivo
+
+        El buffer circular y los contadores se conservan para cuando vuelva.
+        """
+        self.attached = False
+        with self._attach_lock:
+            self.stop_capture()
+            try:
+                self._release_device()
+            except Exception as e:
+                print(f"Cámara {self.camera_id}: Error liberando el dispositivo desconectado: {e}")
+        print(f"Cámara {self.camera_id}: Captura suspendida hasta que se reconecte")
+
+    def reattach(self, device=None) -> bool:
+        """Volver a abrir el dispositivo reconectado con el perfil ya negociado
+
+        Los lectores del buffer (VideoProcessor) siguen en su índice: no notan más
+        que un hueco entre el último frame antes de la desconexión y el primero después.
+        """
+        with self._attach_lock:
+            if self.attached:
+                return True
+            self._attach_device(device)
+            self._keep_buffer = True
+            try:
+                self.attached = self.initialize(self.stream_profile)
+            finally:
+                self._keep_buffer = False
+        return self.attached
+
+    def _release_device(self):
+        """Soltar los recursos del dispositivo desconectado (backends con recursos propios)"""
+
+    def _attach_device(self, device):
+        """Adoptar el manejador del dispositivo reconectado (backends con manejador del SDK)"""
+
+    @contextmanager
+    def _phase(self, name: str):
+        """Medir una fase de la inicialización (se publica en init_timings)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.init_timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    def wait_first_frame(self, timeout: float) -> bool:
+        """Esperar a que el hilo de captura publique el primer frame"""
+        deadline = time.monotonic() + timeout
+        while self.frame_buffer.latest_index < 0:
+            if time.monotonic() >= deadline or not self.capture_active:
+                return False
+            time.sleep(0.005)
+        return True
+
+    @property
+    def is_initialized(self) -> bool:
+        raise NotImplementedError
+
+    def _read_frame(self, timeout_ms: int) -> Optional[Tuple[Optional[np.ndarray], str, int, Optional[int], Optional[int]]]:
+        """Esperar el siguiente frame del dispositivo (hilo de captura)
+
+        Retorna None si no llega ningún frame en timeout_ms, o (imagen, formato de píxel,
+        índice del dispositivo, timestamp del dispositivo en us, timestamp del host en us).
+        La imagen debe escribirse en frame_buffer.next_buffer(); None si no se pudo convertir.
+        """
+        raise NotImplementedError
+
+    def _frame_size_from_profile(self) -> Optional[Tuple[int, int]]:
+        """(ancho, alto) configurados en el dispositivo, antes de recibir frames"""
+        raise NotImplementedError
+
+    def get_real_fps(self) -> int: # Se emplea en _open_writer en video_processor.py
+        """FPS nominal del dispositivo"""
+        raise NotImplementedError
+
+    def start_recording(self) -> bool:
+        """Iniciar modo de grabación (solo marca el estado, no graba archivos)"""
+        if not self.is_initialized:
+            print(f"Cámara {self.camera_id}: No inicializada")
+            return False
+
+        self.is_recording = True
+        print(f"Cámara {self.camera_id}: Modo grabación activado")
+        return True
+
+    def stop_recording(self) -> bool:
+        """Detener modo de grabación"""
+        self.is_recording = False
+        print(f"Cámara {self.camera_id}: Modo grabación desactivado")
+        return True
+
+    def start_capture(self):
+        """Arrancar el hilo de captura que alimenta el buffer circular"""
+        if self.capture_thread and self.capture_thread.is_alive():
+            return
+        if not self._keep_buffer:
+            self.frame_buffer.clear()
+        self.health.reset()
+        self._last_sdk_index = -1
+        self.capture_active = True
+        self.capture_thread = threading.Thread(
+            target=self._capture_loop,
+            name=f"captura-camara{self.camera_id}",
+            daemon=True
+        )
+        self.capture_thread.start()
+
+    def stop_capture(self):
+        """Detener el hilo de captura"""
+        self.capture_active = False
+        if self.capture_thread and self.capture_thread.is_alive():
+            self.capture_thread.join(timeout=2)
+        self.capture_thread = None
+
+    def _capture_loop(self):
+        """Bucle del hilo de captura: espera frames del dispositivo y los publica en el buffer"""
+        print(f"Cámara {self.camera_id}: Hilo de captura iniciado")
+        while self.capture_active:
+            try:
+                result = self._read_frame(self.config.capture_timeout_ms)
+                if result is None:
+                    self.health.record_timeout()
+                    continue
+
+                image, pixel_format, sdk_index, device_timestamp_us, system_timestamp_us = result
+                timestamp = time.time()
+                if system_timestamp_us and abs(system_timestamp_us / 1_000_000 - timestamp) < MAX_SYSTEM_CLOCK_SKEW:
+                    # Instante de recepción según el SDK: no incluye la espera de este hilo por el GIL
+                    timestamp = system_timestamp_us / 1_000_000
+                self.health.record_frame(timestamp, device_timestamp_us)
+                if self._last_sdk_index >= 0 and sdk_index > self._last_sdk_index + 1:
+                    self.frames_dropped += sdk_index - self._last_sdk_index - 1
+                self._last_sdk_index = sdk_index
+
+                if image is None:
+                    self.frames_dropped += 1
+                    continue
+
+                self.frame_buffer.push(image, timestamp, sdk_index, pixel_format,
+                                       device_timestamp_us, system_timestamp_us)
+                self.frames_captured += 1
+
+            except Exception as e:
+                if self.capture_active:
+                    print(f"Error en hilo de captura de cámara {self.camera_id}: {e}")
+                    time.sleep(0.01)
+        print(f"Cámara {self.camera_id}: Hilo de captura detenido")
+
+    def get_frame(self) -> Optional[np.ndarray]:
+        """Obtener una copia BGR del último frame capturado (para preview). No bloquea ni consume frames"""
+        latest = self.frame_buffer.latest()
+        if latest is None:
+            return None
+        return to_bgr(latest.image, latest.pixel_format)
+
+    def read_frames(self, last_index: int) -> List[CapturedFrame]:
+        """Leer en orden los frames capturados después de last_index (lector secuencial: writers)"""
+        frames, missed = self.frame_buffer.read_since(last_index)
+        if missed:
+            self.frames_overwritten += missed
+        return frames
+
+    def check_frame(self, frame: CapturedFrame) -> bool:
+        """Validar un frame ya usado por un writer; si su array se reutilizó mientras tanto cuenta como sobrescrito"""
+        if self.frame_buffer.is_intact(frame):
+            return True
+        self.frames_overwritten += 1
+        return False
+
+    def get_capture_stats(self) -> Dict[str, int]:
+        """Contadores de captura de la cámara"""
+        return {
+            'frames_captured': self.frames_captured,
+            'frames_dropped': self.frames_dropped,
+            'frames_overwritten': self.frames_overwritten,
+            'buffer_capacity': self.frame_buffer.capacity
+        }
+
+    def get_health(self) -> Dict[str, Any]:
+        """Estado de salud cacheado de la cámara (no toca el dispositivo)"""
+        health = self.health.to_dict()
+        health.update(self.get_capture_stats())
+        health['backend'] = self.backend
+        health['sync_role'] = self.sync_role
+        health['attached'] = self.attached
+        return health
+
+    def get_frame_size(self) -> Optional[Tuple[int, int]]:
+        """(ancho, alto) de los frames capturados, sin decodificar ni consumir frames"""
+        latest = self.frame_buffer.latest()
+        if latest is not None and latest.pixel_format != "mjpeg":
+            height, width = latest.image.shape[:2]
+            return width, height
+        return self._frame_size_from_profile()
+
+    def get_pixel_format(self) -> Optional[str]:
+        """Formato de píxel de los frames capturados ("rgb24", "bgr24" o "mjpeg")"""
+        latest = self.frame_buffer.latest()
+        return latest.pixel_format if latest is not None else None
+
+    def cleanup(self):
+        """Limpiar recursos de la cámara"""
+        try:
+            self.stop_capture()
+            print(f"Cámara {self.camera_id}: Recursos liberados")
+        except Exception as e:
+            print(f"Error limpiando cámara {self.camera_id}: {e}")
@@ -1,23 +1,29 @@
 # Gestor de cámaras para captura multi-cámara sincronizada
-# Emplea el SDK de Orbbec, si se emplean cámaras de otra marca, se debe implementar un gestor específico para estas
-import cv2
+# Backends: Orbbec (pyorbbecsdk) o cámaras simuladas (CAMERA_BACKEND=simulated), ver base_camera.py
+# para implementar otra marca de cámaras
+import threading
+import time
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Optional
-from dataclasses import dataclass
-
-# Importación del SDK de Orbbec
-try:
-    from pyorbbecsdk import *
-    ORBBEC_AVAILABLE = True
-except ImportError:
-    raise ImportError(
-        "PyOrbbecSDK no está disponible. "
-        "Instala el SDK de Orbbec correctamente antes de usar este sistema. "
-        "Ver docs/INSTALACION_SDK.md para instrucciones."
-    )
+from typing import List, Dict, Optional, Any, Tuple
+from dataclasses import asdict, dataclass
 
 from ..config.settings import CameraConfig, SystemConfig
+from .frame_buffer import CapturedFrame
+from .base_camera import BaseCamera, CameraHealth, StreamProfile
+from . import orbbec_camera
+from .orbbec_camera import OrbbecCamera, ORBBEC_AVAILABLE, ORBBEC_UNAVAILABLE_MESSAGE
+from .simulated_camera import SimulatedCamera
+from .frame_synchronizer import SYNC_MODE_HARDWARE
+from .device_registry import DeviceRegistry, RegisteredDevice, DEVICE_ADDED, DEVICE_REMOVED
+from .preview_stream import PreviewStream
+
+BACKEND_ORBBEC = "orbbec"
+BACKEND_SIMULATED = "simulated"
+DEVICE_CLOCK_SYNC_INTERVAL_MS = 60000
+REATTACH_ATTEMPTS = 3  # Intentos de reabrir una cámara reconectada (el dispositivo puede tardar en estar listo)
+REATTACH_RETRY_SECONDS = 1.0
 
 # Muestra el estado de una cámara en tiempo real
 @dataclass
@@ -29,232 +35,294 @@ class CameraInfo:
     last_frame_time: Optional[datetime] = None
 
 
-class OrbbecCamera:
-    """Controlador para una cámara Orbbec"""
-    
-    def __init__(self, device, camera_id: int, config: CameraConfig):
-        self.device = device
-        self.camera_id = camera_id
-        self.config = config
-        self.pipeline = None
-        self.is_recording = False
-        self.color_profile = None
-        
-    def initialize(self) -> bool:
-        """Inicializar la cámara"""
-        try:
-            self.pipeline = Pipeline(self.device)
-            ob_config = Config()
-            
-            # Obtener perfil de color
-            profile_list = self.pipeline.get_stream_profile_list(OBSensorType.COLOR_SENSOR)
-            
-            # Intentar usar la resolución configurada
-            self.color_profile = profile_list.get_video_stream_profile(
-                self.config.resolution_width, 
-                self.config.resolution_height, 
-                OBFormat.RGB, 
-                self.config.fps
-            )
-            
-            if not self.color_profile:
-                # Usar perfil por defecto si no encuentra la resolución específica
-                self.color_profile = profile_list.get_default_video_stream_profile()
-                print(f"Cámara {self.camera_id}: Usando resolución por defecto: "
-                      f"{self.color_profile.get_width()}x{self.color_profile.get_height()}@{self.color_profile.get_fps()}fps")
-            
-            ob_config.enable_stream(self.color_profile)
-            self.pipeline.start(ob_config)
-            
-            print(f"Cámara {self.camera_id} inicializada correctamente")
-            return True
-            
-        except Exception as e:
-            print(f"Error inicializando cámara {self.camera_id}: {e}")
-            return False
-    
-    def start_recording(self) -> bool:
-        """Iniciar modo de grabación (solo marca el estado, no graba archivos)"""
-        if not self.pipeline:
-            print(f"Cámara {self.camera_id}: No inicializada")
-            return False
-            
-        self.is_recording = True
-        print(f"Cámara {self.camera_id}: Modo grabación activado")
-        return True
-    
-    def stop_recording(self) -> bool:
-        """Detener modo de grabación"""
-        self.is_recording = False
-        print(f"Cámara {self.camera_id}: Modo grabación desactivado")
-        return True
-    
-    def _frame_to_bgr_image(self, frame) -> Optional[np.ndarray]:
-        """Convertir frame de Orbbec a imagen BGR para OpenCV"""
-        try:
-            width = frame.get_width()
-            height = frame.get_height()
-            color_format = frame.get_format()
-            data = np.asanyarray(frame.get_data())
-            
-            if color_format == OBFormat.RGB:
-                image = np.reshape(data, (height, width, 3))
-                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-            elif color_format == OBFormat.BGR:
-                image = np.reshape(data, (height, width, 3))
-            else:
-                print(f"Formato de color no soportado: {color_format}")
-                return None
-                
-            return image
-            
-        except Exception as e:
-            print(f"Error convirtiendo frame: {e}")
-            return None
-    
-    def get_frame(self) -> Optional[np.ndarray]:
-        """Obtener frame actual de la cámara (para preview)"""
-        if not self.pipeline:
-            print(f"Cámara {self.camera_id}: Pipeline no inicializado")
-            return None
-            
-        try:
-            #print(f"Cámara {self.camera_id}: Intentando obtener frames...")
-            # Obtener frames con timeout más largo
-            frames = self.pipeline.wait_for_frames(1000)  
-            if not frames:
-                print(f"Cámara {self.camera_id}: wait_for_frames devolvió None")
-                return None
-                
-            #print(f"Cámara {self.camera_id}: Frames obtenidos, buscando color frame...")
-            color_frame = frames.get_color_frame()
-            if not color_frame:
-                print(f"Cámara {self.camera_id}: No se pudo obtener color frame")
-                return None
-            
-            #print(f"Cámara {self.camera_id}: Color frame obtenido, convirtiendo...")
-            # Convertir a formato OpenCV (BGR)
-            result = self._frame_to_bgr_image(color_frame)
-            if result is None:
-                print(f"Cámara {self.camera_id}: Error en conversión de frame")
-    
-                
-            return result
-            
-        except Exception as e:
-            print(f"Error obteniendo frame de cámara {self.camera_id}: {e}")
-            import traceback
-            traceback.print_exc()
-            return None
-    
-    def get_real_fps(self) -> int: # Se emplea en _create_new_writers en video_processor.py
-        """Obtener el FPS real del perfil de la cámara"""
-        if self.color_profile:
-            return self.color_profile.get_fps()
-        return 30  # FPS por defecto
-    
-    def cleanup(self):
-        """Limpiar recursos de la cámara"""
-        try:
-            if self.pipeline:
-                self.pipeline.stop()
-                self.pipeline = None
-            print(f"Cámara {self.camera_id}: Recursos liberados")
-        except Exception as e:
-            print(f"Error limpiando cámara {self.camera_id}: {e}")
-
-
 class CameraManager:
-    """Gestor principal de cámaras Orbbec"""
+    """Gestor principal de cámaras (Orbbec o simuladas, según SystemConfig.CAMERA_BACKEND)"""
     
-    def __init__(self):
-        self.cameras: Dict[int, OrbbecCamera] = {}
+    def __init__(self, backend: Optional[str] = None):
+        self.backend = backend or SystemConfig.CAMERA_BACKEND
+        if self.backend not in (BACKEND_ORBBEC, BACKEND_SIMULATED):
+            raise ValueError(f"Backend de cámaras desconocido: {self.backend}")
+        self.cameras: Dict[int, BaseCamera] = {}
         self.camera_configs: Dict[int, CameraConfig] = {}
         self.recording_active = False
-        self.context = None
+        self._context = None
+        # Perfil negociado por número de serie: (configuración pedida, perfil). Sobrevive a cleanup()
+        self.profile_cache: Dict[str, Tuple[tuple, StreamProfile]] = {}
+        self._usb_semaphore = threading.BoundedSemaphore(max(1, SystemConfig.CAMERA_INIT.max_concurrent_usb))
+        self._cameras_lock = threading.Lock()
+        # Dispositivos por número de serie (camera_id estable), al día con los avisos de conexión del SDK
+        self.registry = DeviceRegistry(SystemConfig.MAX_CAMERAS)
+        self.registry.add_listener(self._on_device_changed)
+        self._registry_scanned = False
+        # Vista previa por camera_id (se crea con el primer visor; lee la cámara actual en cada frame)
+        self.previews: Dict[int, PreviewStream] = {}
         
         # Crear directorios necesarios
         SystemConfig.ensure_directories()
+    
+    @property
+    def context(self):
+        """Contexto Orbbec, creado en el primer uso
+
+        Los procesos codificadores importan este paquete y no deben abrir el SDK.
+        """
+        if not ORBBEC_AVAILABLE:
+            raise RuntimeError(ORBBEC_UNAVAILABLE_MESSAGE)
+        if self._context is None:
+            try:
+                self._context = orbbec_camera.Context()
+                print("Contexto Orbbec inicializado")
+            except Exception as e:
+                raise RuntimeError(f"Error inicializando contexto Orbbec: {e}")
+            if SystemConfig.SYNC.mode == SYNC_MODE_HARDWARE:
+                try:
+                    # Alinear periódicamente los relojes de las cámaras para comparar sus timestamps
+                    self._context.enable_multi_device_sync(DEVICE_CLOCK_SYNC_INTERVAL_MS)
+                except Exception as e:
+                    print(f"No se pudieron sincronizar los relojes de las cámaras: {e}")
+            try:
+                # Avisos de conexión y desconexión: el registro no vuelve a enumerar el USB
+                self._context.set_device_changed_callback(self._on_sdk_devices_changed)
+                self.registry.live = True
+            except Exception as e:
+                print(f"Sin avisos de conexión del SDK, se enumerará el USB en cada descubrimiento: {e}")
+        return self._context
+    
+    def _ensure_registry(self):
+        """Poblar el registro de dispositivos en el primer uso (o en cada uso si el SDK no avisa de los cambios)"""
+        if self.backend == BACKEND_SIMULATED:
+            if not self._registry_scanned:
+                # Cámaras virtuales configuradas en SystemConfig.SIMULATED_CAMERA (sin USB: siempre "en vivo")
+                count = min(SystemConfig.SIMULATED_CAMERA.num_cameras, SystemConfig.MAX_CAMERAS)
+                self.registry.scan({f"SIM-{i:04d}": None for i in range(count)})
+                self.registry.live = True
+                self._registry_scanned = True
+            return
         
-        # Inicializar contexto Orbbec
+        context = self.context
+        if self._registry_scanned and self.registry.live:
+            return
+        device_list = context.query_devices()
+        devices = {}
+        for i in range(device_list.get_count()):
+            try:
+                device = device_list[i]
+                devices[device.get_device_info().get_serial_number()] = device
+            except Exception as e:
+                print(f"Error procesando cámara {i}: {e}")
+        self.registry.scan(devices)
+        self._registry_scanned = True
+    
+    def _on_sdk_devices_changed(self, removed_list, added_list):
+        """Aviso del SDK (hilo del SDK): dispositivos desconectados y conectados"""
         try:
-            self.context = Context()
-            print("Contexto Orbbec inicializado")
+            for i in range(removed_list.get_count()):
+                self.registry.device_removed(removed_list.get_device_serial_number_by_index(i))
+            for i in range(added_list.get_count()):
+                device = added_list[i]
+                self.registry.device_added(device.get_device_info().get_serial_number(), device)
         except Exception as e:
-            raise RuntimeError(f"Error inicializando contexto Orbbec: {e}")
+            print(f"Error procesando cambio de dispositivos USB: {e}")
     
-    def discover_cameras(self) -> List[CameraInfo]:
-        """Descubrir cámaras Orbbec conectadas"""
-        cameras_found = []
+    def _on_device_changed(self, event: str, entry: RegisteredDevice):
+        """Suspender o reabrir la cámara inicializada afectada, sin tocar las demás
         
+        Se llama desde el hilo del SDK: el trabajo con el dispositivo va a un hilo aparte.
+        """
+        camera = self.cameras.get(entry.camera_id)
+        if camera is None:
+            return
+        if event == DEVICE_REMOVED:
+            camera.attached = False  # Antes de volver: un aviso de reconexión inmediato la reabrirá
+            threading.Thread(target=camera.detach, name=f"desconectar-camara{entry.camera_id}", daemon=True).start()
+        elif event == DEVICE_ADDED and not camera.attached:
+            threading.Thread(target=self._reattach_camera, args=(camera, entry),
+                             name=f"reconectar-camara{entry.camera_id}", daemon=True).start()
+    
+    def _reattach_camera(self, camera: BaseCamera, entry: RegisteredDevice):
+        """Reabrir una cámara reconectada con su perfil cacheado (hilo de reconexión)"""
+        device = entry.device
+        for attempt in range(1, REATTACH_ATTEMPTS + 1):
+            if not entry.connected or entry.device is not device:
+                return  # Se ha vuelto a desconectar: esperará al siguiente aviso
+            with self._usb_semaphore:
+                reattached = camera.reattach(device)
+            if reattached:
+                print(f"Cámara {camera.camera_id}: Reconectada (intento {attempt})")
+                return
+            time.sleep(REATTACH_RETRY_SECONDS)
+        print(f"Cámara {camera.camera_id}: No se pudo reabrir tras reconectarse")
+    
+    def discover_cameras(self) -> List[CameraInfo]:
+        """Cámaras conectadas, según el registro de dispositivos (no enumera el USB si el SDK avisa de los cambios)"""
         try:
-            device_list = self.context.query_devices()
-            device_count = device_list.get_count()
-            
-            if device_count == 0:
-                print("No se encontraron cámaras Orbbec conectadas")
-                return cameras_found
-            
-            print(f"Encontradas {device_count} cámaras Orbbec")
-            
-            for i in range(device_count):
-                try:
-                    device = device_list[i]
-                    device_info = device.get_device_info()
-                    
-                    camera_info = CameraInfo(
-                        camera_id=i,
-                        serial_number=device_info.get_serial_number(),
-                        is_connected=True
-                    )
-                    cameras_found.append(camera_info)
-                    
-                    print(f"Cámara {i}: S/N {device_info.get_serial_number()}")
-                    
-                except Exception as e:
-                    print(f"Error procesando cámara {i}: {e}")
-                    
+            self._ensure_registry()
         except Exception as e:
             print(f"Error descubriendo cámaras: {e}")
             raise RuntimeError(f"Error crítico en descubrimiento de cámaras: {e}")
         
+        cameras_found = [
+            CameraInfo(camera_id=entry.camera_id, serial_number=entry.serial_number, is_connected=True)
+            for entry in self.registry.devices() if entry.connected
+        ]
+        if not cameras_found:
+            print("No se encontraron cámaras conectadas")
+        else:
+            print(f"Encontradas {len(cameras_found)} cámaras ({self.backend}): "
+                  + ", ".join(f"{info.camera_id}=S/N {info.serial_number}" for info in cameras_found))
         return cameras_found
     
     def initialize_camera(self, camera_id: int, config: CameraConfig) -> bool:
         """Inicializar una cámara específica"""
+        return self.initialize_cameras({camera_id: config})[camera_id]['success']
+    
+    def initialize_cameras(self, configs: Dict[int, CameraConfig]) -> Dict[int, Dict[str, Any]]:
+        """Inicializar varias cámaras en paralelo
+        
+        Como mucho CAMERA_INIT.max_concurrent_usb cámaras se abren a la vez; la espera
+        del primer frame ya no ocupa el bus. Retorna, por cámara, el resultado y la
+        duración de cada fase en milisegundos.
+        """
+        start = time.perf_counter()
         try:
-            # Verificar si la cámara ya está inicializada
+            self._ensure_registry()
+        except Exception as e:
+            print(f"Error enumerando cámaras: {e}")
+            return {camera_id: {'success': False, 'error': str(e)} for camera_id in configs}
+        devices = {}
+        for camera_id in configs:
+            entry = self.registry.get(camera_id)
+            if entry is not None and entry.connected:
+                devices[camera_id] = entry.device
+        enumerate_ms = round((time.perf_counter() - start) * 1000, 1)
+        
+        results: Dict[int, Dict[str, Any]] = {}
+        pending = {}
+        for camera_id, config in configs.items():
             if camera_id in self.cameras:
                 print(f"Cámara {camera_id} ya está inicializada")
-                return True
+                results[camera_id] = {'success': True, 'already_initialized': True}
+            elif camera_id not in devices:
+                print(f"Cámara {camera_id}: No está conectada")
+                results[camera_id] = {'success': False, 'error': f"Cámara {camera_id} no conectada"}
+            else:
+                pending[camera_id] = config
+        
+        if pending:
+            with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="iniciar-camara") as executor:
+                futures = {
+                    camera_id: executor.submit(self._initialize_one, camera_id, config, devices[camera_id])
+                    for camera_id, config in pending.items()
+                }
+                for camera_id, future in futures.items():
+                    results[camera_id] = future.result()
+                    results[camera_id]['timings_ms']['enumerate'] = enumerate_ms
+        
+        total_ms = (time.perf_counter() - start) * 1000
+        print(f"Inicialización de {len(pending)} cámaras en {total_ms:.0f} ms "
+              f"(máximo {SystemConfig.CAMERA_INIT.max_concurrent_usb} a la vez)")
+        return results
+    
+    def _initialize_one(self, camera_id: int, config: CameraConfig, device) -> Dict[str, Any]:
+        """Abrir una cámara (hilo de inicialización) y esperar su primer frame"""
+        start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        result: Dict[str, Any] = {'success': False, 'timings_ms': timings}
+        try:
+            if self.backend == BACKEND_SIMULATED:
+                camera = SimulatedCamera(camera_id, config)
+            else:
+                camera = OrbbecCamera(device, camera_id, config)
+            result['serial_number'] = camera.serial_number
             
-            device_list = self.context.query_devices()
+            request_key = StreamProfile.request_key(config)
+            cached = self.profile_cache.get(camera.serial_number) if SystemConfig.CAMERA_INIT.cache_profiles else None
+            profile = cached[1] if cached is not None and cached[0] == request_key else None
             
-            if camera_id >= device_list.get_count():
-                print(f"Cámara {camera_id}: ID fuera de rango")
-                return False
+            wait_start = time.perf_counter()
+            with self._usb_semaphore:
+                timings['usb_wait'] = round((time.perf_counter() - wait_start) * 1000, 1)
+                initialized = camera.initialize(profile)
+            timings.update(camera.init_timings)
             
-            device = device_list[camera_id]
-            camera = OrbbecCamera(device, camera_id, config)
+            if not initialized:
+                if profile is not None:
+                    # El perfil cacheado ya no sirve (p. ej. firmware distinto): se negociará la próxima vez
+                    self.profile_cache.pop(camera.serial_number, None)
+                result['error'] = f"Error inicializando cámara {camera_id}"
+                return result
             
-            if camera.initialize():
+            if camera.serial_number and camera.stream_profile is not None:
+                self.profile_cache[camera.serial_number] = (request_key, camera.stream_profile)
+            with self._cameras_lock:
                 self.cameras[camera_id] = camera
                 self.camera_configs[camera_id] = config
-                return True
-            else:
-                return False
-                
+            
+            first_frame_start = time.perf_counter()
+            result['first_frame'] = camera.wait_first_frame(SystemConfig.CAMERA_INIT.first_frame_timeout_seconds)
+            timings['first_frame'] = round((time.perf_counter() - first_frame_start) * 1000, 1)
+            if not result['first_frame']:
+                print(f"Cámara {camera_id}: Sin frames tras {SystemConfig.CAMERA_INIT.first_frame_timeout_seconds}s")
+            
+            result['success'] = True
+            result['profile_cached'] = camera.profile_cached
+            result['profile'] = asdict(camera.stream_profile) if camera.stream_profile else None
+            return result
+            
         except Exception as e:
             print(f"Error inicializando cámara {camera_id}: {e}")
-            return False
+            result['error'] = str(e)
+            return result
+        finally:
+            timings['total'] = round((time.perf_counter() - start) * 1000, 1)
     
     def get_frame(self, camera_id: int) -> Optional[np.ndarray]:
-        """Obtener frame de una cámara específica"""
+        """Obtener el último frame capturado de una cámara específica (no bloqueante)"""
         if camera_id not in self.cameras:
             return None
         
         return self.cameras[camera_id].get_frame()
     
+    def read_frames(self, camera_id: int, last_index: int) -> List[CapturedFrame]:
+        """Leer los frames de una cámara posteriores a last_index (no bloqueante)"""
+        if camera_id not in self.cameras:
+            return []
+        
+        return self.cameras[camera_id].read_frames(last_index)
+    
+    def check_frame(self, camera_id: int, frame: CapturedFrame) -> bool:
+        """Validar tras escribirlo que el frame no se sobrescribió durante la escritura (lo cuenta si ocurrió)"""
+        if camera_id not in self.cameras:
+            return True
+        
+        return self.cameras[camera_id].check_frame(frame)
+    
+    def get_latest_frame_index(self, camera_id: int) -> int:
+        """Índice del último frame capturado por una cámara (-1 si no hay ninguno)"""
+        if camera_id not in self.cameras:
+            return -1
+        
+        return self.cameras[camera_id].frame_buffer.latest_index
+    
+    def get_preview(self, camera_id: int) -> Optional[PreviewStream]:
+        """Vista previa MJPEG de una cámara inicializada (None si la cámara no existe)"""
+        if camera_id not in self.cameras:
+            return None
+        
+        with self._cameras_lock:
+            if camera_id not in self.previews:
+                self.previews[camera_id] = PreviewStream(camera_id, lambda: self.cameras.get(camera_id),
+                                                         SystemConfig.PREVIEW)
+            return self.previews[camera_id]
+    
+    def get_capture_stats(self) -> Dict[int, Dict[str, int]]:
+        """Contadores de captura (frames perdidos y sobrescritos) por cámara"""
+        return {camera_id: camera.get_capture_stats() for camera_id, camera in self.cameras.items()}
+    
+    def get_camera_health(self) -> Dict[int, Dict[str, Any]]:
+        """Estado de salud cacheado de todas las cámaras (no toca el SDK)"""
+        return {camera_id: camera.get_health() for camera_id, camera in list(self.cameras.items())}
+    
     def start_recording_all(self) -> bool:
         """Iniciar modo de grabación en todas las cámaras"""
         if self.recording_active:
@@ -0,0 +1,118 @@
+# Registro de dispositivos por número de serie
+# El índice de un dispositivo en query_devices() cambia cada vez que el bus USB se vuelve a enumerar.
+# El registro asigna a cada número de serie un camera_id estable la primera vez que lo ve y se mantiene
+# al día con los avisos de conexión/desconexión del SDK, así que descubrir cámaras no toca el USB.
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+DEVICE_ADDED = "added"
+DEVICE_REMOVED = "removed"
+
+
+@dataclass
+class RegisteredDevice:
+    """Dispositivo conocido por el registro"""
+    camera_id: int
+    serial_number: str
+    device: Any = None  # Manejador del SDK (None en cámaras simuladas o si está desconectado)
+    connected: bool = True
+
+
+class DeviceRegistry:
+    """Dispositivos por número de serie, con camera_id estable entre reconexiones
+
+    Lo actualizan scan() (enumeración completa, al arrancar) y los avisos del SDK
+    (device_added / device_removed, desde el hilo del SDK). Los listeners reciben
+    (evento, RegisteredDevice) y no deben bloquear.
+    """
+
+    def __init__(self, max_devices: int):
+        self.max_devices = max_devices
+        self.live = False  # True cuando el SDK avisa de los cambios (si no, hay que volver a escanear)
+        self._devices: Dict[str, RegisteredDevice] = {}
+        self._listeners: List[Callable[[str, RegisteredDevice], None]] = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, callback: Callable[[str, RegisteredDevice], None]):
+        self._listeners.append(callback)
+
+    def scan(self, devices: Dict[str, Any]):
+        """Sustituir el estado por una enumeración completa (número de serie -> dispositivo)"""
+        with self._lock:
+            for entry in self._devices.values():
+                if entry.serial_number not in devices:
+                    entry.connected = False
+                    entry.device = None
+        for serial_number, device in devices.items():
+            self.device_added(serial_number, device, notify=False)
+
+    def device_added(self, serial_number: str, device: Any = None, notify: bool = True) -> Optional[RegisteredDevice]:
+        """Dispositivo conectado (o reconectado): conserva su camera_id si ya se conocía"""
+        with self._lock:
+            entry = self._devices.get(serial_number)
+            if entry is None:
+                camera_id = self._free_camera_id()
+                if camera_id is None:
+                    print(f"Cámara S/N {serial_number} ignorada: ya hay {self.max_devices} cámaras conectadas")
+                    return None
+                entry = RegisteredDevice(camera_id, serial_number, device)
+                self._devices[serial_number] = entry
+            else:
+                entry.device = device
+                entry.connected = True
+        if notify:
+            print(f"Cámara {entry.camera_id} (S/N {serial_number}) conectada")
+            self._notify(DEVICE_ADDED, entry)
+        return entry
+
+    def _free_camera_id(self) -> Optional[int]:
+        """camera_id libre más bajo (con el lock tomado)
+
+        Si todos están reservados, se reutiliza el de un dispositivo desconectado, que sale del registro.
+        """
+        used = {entry.camera_id for entry in self._devices.values()}
+        camera_id = next((camera_id for camera_id in range(self.max_devices) if camera_id not in used), None)
+        if camera_id is not None:
+            return camera_id
+        disconnected = [entry for entry in self._devices.values() if not entry.connected]
+        if not disconnected:
+            return None
+        entry = min(disconnected, key=lambda entry: entry.camera_id)
+        del self._devices[entry.serial_number]
+        print(f"Cámara {entry.camera_id}: el S/N {entry.serial_number} (desconectado) deja su lugar")
+        return entry.camera_id
+
+    def device_removed(self, serial_number: str) -> Optional[RegisteredDevice]:
+        """Dispositivo desconectado: el camera_id queda reservado para cuando vuelva (mientras no falte sitio)"""
+        with self._lock:
+            entry = self._devices.get(serial_number)
+            if entry is None or not entry.connected:
+                return None
+            entry.connected = False
+            entry.device = None
+        print(f"Cámara {entry.camera_id} (S/N {serial_number}) desconectada")
+        self._notify(DEVICE_REMOVED, entry)
+        return entry
+
+    def _notify(self, event: str, entry: RegisteredDevice):
+        for callback in self._listeners:
+            try:
+                callback(event, entry)
+            except Exception as e:
+                print(f"Error notificando cambio de dispositivo: {e}")
+
+    def devices(self) -> List[RegisteredDevice]:
+        """Dispositivos registrados, por camera_id"""
+        with self._lock:
+            return sorted(self._devices.values(), key=lambda entry: entry.camera_id)
+
+    def get(self, camera_id: int) -> Optional[RegisteredDevice]:
+        with self._lock:
+            for entry in self._devices.values():
+                if entry.camera_id == camera_id:
+                    return entry
+        return None
+
+    def __len__(self) -> int:
+        return len(self._devices)
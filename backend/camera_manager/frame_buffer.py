@@ -0,0 +1,133 @@
+# Buffer circular de frames por cámara
+# Un único productor (el hilo de captura de la cámara) y varios consumidores (writers, preview, estado).
+# Los consumidores nunca bloquean: leen el índice publicado por el productor y recorren los slots disponibles.
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+@dataclass
+class CapturedFrame:
+    """Frame capturado por el hilo de captura de una cámara"""
+    index: int  # Índice secuencial asignado al capturar (empieza en 0)
+    image: np.ndarray
+    timestamp: float  # time.time() en el momento de recibir el frame
+    sdk_index: int = -1  # Índice del frame según el SDK (-1 si no está disponible)
+    pixel_format: str = "bgr24"  # "bgr24", "rgb24" (nombres de PyAV) o "mjpeg" (image con los bytes del JPEG)
+    device_timestamp_us: Optional[int] = None  # Timestamp del reloj de la cámara (SDK)
+    system_timestamp_us: Optional[int] = None  # Instante (reloj del host) en que el SDK recibió el frame
+
+
+class FrameRingBuffer:
+    """Buffer circular acotado sin locks (un productor, múltiples lectores)
+
+    El productor escribe el frame en su slot y después publica el nuevo índice.
+    Los lectores solo ven frames ya publicados y detectan los que se han sobrescrito
+    comprobando el índice guardado en cada slot.
+
+    Las imágenes viven en un pool de arrays preasignados con un buffer más que slots:
+    el buffer que el productor está rellenando nunca es uno de los frames publicados.
+    Un frame leído puede quedarse sin margen mientras se usa (el array del más antiguo se
+    reutiliza dos frames después), así que, como en un seqlock, el lector lo valida con
+    is_intact() después de usarlo.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("La capacidad del buffer debe ser al menos 1")
+        self.capacity = capacity
+        self._slots: List[Optional[CapturedFrame]] = [None] * capacity
+        self._pool: List[Optional[np.ndarray]] = [None] * (capacity + 1)
+        self._next_index = 0  # Índice que recibirá el próximo frame (publicado tras escribir el slot)
+
+    def next_buffer(self, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """Array preasignado donde el productor debe escribir el próximo frame
+
+        Solo se reserva memoria la primera vez o si cambia la resolución.
+        """
+        position = self._next_index % len(self._pool)
+        buffer = self._pool[position]
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self._pool[position] = buffer
+        return buffer
+
+    def push(self, image: np.ndarray, timestamp: float, sdk_index: int = -1,
+             pixel_format: str = "bgr24", device_timestamp_us: Optional[int] = None,
+             system_timestamp_us: Optional[int] = None) -> CapturedFrame:
+        """Añadir un frame (solo desde el hilo productor). Sobrescribe el más antiguo si está lleno"""
+        index = self._next_index
+        frame = CapturedFrame(index=index, image=image, timestamp=timestamp,
+                              sdk_index=sdk_index, pixel_format=pixel_format,
+                              device_timestamp_us=device_timestamp_us,
+                              system_timestamp_us=system_timestamp_us)
+        self._slots[index % self.capacity] = frame
+        self._next_index = index + 1
+        return frame
+
+    @property
+    def latest_index(self) -> int:
+        """Índice del último frame publicado (-1 si no hay ninguno)"""
+        return self._next_index - 1
+
+    def latest(self) -> Optional[CapturedFrame]:
+        """Último frame publicado, sin bloquear"""
+        head = self._next_index
+        if head == 0:
+            return None
+        frame = self._slots[(head - 1) % self.capacity]
+        return frame
+
+    def read_since(self, last_index: int) -> Tuple[List[CapturedFrame], int]:
+        """Leer los frames posteriores a last_index, en orden
+
+        Retorna (frames, perdidos), donde perdidos es el número de frames que se
+        sobrescribieron antes de que el lector llegara a ellos.
+        """
+        head = self._next_index
+        start = max(last_index + 1, head - self.capacity, 0)
+        missed = max(0, start - (last_index + 1))
+        frames = []
+        for index in range(start, head):
+            frame = self._slots[index % self.capacity]
+            if frame is None or frame.index != index:
+                # El productor ha dado la vuelta mientras leíamos
+                missed += 1
+                continue
+            frames.append(frame)
+        return frames, missed
+
+    def is_intact(self, frame: CapturedFrame) -> bool:
+        """Comprobar, después de usar el frame, que el productor no ha reutilizado su array
+
+        El array del frame `index` se vuelve a rellenar cuando el productor empieza el frame
+        `index + len(pool)`; si ya ha empezado, lo leído puede mezclar píxeles de otro frame.
+        """
+        return self._next_index - frame.index < len(self._pool)
+
+    def clear(self):
+        """Vaciar el buffer (solo con el productor detenido). Conserva el pool de arrays"""
+        self._slots = [None] * self.capacity
+        self._next_index = 0
+
+
+def to_bgr(image: np.ndarray, pixel_format: str, dst: Optional[np.ndarray] = None) -> np.ndarray:
+    """Obtener la imagen en BGR (OpenCV), escribiendo en dst si se proporciona
+
+    Sin dst siempre retorna un array nuevo, independiente del buffer de captura.
+    Los frames MJPEG se decodifican aquí, solo cuando se piden (preview).
+    """
+    if pixel_format == "mjpeg":
+        image = cv2.imdecode(image, cv2.IMREAD_COLOR)
+        if image is not None and dst is not None:
+            np.copyto(dst, image)
+            return dst
+        return image
+    if pixel_format == "rgb24":
+        return cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=dst)
+    if dst is None:
+        return image.copy()
+    np.copyto(dst, image)
+    return dst
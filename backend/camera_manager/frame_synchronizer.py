@@ -0,0 +1,140 @@
+# Sincronización de frames entre cámaras por timestamp
+# Los hilos de captura publican cada frame con los timestamps del SDK (reloj de la cámara y del host).
+# El sincronizador empareja los frames de todas las cámaras en conjuntos cuya diferencia de timestamps
+# no supera la tolerancia, y mide el error de sincronización que recibirá el análisis de la marcha.
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ..config.settings import SyncConfig
+from .frame_buffer import CapturedFrame
+
+SYNC_MODE_FREE_RUN = "free_run"
+SYNC_MODE_HARDWARE = "hardware"
+TIMESTAMP_SOURCE_SYSTEM = "system"
+TIMESTAMP_SOURCE_DEVICE = "device"
+
+
+def resolve_timestamp_source(config: SyncConfig) -> str:
+    """Reloj con el que se comparan las cámaras
+
+    Los relojes de cámaras sin sincronizar por cable no son comparables entre sí:
+    en ese caso se usa el instante de recepción en el host.
+    """
+    if config.timestamp_source in (TIMESTAMP_SOURCE_SYSTEM, TIMESTAMP_SOURCE_DEVICE):
+        return config.timestamp_source
+    return TIMESTAMP_SOURCE_DEVICE if config.mode == SYNC_MODE_HARDWARE else TIMESTAMP_SOURCE_SYSTEM
+
+
+class FrameSynchronizer:
+    """Empareja en conjuntos los frames de varias cámaras (un productor: el bucle de grabación)
+
+    Mientras todas las cámaras tienen frames pendientes se compara el primero de cada una:
+    si la diferencia entre el más antiguo y el más reciente cabe en la tolerancia se emite el
+    conjunto; si no, el más antiguo no tiene pareja y se descarta del emparejamiento.
+    El desfase de cada comparación se registra aunque no quepa en la tolerancia: con cámaras
+    desfasadas de forma constante la distribución muestra cuánto, en lugar de quedar vacía.
+    Solo guarda índices y timestamps, nunca las imágenes (los buffers de captura se reutilizan).
+    """
+
+    STATS_WINDOW = 300  # Comparaciones recientes sobre las que se calculan los percentiles (~10 s a 30 fps)
+    MAX_PENDING = 120  # Frames pendientes por cámara si otra cámara deja de entregar
+
+    def __init__(self, tolerance_ms: float, timestamp_source: str = TIMESTAMP_SOURCE_SYSTEM):
+        self.tolerance_us = int(tolerance_ms * 1000)
+        self.timestamp_source = timestamp_source
+        self.sets_matched = 0
+        self.max_error_us = 0  # Mayor error de un conjunto emparejado
+        self.unmatched: Dict[int, int] = {}  # Frames sin pareja por cámara
+        self.latest_set: Optional[Dict[int, Tuple[int, int]]] = None  # camera_id -> (índice, timestamp us)
+        self._pending: Dict[int, Deque[Tuple[int, int]]] = {}
+        self._errors: Deque[int] = deque(maxlen=self.STATS_WINDOW)
+        self._lock = threading.Lock()
+
+    def set_cameras(self, camera_ids: Iterable[int]):
+        """Cámaras que forman cada conjunto (reinicia el estado)"""
+        with self._lock:
+            self._pending = {camera_id: deque() for camera_id in camera_ids}
+            self.unmatched = {camera_id: 0 for camera_id in self._pending}
+            self.sets_matched = 0
+            self.max_error_us = 0
+            self.latest_set = None
+            self._errors.clear()
+
+    def frame_timestamp_us(self, frame: CapturedFrame) -> int:
+        """Timestamp de un frame en el reloj elegido (con respaldo al instante de captura del host)"""
+        if self.timestamp_source == TIMESTAMP_SOURCE_DEVICE and frame.device_timestamp_us is not None:
+            return frame.device_timestamp_us
+        if frame.system_timestamp_us is not None:
+            return frame.system_timestamp_us
+        return int(frame.timestamp * 1_000_000)
+
+    def add_frames(self, camera_id: int, frames: List[CapturedFrame]):
+        """Añadir los frames leídos de una cámara, en orden"""
+        pending = self._pending.get(camera_id)
+        if pending is None:
+            return
+        for frame in frames:
+            pending.append((frame.index, self.frame_timestamp_us(frame)))
+        overflow = len(pending) - self.MAX_PENDING
+        if overflow > 0:
+            for _ in range(overflow):
+                pending.popleft()
+            self.unmatched[camera_id] += overflow
+
+    def match(self) -> List[Dict[int, Tuple[int, int]]]:
+        """Emitir los conjuntos completos disponibles"""
+        matched = []
+        pending = self._pending
+        if not pending:
+            return matched
+        with self._lock:
+            while all(pending.values()):
+                heads = {camera_id: frames[0] for camera_id, frames in pending.items()}
+                oldest = min(heads, key=lambda camera_id: heads[camera_id][1])
+                newest = max(heads, key=lambda camera_id: heads[camera_id][1])
+                error = heads[newest][1] - heads[oldest][1]
+                self._errors.append(error)
+                if error <= self.tolerance_us:
+                    for frames in pending.values():
+                        frames.popleft()
+                    self.max_error_us = max(self.max_error_us, error)
+                    self.sets_matched += 1
+                    self.latest_set = heads
+                    matched.append(heads)
+                else:
+                    pending[oldest].popleft()
+                    self.unmatched[oldest] += 1
+        return matched
+
+    def get_stats(self) -> dict:
+        """Estadísticas del error de sincronización (en milisegundos)
+
+        error_ms resume el desfase entre cámaras de todas las comparaciones recientes, emparejadas
+        o no; max_error_ms es el mayor error de los conjuntos emparejados.
+        """
+        with self._lock:
+            errors = np.asarray(self._errors, dtype=np.float64) / 1000.0
+            unmatched = dict(self.unmatched)
+            sets_matched = self.sets_matched
+            latest = self.latest_set
+        total_unmatched = sum(unmatched.values())
+        candidates = sets_matched * max(1, len(unmatched)) + total_unmatched
+        stats = {
+            'timestamp_source': self.timestamp_source,
+            'tolerance_ms': self.tolerance_us / 1000.0,
+            'sets_matched': sets_matched,
+            'unmatched_frames': unmatched,
+            'match_rate': round(1.0 - total_unmatched / candidates, 4) if candidates else None,
+            'max_error_ms': round(self.max_error_us / 1000.0, 3),
+            'latest_set': {camera_id: index for camera_id, (index, _) in latest.items()} if latest else None
+        }
+        if errors.size:
+            p50, p95 = np.percentile(errors, [50, 95])
+            stats['error_ms'] = {'mean': round(float(errors.mean()), 3), 'p50': round(float(p50), 3),
+                                 'p95': round(float(p95), 3), 'max': round(float(errors.max()), 3)}
+        else:
+            stats['error_ms'] = None
+        return stats
@@ -0,0 +1,242 @@
+# Backend de cámaras Orbbec (pyorbbecsdk)
+# El SDK se importa de forma opcional: sin él el sistema puede funcionar con cámaras simuladas.
+from time import perf_counter
+from typing import Optional, Tuple
+
+import numpy as np
+
+from ..config.settings import CameraConfig, SystemConfig
+from .base_camera import BaseCamera, StreamProfile, SDK_WAIT_SECONDS, FRAME_CONVERSION_SECONDS
+from .frame_synchronizer import SYNC_MODE_HARDWARE
+
+# Importación del SDK de Orbbec
+try:
+    from pyorbbecsdk import *
+    ORBBEC_AVAILABLE = True
+except ImportError:
+    ORBBEC_AVAILABLE = False
+
+ORBBEC_UNAVAILABLE_MESSAGE = (
+    "PyOrbbecSDK no está disponible. "
+    "Instala el SDK de Orbbec correctamente antes de usar este sistema "
+    "(ver docs/INSTALACION_SDK.md) o usa cámaras simuladas con CAMERA_BACKEND=simulated."
+)
+
+
+class OrbbecCamera(BaseCamera):
+    """Controlador para una cámara Orbbec"""
+
+    backend = "orbbec"
+
+    def __init__(self, device, camera_id: int, config: CameraConfig):
+        super().__init__(camera_id, config)
+        self.device = device
+        self.pipeline = None
+        try:
+            self.serial_number = device.get_device_info().get_serial_number()
+        except Exception:
+            self.serial_number = ""
+
+    def initialize(self, profile: Optional[StreamProfile] = None) -> bool:
+        """Inicializar la cámara (con el perfil cacheado, si lo hay, sin volver a negociar)"""
+        try:
+            self.init_timings = {}
+            with self._phase("open"):
+                self._apply_sync_mode()
+                self.pipeline = Pipeline(self.device)
+            ob_config = Config()
+
+            with self._phase("profile"):
+                self.profile_cached = profile is not None and self._enable_cached_profile(ob_config, profile)
+                if self.profile_cached:
+                    self.stream_profile = profile
+                else:
+                    color_profile = self._negotiate_profile()
+                    ob_config.enable_stream(color_profile)
+                    format_names = {value: name for name, value in self._sdk_formats().items()}
+                    self.stream_profile = StreamProfile(
+                        color_profile.get_width(), color_profile.get_height(), color_profile.get_fps(),
+                        format_names.get(color_profile.get_format(), str(color_profile.get_format()))
+                    )
+
+            with self._phase("start"):
+                self.pipeline.start(ob_config)
+                self.start_capture()
+
+            print(f"Cámara {self.camera_id} inicializada correctamente"
+                  + (" (perfil cacheado)" if self.profile_cached else ""))
+            return True
+
+        except Exception as e:
+            print(f"Error inicializando cámara {self.camera_id}: {e}")
+            return False
+
+    @property
+    def is_initialized(self) -> bool:
+        return self.pipeline is not None
+
+    def _negotiate_profile(self):
+        """Consultar los perfiles de color del dispositivo y elegir el de la configuración"""
+        profile_list = self.pipeline.get_stream_profile_list(OBSensorType.COLOR_SENSOR)
+
+        # Intentar usar la resolución configurada, con el formato configurado o el alternativo (RGB/BGR)
+        for color_format in self._preferred_formats():
+            try:
+                color_profile = profile_list.get_video_stream_profile(
+                    self.config.resolution_width,
+                    self.config.resolution_height,
+                    color_format,
+                    self.config.fps
+                )
+            except Exception:
+                color_profile = None
+            if color_profile:
+                return color_profile
+
+        # Usar perfil por defecto si no encuentra la resolución específica
+        color_profile = profile_list.get_default_video_stream_profile()
+        print(f"Cámara {self.camera_id}: Usando resolución por defecto: "
+              f"{color_profile.get_width()}x{color_profile.get_height()}@{color_profile.get_fps()}fps")
+        return color_profile
+
+    def _enable_cached_profile(self, ob_config, profile: StreamProfile) -> bool:
+        """Activar directamente el perfil ya negociado, sin consultar la lista de perfiles
+
+        Requiere Config.enable_video_stream (SDK v2); si no está, se negocia como siempre.
+        """
+        color_format = self._sdk_formats().get(profile.format)
+        if color_format is None or not hasattr(ob_config, "enable_video_stream"):
+            return False
+        try:
+            ob_config.enable_video_stream(OBStreamType.COLOR_STREAM, profile.width, profile.height,
+                                          profile.fps, color_format)
+            return True
+        except Exception as e:
+            print(f"Cámara {self.camera_id}: No se pudo usar el perfil cacheado, negociando: {e}")
+            return False
+
+    @staticmethod
+    def _sdk_formats() -> dict:
+        return {'RGB': OBFormat.RGB, 'BGR': OBFormat.BGR, 'MJPG': OBFormat.MJPG}
+
+    def _preferred_formats(self) -> list:
+        """Formatos de color a negociar, en orden de preferencia
+
+        Con format="MJPG" la cámara entrega JPEG comprimidos (menos ancho de banda USB)
+        y, si no lo soporta, se vuelve a RGB/BGR.
+        """
+        formats = self._sdk_formats()
+        preferred = self.config.format.upper()
+        order = [preferred] + [name for name in ('RGB', 'BGR') if name != preferred]
+        return [formats[name] for name in order if name in formats]
+
+    def _apply_sync_mode(self):
+        """Configurar la sincronización por cable (SyncConfig.mode = "hardware") si el modelo la soporta
+
+        La cámara primaria genera la señal de disparo y las secundarias capturan con ella,
+        así que los frames de todas las cámaras se exponen a la vez.
+        """
+        sync = SystemConfig.SYNC
+        if sync.mode != SYNC_MODE_HARDWARE:
+            return
+        try:
+            is_primary = self.serial_number == sync.primary_serial if sync.primary_serial else self.camera_id == 0
+            mode = OBMultiDeviceSyncMode.PRIMARY if is_primary else OBMultiDeviceSyncMode.SECONDARY_SYNCED
+            if not self.device.get_supported_multi_device_sync_mode_bitmap() & int(mode):
+                print(f"Cámara {self.camera_id}: El modelo no soporta sincronización por hardware, "
+                      f"se usará el reloj del host")
+                return
+            sync_config = self.device.get_multi_device_sync_config()
+            sync_config.mode = mode
+            sync_config.trigger_out_enable = True  # Encadenar la señal hacia la siguiente cámara
+            self.device.set_multi_device_sync_config(sync_config)
+            self.sync_role = "primary" if is_primary else "secondary"
+            print(f"Cámara {self.camera_id}: Sincronización por hardware como {self.sync_role}")
+        except Exception as e:
+            print(f"Cámara {self.camera_id}: No se pudo configurar la sincronización por hardware: {e}")
+
+    def _read_frame(self, timeout_ms: int):
+        """Esperar el siguiente frame de color del pipeline"""
+        started = perf_counter()
+        frames = self.pipeline.wait_for_frames(timeout_ms)
+        received = perf_counter()
+        SDK_WAIT_SECONDS.observe(received - started, self.camera_id)
+        if not frames:
+            return None
+
+        color_frame = frames.get_color_frame()
+        if not color_frame:
+            return None
+
+        converted = self._frame_to_image(color_frame)
+        FRAME_CONVERSION_SECONDS.observe(perf_counter() - received, self.camera_id)
+        image, pixel_format = converted if converted is not None else (None, None)
+        try:
+            system_timestamp_us = color_frame.get_system_timestamp_us()
+        except AttributeError:
+            system_timestamp_us = None  # Versiones del SDK sin timestamp de host
+        return image, pixel_format, color_frame.get_index(), color_frame.get_timestamp_us(), system_timestamp_us
+
+    def _frame_to_image(self, frame) -> Optional[Tuple[np.ndarray, str]]:
+        """Copiar el frame de Orbbec al buffer preasignado del siguiente slot, sin convertir el color
+
+        Retorna (imagen, formato de píxel). El codificador consume RGB o BGR directamente,
+        así que la única operación por frame es una copia a memoria ya reservada.
+        Los frames MJPG se guardan como bytes del JPEG, sin decodificar.
+        """
+        try:
+            width = frame.get_width()
+            height = frame.get_height()
+            color_format = frame.get_format()
+
+            if color_format == OBFormat.MJPG:
+                # Tamaño variable por frame: copia de los bytes comprimidos (~10x menos que RGB)
+                return np.array(frame.get_data(), dtype=np.uint8, copy=True).reshape(-1), "mjpeg"
+            elif color_format == OBFormat.RGB:
+                pixel_format = "rgb24"
+            elif color_format == OBFormat.BGR:
+                pixel_format = "bgr24"
+            else:
+                print(f"Formato de color no soportado: {color_format}")
+                return None
+
+            data = np.asanyarray(frame.get_data())
+            image = self.frame_buffer.next_buffer((height, width, 3))
+            np.copyto(image, data.reshape((height, width, 3)))
+            return image, pixel_format
+
+        except Exception as e:
+            print(f"Error convirtiendo frame: {e}")
+            return None
+
+    def _frame_size_from_profile(self) -> Optional[Tuple[int, int]]:
+        if self.stream_profile:
+            return self.stream_profile.width, self.stream_profile.height
+        return None
+
+    def get_real_fps(self) -> int: # Se emplea en _open_writer en video_processor.py
+        """Obtener el FPS real del perfil de la cámara"""
+        if self.stream_profile:
+            return self.stream_profile.fps
+        return 30  # FPS por defecto
+
+    def _release_device(self):
+        """Detener el pipeline del dispositivo desconectado (el SDK puede fallar al hacerlo)"""
+        pipeline, self.pipeline = self.pipeline, None
+        if pipeline:
+            pipeline.stop()
+
+    def _attach_device(self, device):
+        if device is not None:
+            self.device = device
+
+    def cleanup(self):
+        """Limpiar recursos de la cámara"""
+        try:
+            self.stop_capture()
+            if self.pipeline:
+                self.pipeline.stop()
+                self.pipeline = None
+            print(f"Cámara {self.camera_id}: Recursos liberados")
+        except Exception as e:
+            print(f"Error limpiando cámara {self.camera_id}: {e}")
@@ -0,0 +1,135 @@
+# Vista previa en vivo de una cámara (MJPEG o instantáneas JPEG)
+# Un hilo por cámara toma el último frame del buffer circular, lo reduce y lo codifica a JPEG
+# como mucho PreviewConfig.fps veces por segundo mientras haya visores o se pidan instantáneas.
+# Todos comparten ese JPEG, así que el coste no depende de cuántos navegadores miran la cámara
+# y nunca frena la captura.
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+import cv2
+
+from ..config.settings import PreviewConfig
+from .base_camera import BaseCamera
+from .frame_buffer import CapturedFrame
+
+# Decodificación JPEG reducida (más barata que decodificar completo y reducir después)
+_REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                         (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+class PreviewStream:
+    """JPEG reducido del último frame de una cámara, compartido por todos sus visores"""
+
+    IDLE_STOP_SECONDS = 5.0  # Sin visores durante este tiempo, el hilo de codificación termina
+    SNAPSHOT_HOLD_SECONDS = 2.0  # Tras una instantánea se sigue codificando como si hubiera un visor
+
+    def __init__(self, camera_id: int, get_camera: Callable[[], Optional[BaseCamera]], config: PreviewConfig):
+        self.camera_id = camera_id
+        self.get_camera = get_camera
+        self.config = config
+        self.jpeg: Optional[bytes] = None
+        self.sequence = 0  # Aumenta con cada JPEG nuevo
+        self.viewers = 0
+        self.frames_encoded = 0
+        self._snapshot_at = 0.0  # Última instantánea pedida (time.monotonic())
+        self._thread: Optional[threading.Thread] = None
+        self._condition = threading.Condition()
+
+    def add_viewer(self) -> bool:
+        """Registrar un visor (arranca la codificación). False si ya hay max_viewers"""
+        with self._condition:
+            if self.viewers >= self.config.max_viewers:
+                return False
+            self.viewers += 1
+            self._start_thread()
+            return True
+
+    def snapshot(self, timeout: float) -> Optional[bytes]:
+        """Último JPEG, para clientes que lo piden periódicamente en lugar de mantener un MJPEG abierto
+
+        Si la codificación estaba parada, espera hasta timeout al primer JPEG.
+        """
+        with self._condition:
+            self._snapshot_at = time.monotonic()
+            self._start_thread()
+            self._condition.wait_for(lambda: self.jpeg is not None, timeout=timeout)
+            return self.jpeg
+
+    def _start_thread(self):
+        """Arrancar el hilo de codificación si no está en marcha (con _condition tomado)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"preview-camara{self.camera_id}", daemon=True)
+            self._thread.start()
+
+    def remove_viewer(self):
+        with self._condition:
+            self.viewers = max(0, self.viewers - 1)
+
+    def wait_frame(self, last_sequence: int, timeout: float) -> Tuple[int, Optional[bytes]]:
+        """Esperar un JPEG posterior a last_sequence. Al agotar timeout retorna el último disponible"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.sequence != last_sequence, timeout=timeout)
+            return self.sequence, self.jpeg
+
+    def _run(self):
+        """Hilo de codificación: un JPEG por periodo, solo si hay un frame nuevo"""
+        period = 1.0 / max(0.1, self.config.fps)
+        last_index = -1
+        idle_since: Optional[float] = None
+        while True:
+            started = time.monotonic()
+            with self._condition:
+                if self.viewers == 0 and started - self._snapshot_at > self.SNAPSHOT_HOLD_SECONDS:
+                    idle_since = idle_since or started
+                    if started - idle_since > self.IDLE_STOP_SECONDS:
+                        self._thread = None
+                        self.jpeg = None  # Al volver a arrancar no se sirve una imagen antigua
+                        return
+                else:
+                    idle_since = None
+
+            camera = self.get_camera()
+            latest = camera.frame_buffer.latest() if camera is not None else None
+            if latest is not None and latest.index != last_index:
+                last_index = latest.index
+                try:
+                    jpeg = self._encode(latest, camera)
+                    if jpeg is not None and not camera.frame_buffer.is_intact(latest):
+                        jpeg = None  # El productor reutilizó el array mientras se codificaba
+                except Exception as e:
+                    print(f"Cámara {self.camera_id}: Error codificando la vista previa: {e}")
+                    jpeg = None
+                if jpeg is not None:
+                    with self._condition:
+                        self.jpeg = jpeg
+                        self.sequence += 1
+                        self.frames_encoded += 1
+                        self._condition.notify_all()
+
+            time.sleep(max(0.0, period - (time.monotonic() - started)))
+
+    def _encode(self, frame: CapturedFrame, camera: BaseCamera) -> Optional[bytes]:
+        """Reducir a max_width y codificar a JPEG (los MJPG ya pequeños se reenvían tal cual)"""
+        max_width = self.config.max_width
+        if frame.pixel_format == "mjpeg":
+            frame_size = camera.get_frame_size()
+            width = frame_size[0] if frame_size else max_width
+            if width <= max_width:
+                return frame.image.tobytes()
+            flag = next((flag for factor, flag in _REDUCED_DECODE_FLAGS if width // factor >= max_width),
+                        cv2.IMREAD_COLOR)
+            image = cv2.imdecode(frame.image, flag)
+            if image is None:
+                return None
+        else:
+            image = frame.image
+
+        height, width = image.shape[:2]
+        if width > max_width:
+            # Reducir antes de convertir el color: la conversión se hace sobre la imagen pequeña
+            image = cv2.resize(image, (max_width, max(1, height * max_width // width)), interpolation=cv2.INTER_AREA)
+        if frame.pixel_format == "rgb24":
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, self.config.jpeg_quality])
+        return encoded.tobytes() if ok else None
@@ -0,0 +1,208 @@
+# Backend de cámaras simuladas (sin hardware)
+# Entrega frames sintéticos o de un vídeo grabado al ritmo configurado, con jitter y pérdidas,
+# para probar y medir el pipeline completo (captura, codificación, envío, API) en cualquier máquina.
+import math
+import random
+import time
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from ..config.settings import CameraConfig, SimulatedCameraConfig, SystemConfig
+from .base_camera import BaseCamera, StreamProfile, SDK_WAIT_SECONDS, FRAME_CONVERSION_SECONDS
+from .frame_synchronizer import SYNC_MODE_HARDWARE
+
+MAX_LAG_SECONDS = 1.0  # Si el consumidor se retrasa más, los frames atrasados se pierden (como en el dispositivo)
+_TRIGGER_EPOCH = time.monotonic()  # Reloj común de disparo de las cámaras en modo "hardware"
+
+
+class SimulatedCamera(BaseCamera):
+    """Cámara virtual con la misma interfaz que OrbbecCamera"""
+
+    backend = "simulated"
+
+    def __init__(self, camera_id: int, config: CameraConfig, sim_config: Optional[SimulatedCameraConfig] = None):
+        super().__init__(camera_id, config)
+        self.sim_config = sim_config or SystemConfig.SIMULATED_CAMERA
+        self.serial_number = f"SIM-{camera_id:04d}"
+        self.pixel_format = "rgb24"
+        self._frames: Optional[List[np.ndarray]] = None
+        self._random = random.Random(camera_id)
+        self._start = 0.0
+        self._next_index = 0
+        self._next_due = 0.0
+        self._device_clock_start = 0.0  # Instante (monotonic) en que el reloj de la cámara vale 0
+        self._wall_offset = 0.0  # time.time() - time.monotonic(), para el timestamp de host
+
+    def initialize(self, profile: Optional[StreamProfile] = None) -> bool:
+        """Preparar los frames y arrancar la captura
+
+        open_delay_ms y profile_delay_ms imitan la apertura USB y la negociación de perfil
+        de una cámara real; con un perfil cacheado no hay negociación.
+        """
+        try:
+            self.init_timings = {}
+            with self._phase("open"):
+                time.sleep(self.sim_config.open_delay_ms / 1000.0)
+            with self._phase("profile"):
+                self.profile_cached = profile is not None
+                if not self.profile_cached:
+                    time.sleep(self.sim_config.profile_delay_ms / 1000.0)
+                    profile = StreamProfile(self.config.resolution_width, self.config.resolution_height,
+                                            self.config.fps, self.config.format.upper())
+                self.stream_profile = profile
+
+            with self._phase("prepare"):
+                frames = self._load_replay() if self.sim_config.replay_path else self._generate_pattern()
+                if not frames:
+                    print(f"Cámara {self.camera_id}: No hay frames que simular")
+                    return False
+                self._frames = self._convert_frames(frames)
+
+            with self._phase("start"):
+                self._start_clock()
+                self.start_capture()
+
+            print(f"Cámara simulada {self.camera_id} inicializada: {self.config.resolution_width}x"
+                  f"{self.config.resolution_height}@{self.config.fps}fps ({self.pixel_format}, "
+                  f"jitter {self.sim_config.jitter_ms}ms, pérdidas {self.sim_config.dropout_rate:.1%})")
+            return True
+
+        except Exception as e:
+            print(f"Error inicializando cámara simulada {self.camera_id}: {e}")
+            return False
+
+    def _convert_frames(self, frames: List[np.ndarray]) -> list:
+        """Pasar los frames BGR al formato de la cámara"""
+        color_format = self.stream_profile.format
+        if color_format == "MJPG":
+            # Se codifican una vez: el hilo de captura solo entrega los bytes, como la cámara real
+            self.pixel_format = "mjpeg"
+            frames = [cv2.imencode('.jpg', frame)[1].reshape(-1) for frame in frames]
+        elif color_format == "BGR":
+            self.pixel_format = "bgr24"
+        else:
+            self.pixel_format = "rgb24"
+            frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+        return frames
+
+    @property
+    def is_initialized(self) -> bool:
+        return self._frames is not None
+
+    def _start_clock(self):
+        """Fase de la rejilla de frames y origen del reloj de la cámara
+
+        En modo "hardware" todas las cámaras exponen en la misma rejilla y sus relojes comparten
+        origen; en "free_run" cada una empieza cuando se inicializa y su reloj tiene otro origen.
+        """
+        now = time.monotonic()
+        sync = SystemConfig.SYNC
+        if sync.mode == SYNC_MODE_HARDWARE:
+            periods = math.ceil((now - _TRIGGER_EPOCH) * self.config.fps)
+            self._start = _TRIGGER_EPOCH + periods / self.config.fps
+            self._device_clock_start = _TRIGGER_EPOCH
+            is_primary = self.serial_number == sync.primary_serial if sync.primary_serial else self.camera_id == 0
+            self.sync_role = "primary" if is_primary else "secondary"
+        else:
+            self._start = now
+            self._device_clock_start = now - self._random.uniform(0.0, 1000.0)
+        self._wall_offset = time.time() - now
+        self._next_index = 0
+        self._next_due = self._start
+
+    def _generate_pattern(self) -> List[np.ndarray]:
+        """Patrón BGR en movimiento con el número de cámara y de frame"""
+        width, height = self.config.resolution_width, self.config.resolution_height
+        count = max(1, self.sim_config.loop_frames)
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+        frames = []
+        for i in range(count):
+            shift = 255.0 * i / count
+            frame = np.empty((height, width, 3), dtype=np.uint8)
+            frame[..., 0] = (x + shift) % 256
+            frame[..., 1] = (y + shift) % 256
+            frame[..., 2] = (40 * self.camera_id) % 256
+            cv2.putText(frame, f"SIM {self.camera_id} #{i}", (20, height // 2),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
+            frames.append(frame)
+        return frames
+
+    def _load_replay(self) -> List[np.ndarray]:
+        """Primeros loop_frames frames BGR de replay_path, a la resolución configurada"""
+        capture = cv2.VideoCapture(self.sim_config.replay_path)
+        if not capture.isOpened():
+            raise RuntimeError(f"No se pudo abrir el vídeo {self.sim_config.replay_path}")
+        size = (self.config.resolution_width, self.config.resolution_height)
+        frames = []
+        try:
+            while len(frames) < max(1, self.sim_config.loop_frames):
+                ret, frame = capture.read()
+                if not ret:
+                    break
+                if (frame.shape[1], frame.shape[0]) != size:
+                    frame = cv2.resize(frame, size)
+                frames.append(frame)
+        finally:
+            capture.release()
+        return frames
+
+    def _schedule_next(self):
+        """Instante de llegada del siguiente frame: rejilla nominal de 1/fps más jitter gaussiano"""
+        self._next_index += 1
+        due = self._start + self._next_index / self.config.fps
+        if self.sim_config.jitter_ms > 0:
+            due += self._random.gauss(0.0, self.sim_config.jitter_ms / 1000.0)
+        self._next_due = max(due, self._next_due)  # Los frames no llegan desordenados
+
+    def _read_frame(self, timeout_ms: int):
+        """Esperar al siguiente frame simulado; los perdidos avanzan el índice como en el SDK"""
+        started = time.monotonic()
+        deadline = started + timeout_ms / 1000.0
+        while self.capture_active:
+            now = time.monotonic()
+            if now - self._next_due > MAX_LAG_SECONDS:
+                # Consumidor parado: el dispositivo no acumula frames, se saltan los atrasados
+                self._next_due = now
+                self._next_index = int((now - self._start) * self.config.fps)
+            if self._next_due > deadline:
+                time.sleep(max(0.0, deadline - now))
+                SDK_WAIT_SECONDS.observe(time.monotonic() - started, self.camera_id)
+                return None
+            if self._next_due > now:
+                time.sleep(self._next_due - now)
+
+            sdk_index = self._next_index
+            # Reloj de la cámara: instante de exposición (sin jitter). Host: instante de llegada (con jitter)
+            exposure = self._start + sdk_index / self.config.fps
+            device_timestamp_us = int((exposure - self._device_clock_start) * 1_000_000)
+            system_timestamp_us = int((self._next_due + self._wall_offset) * 1_000_000)
+            self._schedule_next()
+            if self._random.random() < self.sim_config.dropout_rate:
+                continue
+
+            source = self._frames[sdk_index % len(self._frames)]
+            received = time.monotonic()
+            SDK_WAIT_SECONDS.observe(received - started, self.camera_id)
+            if self.pixel_format == "mjpeg":
+                # Bytes inmutables, no hace falta copiar
+                return source, self.pixel_format, sdk_index, device_timestamp_us, system_timestamp_us
+            image = self.frame_buffer.next_buffer(source.shape)
+            np.copyto(image, source)
+            FRAME_CONVERSION_SECONDS.observe(time.monotonic() - received, self.camera_id)
+            return image, self.pixel_format, sdk_index, device_timestamp_us, system_timestamp_us
+        return None
+
+    def _frame_size_from_profile(self) -> Optional[Tuple[int, int]]:
+        return self.config.resolution_width, self.config.resolution_height
+
+    def get_real_fps(self) -> int: # Se emplea en _open_writer en video_processor.py
+        """FPS configurados de la cámara simulada"""
+        return self.config.fps
+
+    def cleanup(self):
+        """Limpiar recursos de la cámara"""
+        super().cleanup()
+        self._frames = None
@@ -9,7 +9,9 @@ class CameraConfig:
     resolution_width: int = 640
     resolution_height: int = 480
     fps: int = 30
-    format: str = "RGB"
+    format: str = "RGB"  # "RGB", "BGR" o "MJPG" (passthrough: se graba el JPEG de la cámara sin recodificar)
+    frame_buffer_size: int = 30  # Frames que guarda el buffer circular de captura (~1 segundo a 30fps)
+    capture_timeout_ms: int = 200  # Timeout de wait_for_frames en el hilo de captura
 
 
 @dataclass
@@ -17,6 +19,15 @@ class RecordingConfig:
     """Configuración para grabación"""
     chunk_duration_seconds: int = 5
     output_format: str = "mp4"
+    encoder: str = "h264"  # "h264" (PyAV/libx264) o "mp4v" (cv2.VideoWriter, respaldo)
+    h264_preset: str = "veryfast"  # Preset de libx264: más lento = archivos más pequeños y más CPU
+    h264_crf: int = 23  # Calidad constante de libx264 (menor = más calidad y más bytes)
+    gop_size: int = 30  # Distancia máxima entre keyframes (en frames)
+    encoder_threads: int = 0  # Hilos del codificador por cámara (0 = automático)
+    encoder_mode: str = "thread"  # "thread" (codifica el hilo de grabación) o "process" (un proceso por cámara)
+    process_frame_slots: int = 8  # Slots de memoria compartida por cámara en modo "process"
+    pacing_policy: str = "nearest"  # Ritmo constante por chunk: "nearest", "hold" u "off" (frames tal como llegan)
+    pacing_fps: int = 0  # FPS de la rejilla común a todas las cámaras (0 = los de la cámara más rápida)
 
 
 @dataclass
@@ -24,35 +35,129 @@ class ServerConfig:
     """Configuración del servidor remoto"""
     base_url: str = "http://192.168.159.101:11299"
     upload_endpoint: str = "/api/chunks/receive"
+    resumable_upload_endpoint: str = "/api/chunks/resumable"  # Envío reanudable (si responde 404, se usa upload_endpoint)
+    batch_upload_endpoint: str = "/api/chunks/receive_batch"  # Chunks de todas las cámaras de una secuencia
+    batch_uploads: bool = False  # Una petición por sequence_number en vez de una por cámara
+    batch_wait_seconds: float = 2.0  # Espera máxima por las cámaras que faltan antes de enviar el lote por separado
     session_start_endpoint: str = "/api/session/start"
     session_end_endpoint: str = "/api/session/end"  # Endpoint para finalizar sesión normalmente
     session_cancel_endpoint: str = "/api/session/cancel"  # Endpoint para cancelar sesión (elimina datos)
 
 
+@dataclass
+class UploadConfig:
+    """Configuración del envío de chunks al servidor"""
+    workers: int = 2  # Hilos de envío (cada uno con su conexión keep-alive)
+    queue_size: int = 100  # Chunks pendientes como máximo antes de frenar a quien encola
+    enqueue_timeout_seconds: float = 10.0  # Espera máxima por hueco en la cola
+    request_timeout_seconds: float = 30.0
+    max_retries: int = 5  # Reintentos por chunk ante errores de red o 5xx
+    retry_base_delay_seconds: float = 1.0  # Espera del primer reintento; se duplica en cada uno
+    retry_max_delay_seconds: float = 30.0
+    # Límite común a todos los hilos de envío (0 = sin límite). Muy por encima de lo que se graba
+    # (5 cámaras MJPG ≈ 8 MB/s), pero evita que los envíos del cambio de chunk saturen la red de golpe
+    max_bandwidth_bytes_per_second: int = 16 * 1024 ** 2
+    bandwidth_burst_bytes: int = 1024 ** 2  # Bytes que pueden salir seguidos sin esperar al limitador
+    resumable: bool = True  # Tras un corte se sigue desde el último byte recibido en vez de reenviar el chunk entero
+    resumable_segment_bytes: int = 4 * 1024 ** 2  # Bytes del video por petición PATCH del envío reanudable
+
+
+@dataclass
+class StorageConfig:
+    """Almacén local de chunks pendientes de envío (modo sin conexión)"""
+    quota_bytes: int = 20 * 1024 ** 3  # Bytes máximos de chunks sin confirmar en disco
+    quota_policy: str = "refuse_sessions"  # Al llenarse: "refuse_sessions", "lower_bitrate" o "drop_oldest"
+    soft_quota_ratio: float = 0.8  # Con "lower_bitrate": fracción de la cuota desde la que se baja la calidad
+    reduced_crf_offset: int = 6  # CRF extra de libx264 al bajar la calidad (+6 ≈ la mitad de bitrate)
+    drain_rate_bytes_per_second: int = 2 * 1024 ** 2  # Ritmo de vaciado del backlog al volver el servidor (0 = sin límite)
+    health_check_interval_seconds: float = 5.0  # Sondeo del servidor mientras no responde
+
+
+@dataclass
+class SyncConfig:
+    """Sincronización entre cámaras"""
+    mode: str = "free_run"  # "free_run" (cada cámara a su ritmo) o "hardware" (primaria/secundarias por cable de sincronización)
+    primary_serial: str = ""  # Número de serie de la cámara primaria en modo "hardware" (vacío = la cámara 0)
+    tolerance_ms: float = 10.0  # Diferencia máxima de timestamps dentro de un conjunto de frames emparejados
+    timestamp_source: str = "auto"  # "system" (reloj del host), "device" (reloj de la cámara) o "auto" (device solo en modo "hardware")
+
+
+@dataclass
+class CameraInitConfig:
+    """Inicialización de las cámaras (en paralelo)"""
+    max_concurrent_usb: int = 2  # Cámaras abriéndose a la vez (operaciones USB simultáneas)
+    cache_profiles: bool = True  # Reutilizar el perfil negociado por número de serie al reinicializar
+    first_frame_timeout_seconds: float = 3.0  # Espera por el primer frame de cada cámara (solo se informa, no falla)
+
+
+@dataclass
+class PreviewConfig:
+    """Vista previa en vivo (MJPEG) desde el buffer de captura"""
+    fps: float = 5.0  # JPEG nuevos por segundo y cámara como máximo
+    max_width: int = 320  # Ancho de la vista previa (se conserva la proporción)
+    jpeg_quality: int = 70
+    max_viewers: int = 4  # Visores simultáneos por cámara
+
+
+@dataclass
+class SimulatedCameraConfig:
+    """Cámaras simuladas (CAMERA_BACKEND=simulated): pruebas y benchmarks sin hardware Orbbec
+
+    La resolución, los fps y el formato salen de CameraConfig, como en las cámaras reales.
+    """
+    num_cameras: int = int(os.environ.get("SIMULATED_CAMERAS", "3"))
+    jitter_ms: float = float(os.environ.get("SIMULATED_JITTER_MS", "2.0"))  # Desviación típica del instante de llegada de cada frame
+    dropout_rate: float = float(os.environ.get("SIMULATED_DROPOUT", "0.0"))  # Fracción de frames que el "dispositivo" no entrega
+    replay_path: str = os.environ.get("SIMULATED_REPLAY_PATH", "")  # Vídeo a reproducir en bucle (vacío = patrón sintético)
+    loop_frames: int = 30  # Frames distintos que se preparan al inicializar (patrón o vídeo) y se repiten en bucle
+    open_delay_ms: float = float(os.environ.get("SIMULATED_OPEN_DELAY_MS", "0"))  # Apertura del "dispositivo" al inicializar
+    profile_delay_ms: float = float(os.environ.get("SIMULATED_PROFILE_DELAY_MS", "0"))  # Negociación del perfil (no se repite si está cacheado)
+
+
+@dataclass
+class ApiServerConfig:
+    """Servidor HTTP de la API local (un solo proceso: es el dueño de las cámaras)"""
+    mode: str = os.environ.get("API_SERVER_MODE", "production")  # "production" (waitress) o "development" (Werkzeug con depurador)
+    threads: int = int(os.environ.get("API_THREADS", "24"))  # Hilos de waitress: cada canal de eventos o vista previa abierta ocupa uno
+    connection_limit: int = 100
+    channel_timeout_seconds: int = 120  # Conexiones inactivas que se cierran (los canales largos envían keepalive antes)
+
+
 class SystemConfig:
     """Configuración principal del sistema"""
     
     # Cámaras
     MAX_CAMERAS = 5
     DEFAULT_CAMERA_CONFIG = CameraConfig(camera_id=0)
+    CAMERA_BACKEND = os.environ.get("CAMERA_BACKEND", "orbbec")  # "orbbec" o "simulated"
+    SYNC = SyncConfig()
+    CAMERA_INIT = CameraInitConfig()
+    PREVIEW = PreviewConfig()
+    SIMULATED_CAMERA = SimulatedCameraConfig()
     
     # Grabación
     RECORDING = RecordingConfig()
     
     # Servidor
     SERVER = ServerConfig()
+    UPLOAD = UploadConfig()
+    STORAGE = StorageConfig()
     
     # Rutas
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     TEMP_VIDEO_DIR = os.path.join(BASE_DIR, "temp_videos")
     LOGS_DIR = os.path.join(BASE_DIR, "logs")
+    PENDING_VIDEO_DIR = os.path.join(BASE_DIR, "pending_videos")  # Chunks no confirmados de sesiones anteriores
+    UPLOAD_JOURNAL_PATH = os.path.join(BASE_DIR, "upload_journal", "upload_journal.db")
     
     # API Local
     LOCAL_API_HOST = "127.0.0.1"
     LOCAL_API_PORT = 5000
+    API_SERVER = ApiServerConfig()
     
     @classmethod
     def ensure_directories(cls):
         """Crear directorios necesarios si no existen"""
         os.makedirs(cls.TEMP_VIDEO_DIR, exist_ok=True)
         os.makedirs(cls.LOGS_DIR, exist_ok=True)
+        os.makedirs(cls.PENDING_VIDEO_DIR, exist_ok=True)
@@ -0,0 +1,5 @@
+from .metrics_registry import (MetricsRegistry, Histogram, metrics, format_metric, FRAME_STAGE_BUCKETS,
+                               SDK_WAIT_BUCKETS, FINALIZE_BUCKETS, UPLOAD_BUCKETS, THROUGHPUT_BUCKETS)
+
+__all__ = ['MetricsRegistry', 'Histogram', 'metrics', 'format_metric', 'FRAME_STAGE_BUCKETS', 'SDK_WAIT_BUCKETS',
+           'FINALIZE_BUCKETS', 'UPLOAD_BUCKETS', 'THROUGHPUT_BUCKETS']
@@ -0,0 +1,122 @@
+# Métricas del camino crítico en formato de texto de Prometheus
+# Los histogramas se actualizan desde los hilos de captura, grabación y envío con un coste de
+# ~1 µs por observación (bisect + lock), así que se pueden dejar siempre activos.
+# Los valores que ya existen como estado (FPS medido, contadores de frames, cola de envío)
+# no se duplican: /api/system/metrics los lee al responder y los da formato con format_metric().
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+METRIC_PREFIX = "gait_"
+
+# Límites superiores (s) de los cubos, según la escala de cada etapa
+FRAME_STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.033, 0.05, 0.1, 0.25)
+SDK_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.02, 0.033, 0.05, 0.1, 0.2, 0.5)
+FINALIZE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+UPLOAD_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+THROUGHPUT_BUCKETS = (256 * 1024, 512 * 1024, 1024 ** 2, 2 * 1024 ** 2, 5 * 1024 ** 2,
+                      10 * 1024 ** 2, 25 * 1024 ** 2, 50 * 1024 ** 2, 100 * 1024 ** 2)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Iterable[Tuple[str, Any]]) -> str:
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return f"{{{pairs}}}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_metric(name: str, help_text: str, metric_type: str,
+                  samples: Iterable[Tuple[Dict[str, Any], float]]) -> str:
+    """Bloque de texto de una métrica gauge o counter: samples es [(etiquetas, valor), ...]"""
+    full_name = METRIC_PREFIX + name
+    lines = [f"# HELP {full_name} {help_text}", f"# TYPE {full_name} {metric_type}"]
+    for labels, value in samples:
+        lines.append(f"{full_name}{_format_labels(labels.items())} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class Histogram:
+    """Histograma acumulativo por combinación de etiquetas (p. ej. una serie por cámara)"""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float], label_names: Sequence[str] = ("camera",)):
+        self.name = METRIC_PREFIX + name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.label_names = tuple(label_names)
+        # etiquetas -> [cuenta por cubo (el último es +Inf), suma, cuenta total]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        """Medir la duración del bloque (para etapas fuera del bucle por frame)"""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, *label_values)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> str:
+        with self._lock:
+            snapshot = {labels: ([*series[0]], series[1], series[2]) for labels, series in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(snapshot.items()):
+            labels = list(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsRegistry:
+    """Histogramas registrados por los módulos (uno por nombre)"""
+
+    def __init__(self):
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float],
+                  label_names: Sequence[str] = ("camera",)) -> Histogram:
+        """Histograma con ese nombre (se crea la primera vez)"""
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(name, help_text, buckets, label_names)
+            return self._histograms[name]
+
+    def histograms(self) -> List[Histogram]:
+        with self._lock:
+            return list(self._histograms.values())
+
+    def render(self) -> str:
+        return "".join(histogram.render() for histogram in self.histograms())
+
+
+# Registro global de métricas
+metrics = MetricsRegistry()
@@ -0,0 +1,98 @@
+"""
+Benchmark de modos de codificación: hilo único frente a un proceso por cámara.
+- Alimenta N cámaras sintéticas a 640x480@30 desde un solo hilo, como el bucle de grabación.
+- Modo "thread": el propio hilo codifica cada frame (limitado por el GIL).
+- Modo "process": cada cámara tiene un EncoderProcess alimentado por memoria compartida.
+- Reporta los FPS sostenidos por cámara y los frames descartados para cada número de cámaras.
+- Uso: python backend/tests/benchmark_encoder_modes.py [segundos] [max_camaras]
+"""
+import os
+import sys
+import time
+import tempfile
+from dataclasses import replace
+
+# Añadir la raíz del proyecto al path para importar el paquete backend
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from backend.config.settings import SystemConfig
+from backend.video_processor.encoders import create_encoder
+from backend.video_processor.encoder_process import EncoderProcess
+from benchmark_encoders import generate_frames, WIDTH, HEIGHT, FPS
+
+# --- Configuración ---
+DEFAULT_SECONDS = 10
+DEFAULT_MAX_CAMERAS = 5
+
+
+def run_mode(mode: str, cameras: int, seconds: int, frames: list, output_dir: str) -> dict:
+    """Alimentar `cameras` encoders a FPS durante `seconds` y medir el ritmo sostenido"""
+    config = replace(SystemConfig.RECORDING, encoder_mode=mode)
+    processes = []
+    encoders = []
+    for camera_id in range(cameras):
+        if mode == "process":
+            encoder_process = EncoderProcess(camera_id, WIDTH * HEIGHT * 3, config)
+            encoder_process.start()
+            processes.append(encoder_process)
+            encoder = encoder_process.create_encoder()
+        else:
+            encoder = create_encoder(config)
+        encoder.open(os.path.join(output_dir, f"{mode}_{cameras}_{camera_id}.mp4"), WIDTH, HEIGHT, FPS)
+        encoders.append(encoder)
+
+    total_ticks = seconds * FPS
+    start = time.perf_counter()
+    for tick in range(total_ticks):
+        # Esperar al siguiente frame de "cámara" si vamos adelantados (como el buffer de captura)
+        delay = start + tick / FPS - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        frame = frames[tick % len(frames)]
+        for encoder in encoders:
+            encoder.encode(frame, "bgr24", time.time())
+
+    for encoder in encoders:
+        encoder.close()
+    elapsed = time.perf_counter() - start
+
+    if mode == "process":
+        encoded = [encoder.last_stats['frames_encoded'] for encoder in encoders]
+        dropped = sum(encoder_process.frames_dropped for encoder_process in processes)
+        for encoder_process in processes:
+            encoder_process.stop()
+    else:
+        encoded = [total_ticks] * cameras
+        dropped = 0
+
+    return {
+        'mode': mode,
+        'cameras': cameras,
+        'fps_per_camera': min(encoded) / elapsed,  # Ritmo de la cámara más lenta
+        'lag_seconds': max(0.0, elapsed - seconds),  # Retraso acumulado respecto al tiempo real
+        'frames_dropped': dropped
+    }
+
+
+def main():
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SECONDS
+    max_cameras = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_MAX_CAMERAS
+    print(f"--- FPS sostenidos por cámara ({WIDTH}x{HEIGHT}@{FPS}, {seconds}s, "
+          f"{SystemConfig.RECORDING.encoder}, {os.cpu_count()} CPUs) ---")
+    frames = generate_frames(FPS)
+
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for cameras in range(1, max_cameras + 1):
+            for mode in ("thread", "process"):
+                results.append(run_mode(mode, cameras, seconds, frames, output_dir))
+
+    print(f"{'cámaras':>8} {'modo':>8} {'fps/cámara':>11} {'retraso s':>10} {'descartados':>12}")
+    for result in results:
+        print(f"{result['cameras']:>8} {result['mode']:>8} {result['fps_per_camera']:>11.1f} "
+              f"{result['lag_seconds']:>10.2f} {result['frames_dropped']:>12}")
+
+
+if __name__ == "__main__":
+    main()
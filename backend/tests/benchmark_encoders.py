@@ -0,0 +1,95 @@
+"""
+Benchmark de backends de codificación de chunks.
+- Compara 'mp4v' (cv2.VideoWriter) con 'h264' (PyAV/libx264) a 640x480@30.
+- Mide bytes por segundo de video generado y tiempo de CPU de codificación.
+- Uso: python backend/tests/benchmark_encoders.py [segundos_de_video]
+"""
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+# Añadir la raíz del proyecto al path para importar el paquete backend
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from backend.config.settings import RecordingConfig
+from backend.video_processor.encoders import create_encoder
+
+# --- Configuración ---
+WIDTH, HEIGHT, FPS = 640, 480, 30
+DEFAULT_SECONDS = 10
+BACKENDS = ['mp4v', 'h264']
+
+
+def generate_frames(count: int) -> list:
+    """Frames sintéticos: fondo con textura, una figura que se desplaza y ruido de sensor"""
+    rng = np.random.default_rng(0)
+    background = rng.integers(60, 200, size=(HEIGHT // 8, WIDTH // 8, 3), dtype=np.uint8)
+    background = np.repeat(np.repeat(background, 8, axis=0), 8, axis=1)
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        x = int((i * 7) % (WIDTH - 120))
+        frame[120:420, x:x + 120] = (40, 90, 160)  # "Persona" caminando
+        noise = rng.integers(-4, 5, size=frame.shape, dtype=np.int16)
+        frames.append(np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+    return frames
+
+
+def run_backend(backend: str, frames: list, total_frames: int, output_dir: str) -> dict:
+    """Codificar total_frames con un backend y medir tamaño y CPU"""
+    config = RecordingConfig()
+    encoder = create_encoder(config, backend)
+    output_path = os.path.join(output_dir, f"bench_{backend}.mp4")
+    if not encoder.open(output_path, WIDTH, HEIGHT, FPS):
+        return {'backend': backend, 'error': 'backend no disponible'}
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for i in range(total_frames):
+        encoder.encode(frames[i % len(frames)])
+    encoder.close()
+    cpu_seconds = time.process_time() - cpu_start
+    wall_seconds = time.perf_counter() - wall_start
+
+    video_seconds = total_frames / FPS
+    size = os.path.getsize(output_path)
+    return {
+        'backend': backend,
+        'file_bytes': size,
+        'bytes_per_second': size / video_seconds,
+        'cpu_seconds': cpu_seconds,
+        'cpu_ms_per_frame': 1000 * cpu_seconds / total_frames,
+        'cpu_realtime_ratio': cpu_seconds / video_seconds,  # 1.0 = un núcleo completo a 30fps
+        'wall_fps': total_frames / wall_seconds
+    }
+
+
+def main():
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SECONDS
+    total_frames = seconds * FPS
+    print(f"--- Benchmark de codificación {WIDTH}x{HEIGHT}@{FPS} ({seconds}s de video) ---")
+    frames = generate_frames(FPS * 2)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        results = [run_backend(backend, frames, total_frames, output_dir) for backend in BACKENDS]
+
+    print(f"{'backend':<8} {'KB/s':>10} {'CPU ms/frame':>14} {'CPU/tiempo real':>16} {'fps':>8}")
+    for result in results:
+        if 'error' in result:
+            print(f"{result['backend']:<8} {result['error']}")
+            continue
+        print(f"{result['backend']:<8} {result['bytes_per_second'] / 1024:>10.1f} "
+              f"{result['cpu_ms_per_frame']:>14.2f} {result['cpu_realtime_ratio']:>16.2f} "
+              f"{result['wall_fps']:>8.1f}")
+
+    valid = {r['backend']: r for r in results if 'error' not in r}
+    if 'mp4v' in valid and 'h264' in valid:
+        ratio = valid['mp4v']['bytes_per_second'] / valid['h264']['bytes_per_second']
+        print(f"H.264 genera {ratio:.1f}x menos bytes por segundo que mp4v")
+
+
+if __name__ == "__main__":
+    main()
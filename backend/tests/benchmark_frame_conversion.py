@@ -0,0 +1,105 @@
+"""
+Micro-benchmark de la ruta de un frame desde el SDK hasta el codificador.
+- Antes: np.asanyarray -> reshape -> cv2.cvtColor(RGB2BGR), con un array nuevo por frame.
+- Después: copia al buffer preasignado del FrameRingBuffer (RGB tal cual para H.264) y,
+  para el respaldo mp4v, conversión a BGR sobre el buffer del writer.
+- Mide con tracemalloc la memoria reservada por frame y el tiempo medio por frame.
+- Uso: python backend/tests/benchmark_frame_conversion.py [frames]
+"""
+import os
+import sys
+import time
+import tracemalloc
+import cv2
+import numpy as np
+
+# Añadir la raíz del proyecto al path para importar el paquete backend
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from backend.camera_manager.frame_buffer import FrameRingBuffer
+
+# --- Configuración ---
+WIDTH, HEIGHT = 640, 480
+DEFAULT_FRAMES = 300
+BUFFER_SIZE = 30
+
+
+def path_before(sdk_data: np.ndarray, ring: FrameRingBuffer):
+    """Ruta original de _frame_to_bgr_image"""
+    data = np.asanyarray(sdk_data)
+    image = np.reshape(data, (HEIGHT, WIDTH, 3))
+    image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    ring.push(image, 0.0)
+
+
+def path_after_rgb(sdk_data: np.ndarray, ring: FrameRingBuffer):
+    """Ruta nueva hacia el codificador H.264 (consume rgb24)"""
+    data = np.asanyarray(sdk_data)
+    image = ring.next_buffer((HEIGHT, WIDTH, 3))
+    np.copyto(image, data.reshape((HEIGHT, WIDTH, 3)))
+    ring.push(image, 0.0, pixel_format="rgb24")
+
+
+def make_path_after_bgr():
+    """Ruta nueva hacia el respaldo mp4v: conversión sobre el buffer preasignado del writer"""
+    bgr_buffer = np.empty((HEIGHT, WIDTH, 3), dtype=np.uint8)
+
+    def path_after_bgr(sdk_data: np.ndarray, ring: FrameRingBuffer):
+        path_after_rgb(sdk_data, ring)
+        frame = ring.latest()
+        cv2.cvtColor(frame.image, cv2.COLOR_RGB2BGR, dst=bgr_buffer)
+
+    return path_after_bgr
+
+
+def measure(name: str, path, frames: int) -> dict:
+    """Ejecutar una ruta frames veces y medir memoria reservada y tiempo por frame"""
+    sdk_data = np.random.default_rng(0).integers(0, 255, size=WIDTH * HEIGHT * 3, dtype=np.uint8)
+    ring = FrameRingBuffer(BUFFER_SIZE)
+
+    # Calentamiento: llenar el buffer circular y su pool una vuelta completa
+    for _ in range(BUFFER_SIZE + 2):
+        path(sdk_data, ring)
+
+    tracemalloc.start()
+    allocated = 0
+    frames_with_allocation = 0
+    elapsed = 0.0
+    for _ in range(frames):
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        path(sdk_data, ring)
+        elapsed += time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        frame_bytes = peak - baseline
+        allocated += frame_bytes
+        if frame_bytes >= WIDTH * HEIGHT:  # Reservas del tamaño de una imagen
+            frames_with_allocation += 1
+    tracemalloc.stop()
+
+    return {
+        'name': name,
+        'bytes_per_frame': allocated / frames,
+        'image_allocations_per_frame': frames_with_allocation / frames,
+        'us_per_frame': 1e6 * elapsed / frames
+    }
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_FRAMES
+    print(f"--- Reservas de memoria por frame {WIDTH}x{HEIGHT} RGB ({frames} frames) ---")
+    results = [
+        measure("antes (cvtColor nuevo)", path_before, frames),
+        measure("después H.264 (rgb24)", path_after_rgb, frames),
+        measure("después mp4v (dst pool)", make_path_after_bgr(), frames),
+    ]
+    print(f"{'ruta':<26} {'bytes/frame':>12} {'reservas img/frame':>20} {'us/frame':>10}")
+    for result in results:
+        print(f"{result['name']:<26} {result['bytes_per_frame']:>12.0f} "
+              f"{result['image_allocations_per_frame']:>20.2f} {result['us_per_frame']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Benchmark de extremo a extremo: captura -> codificación -> chunks -> envío.
+- Graba con VideoProcessor desde cámaras simuladas (SimulatedCamera) y envía los chunks con un
+  UploadManager a un servidor simulado local (stub_server.py) que hace de /api/chunks/receive.
+- Barre número de cámaras, resolución, fps, duración de chunk, formato de cámara y codificador.
+- Por configuración reporta: fps logrados por cámara, frames perdidos, error de sincronización entre
+  cámaras, latencia de finalización de chunk, percentiles de latencia de envío, CPU (incluidos los
+  procesos codificadores) y RSS.
+- Guarda los resultados en JSON (con el commit actual) para comparar regresiones entre commits.
+- Uso: python backend/tests/benchmark_pipeline.py --cameras 1,2,4 --resolutions 640x480,1280x720
+       --fps 30 --chunk-seconds 5 --encoders h264/thread,h264/process --output resultados.json
+       [--compare resultados_anteriores.json]
+"""
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import itertools
+import threading
+import subprocess
+import multiprocessing
+from contextlib import redirect_stdout
+from dataclasses import replace
+from datetime import datetime
+
+import numpy as np
+
+# Añadir la raíz del proyecto al path para importar el paquete backend
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from backend.config.settings import SystemConfig, CameraConfig
+
+# Todo lo que escribe el pipeline (chunks, diario de envíos) va a un directorio temporal,
+# y las cámaras son simuladas. Debe fijarse antes de importar los gestores (singletons)
+WORK_DIR = tempfile.mkdtemp(prefix="benchmark_pipeline_")
+SystemConfig.TEMP_VIDEO_DIR = os.path.join(WORK_DIR, "temp_videos")
+SystemConfig.PENDING_VIDEO_DIR = os.path.join(WORK_DIR, "pending_videos")
+SystemConfig.LOGS_DIR = os.path.join(WORK_DIR, "logs")
+SystemConfig.UPLOAD_JOURNAL_PATH = os.path.join(WORK_DIR, "upload_journal", "upload_journal.db")
+SystemConfig.CAMERA_BACKEND = "simulated"
+
+from backend.camera_manager import camera_manager
+from backend.upload_manager import UploadManager, UploadJournal
+from backend.video_processor import video_processor
+from stub_server import StubServer
+
+# --- Configuración ---
+DEFAULT_SECONDS = 10
+DEFAULT_CAMERAS = "1,3"
+DEFAULT_RESOLUTIONS = "640x480"
+DEFAULT_FPS = "30"
+DEFAULT_CHUNK_SECONDS = "5"
+DEFAULT_FORMATS = "RGB"
+DEFAULT_ENCODERS = "h264/thread"
+PORT = 18399
+WARMUP_SECONDS = 1.0  # Captura antes de grabar, para que las cámaras entreguen frames
+UPLOAD_IDLE_TIMEOUT = 120
+RSS_SAMPLE_INTERVAL = 0.5
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def parse_list(value: str, cast=str) -> list:
+    return [cast(item.strip()) for item in value.split(',') if item.strip()]
+
+
+def parse_resolution(value: str) -> tuple:
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def percentiles(values: list) -> dict:
+    """p50/p90/p99/máximo en segundos (None si no hay muestras)"""
+    if not values:
+        return {'p50': None, 'p90': None, 'p99': None, 'max': None, 'samples': 0}
+    data = np.asarray(values, dtype=np.float64)
+    p50, p90, p99 = np.percentile(data, [50, 90, 99])
+    return {'p50': round(float(p50), 4), 'p90': round(float(p90), 4), 'p99': round(float(p99), 4),
+            'max': round(float(data.max()), 4), 'samples': len(values)}
+
+
+def rss_bytes(pid: str = 'self') -> int:
+    """RSS actual de un proceso según /proc (0 si no está disponible)"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def cpu_seconds() -> float:
+    """CPU (usuario + sistema) de este proceso y de los hijos ya terminados (procesos codificadores)"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+class RssSampler:
+    """Muestrea en un hilo el RSS de este proceso más el de sus procesos hijos"""
+
+    def __init__(self):
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def __enter__(self) -> 'RssSampler':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            total = rss_bytes() + sum(rss_bytes(str(child.pid)) for child in multiprocessing.active_children())
+            self.samples.append(total)
+            self._stop.wait(RSS_SAMPLE_INTERVAL)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_config(server: StubServer, params: dict, seconds: float, verbose: bool) -> dict:
+    """Grabar `seconds` con una configuración y medir todo el pipeline"""
+    encoder, encoder_mode = params['encoder'].split('/')
+    width, height = params['resolution']
+    recording_config = replace(SystemConfig.RECORDING, chunk_duration_seconds=params['chunk_seconds'],
+                               encoder=encoder, encoder_mode=encoder_mode,
+                               h264_preset=params['preset'] or SystemConfig.RECORDING.h264_preset)
+    SystemConfig.RECORDING = recording_config  # Lo usa la fábrica de encoders por defecto de VideoWriter
+    video_processor.config = recording_config
+    SystemConfig.SIMULATED_CAMERA = replace(SystemConfig.SIMULATED_CAMERA, num_cameras=params['cameras'],
+                                            jitter_ms=params['jitter_ms'], dropout_rate=params['dropout'])
+    SystemConfig.SYNC = replace(SystemConfig.SYNC, mode=params['sync_mode'])
+
+    journal_path = os.path.join(WORK_DIR, f"journal_{time.time_ns()}.db")
+    manager = UploadManager(server=server.config, journal=UploadJournal(journal_path))
+    enqueued_at = {}  # chunk_id -> instante en que el chunk quedó listo para enviar
+    finalize_latencies = []
+    chunks = []
+
+    def on_chunk(chunk):
+        now = time.time()
+        if chunk.frame_count:
+            # Desde la captura del último frame del chunk hasta que está finalizado y listo para enviar
+            last_frame_time = chunk.timestamp.timestamp() + chunk.duration_seconds - 1.0 / params['fps']
+            finalize_latencies.append(now - last_frame_time)
+        enqueued_at[chunk.chunk_id] = now
+        chunks.append(chunk)
+        manager.enqueue(chunk)
+
+    received_before = len(server.received)
+    output = sys.stdout if verbose else io.StringIO()
+    with redirect_stdout(output):
+        for camera_id in range(params['cameras']):
+            config = CameraConfig(camera_id=camera_id, resolution_width=width, resolution_height=height,
+                                  fps=params['fps'], format=params['format'])
+            if not camera_manager.initialize_camera(camera_id, config):
+                raise RuntimeError(f"No se pudo inicializar la cámara simulada {camera_id}")
+        time.sleep(WARMUP_SECONDS)
+
+        video_processor.upload_callbacks = [on_chunk]
+        video_processor.start_session("benchmark", f"benchmark-{time.time_ns()}")
+        manager.set_active_session(video_processor.session_id)
+        totals_before = video_processor.get_frame_totals()  # Contadores acumulados de las configuraciones anteriores
+        with RssSampler() as sampler:
+            cpu_start = cpu_seconds()
+            start = time.time()
+            video_processor.start_recording()
+            time.sleep(seconds)
+            encoder_processes = dict(video_processor.encoder_processes)
+            final_chunks = video_processor.stop_recording()
+            recording_seconds = time.time() - start
+            for chunk in final_chunks:
+                on_chunk(chunk)
+            idle = manager.wait_until_idle(timeout=UPLOAD_IDLE_TIMEOUT)
+            elapsed = time.time() - start
+            manager.stop()
+            cpu_used = cpu_seconds() - cpu_start
+        camera_stats = camera_manager.get_capture_stats()
+        frame_totals = video_processor.get_frame_totals()
+        camera_manager.cleanup()
+        manager.journal.close()
+
+    # Fps logrados y frames perdidos por cámara, a partir de los chunks generados
+    per_camera = {}
+    for camera_id in range(params['cameras']):
+        camera_chunks = sorted((c for c in chunks if c.camera_id == camera_id and c.frame_count),
+                               key=lambda c: c.sequence_number)
+        written = sum(c.frame_count for c in camera_chunks)
+        span = camera_chunks[-1].last_frame_index - camera_chunks[0].first_frame_index + 1 if camera_chunks else 0
+        stats = camera_stats.get(camera_id, {})
+        totals = {key: count - totals_before.get(camera_id, {}).get(key, 0)
+                  for key, count in frame_totals.get(camera_id, {}).items()}
+        encoder_process = encoder_processes.get(camera_id)
+        # Con ritmo constante los duplicados repiten un índice ya escrito: no cubren ningún hueco.
+        # El primer frame de un chunk puede repetir el último del anterior sin contar como duplicado
+        repeated_at_boundary = sum(1 for previous, following in zip(camera_chunks, camera_chunks[1:])
+                                   if following.first_frame_index == previous.last_frame_index)
+        distinct = written - totals.get('paced_duplicated', 0) - repeated_at_boundary
+        per_camera[camera_id] = {
+            'achieved_fps': round(written / recording_seconds, 2),
+            'frames_written': written,
+            'frames_missing': span - distinct,  # Huecos en los índices de frame entre el primer y el último chunk
+            'paced_duplicated': totals.get('paced_duplicated', 0),  # Slots rellenados repitiendo un frame
+            'paced_dropped': totals.get('paced_dropped', 0),  # Frames capturados sin slot en la rejilla
+            'device_dropped': stats.get('frames_dropped', 0),  # Pérdidas simuladas del "dispositivo"
+            'buffer_overwritten': stats.get('frames_overwritten', 0),  # El grabador no leyó a tiempo
+            'encoder_dropped': encoder_process.frames_dropped if encoder_process else 0,
+            'chunks': len(camera_chunks)
+        }
+
+    upload_latencies = [
+        fields['received_at'] - enqueued_at[fields['chunk_id']]
+        for fields in server.received[received_before:] if fields.get('chunk_id') in enqueued_at
+    ]
+    upload_stats = manager.get_stats()
+    achieved = [camera['achieved_fps'] for camera in per_camera.values()]
+    return {
+        'params': {**params, 'resolution': f"{width}x{height}", 'seconds': seconds},
+        'achieved_fps_min': min(achieved) if achieved else 0.0,
+        'achieved_fps_mean': round(float(np.mean(achieved)), 2) if achieved else 0.0,
+        'frames_lost': sum(c['frames_missing'] for c in per_camera.values()),  # Incluye sobrescritos y frames sin slot en la rejilla
+        'cameras': per_camera,
+        'chunks': len(chunks),
+        'chunk_bytes_total': sum(c.file_size_bytes for c in chunks),
+        'finalize_latency_s': percentiles(finalize_latencies),
+        'upload_latency_s': percentiles(upload_latencies),
+        'uploads': {'uploaded': upload_stats['uploaded'], 'failed': upload_stats['failed'],
+                    'retries': upload_stats['retries'], 'all_acked': idle},
+        'sync': video_processor.get_sync_stats(),
+        'cpu_percent': round(100.0 * cpu_used / elapsed, 1),  # 100 = un núcleo completo
+        'rss_mb_peak': round(max(sampler.samples, default=0) / 1024 ** 2, 1),
+        'rss_mb_mean': round(float(np.mean(sampler.samples)) / 1024 ** 2, 1) if sampler.samples else 0.0,
+        'wall_seconds': round(elapsed, 2)
+    }
+
+
+def config_key(result: dict) -> str:
+    params = result['params']
+    return (f"{params['cameras']}cam {params['resolution']}@{params['fps']} {params['format']} "
+            f"chunk={params['chunk_seconds']}s {params['encoder']} {params['preset'] or ''}").strip()
+
+
+def print_results(results: list):
+    print(f"{'configuración':<48} {'fps min':>8} {'perdidos':>9} {'final p50':>10} "
+          f"{'envío p50':>10} {'envío p99':>10} {'CPU %':>7} {'RSS MB':>7}")
+    for result in results:
+        upload = result['upload_latency_s']
+        print(f"{config_key(result):<48} {result['achieved_fps_min']:>8.1f} {result['frames_lost']:>9} "
+              f"{result['finalize_latency_s']['p50'] or 0:>10.3f} {upload['p50'] or 0:>10.3f} "
+              f"{upload['p99'] or 0:>10.3f} {result['cpu_percent']:>7.1f} {result['rss_mb_peak']:>7.1f}")
+
+
+def compare_results(results: list, baseline_path: str):
+    """Diferencias con un JSON anterior para las configuraciones comunes"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {config_key(result): result for result in baseline['results']}
+    print(f"--- Comparación con {baseline_path} (commit {baseline.get('commit')}) ---")
+    print(f"{'configuración':<48} {'Δ fps min':>10} {'Δ perdidos':>11} {'Δ envío p99':>12} {'Δ CPU %':>8} {'Δ RSS MB':>9}")
+    for result in results:
+        old = previous.get(config_key(result))
+        if old is None:
+            continue
+        upload_p99 = (result['upload_latency_s']['p99'] or 0) - (old['upload_latency_s']['p99'] or 0)
+        print(f"{config_key(result):<48} {result['achieved_fps_min'] - old['achieved_fps_min']:>+10.1f} "
+              f"{result['frames_lost'] - old['frames_lost']:>+11} {upload_p99:>+12.3f} "
+              f"{result['cpu_percent'] - old['cpu_percent']:>+8.1f} {result['rss_mb_peak'] - old['rss_mb_peak']:>+9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de extremo a extremo del pipeline de grabación")
+    parser.add_argument('--seconds', type=float, default=DEFAULT_SECONDS, help="Duración de cada grabación")
+    parser.add_argument('--cameras', default=DEFAULT_CAMERAS, help="Números de cámaras, p. ej. 1,2,4")
+    parser.add_argument('--resolutions', default=DEFAULT_RESOLUTIONS, help="p. ej. 640x480,1280x720")
+    parser.add_argument('--fps', default=DEFAULT_FPS, help="p. ej. 15,30")
+    parser.add_argument('--chunk-seconds', default=DEFAULT_CHUNK_SECONDS, help="p. ej. 2,5")
+    parser.add_argument('--formats', default=DEFAULT_FORMATS, help="Formato de cámara: RGB, BGR, MJPG")
+    parser.add_argument('--encoders', default=DEFAULT_ENCODERS, help="codificador/modo, p. ej. h264/thread,h264/process,mp4v/thread")
+    parser.add_argument('--presets', default="", help="Presets de libx264, p. ej. ultrafast,veryfast (vacío = el configurado)")
+    parser.add_argument('--jitter-ms', type=float, default=SystemConfig.SIMULATED_CAMERA.jitter_ms)
+    parser.add_argument('--dropout', type=float, default=SystemConfig.SIMULATED_CAMERA.dropout_rate)
+    parser.add_argument('--sync-mode', default=SystemConfig.SYNC.mode, help="free_run o hardware")
+    parser.add_argument('--server-latency', type=float, default=0.0, help="Latencia añadida por el servidor simulado (s)")
+    parser.add_argument('--output', default="", help="Archivo JSON de resultados")
+    parser.add_argument('--compare', default="", help="JSON de una ejecución anterior para comparar")
+    parser.add_argument('--verbose', action='store_true', help="Mostrar la salida del pipeline")
+    args = parser.parse_args()
+
+    sweep = [
+        {'cameras': cameras, 'resolution': resolution, 'fps': fps, 'chunk_seconds': chunk_seconds,
+         'format': color_format, 'encoder': encoder, 'preset': preset,
+         'jitter_ms': args.jitter_ms, 'dropout': args.dropout, 'sync_mode': args.sync_mode}
+        for cameras, resolution, fps, chunk_seconds, color_format, encoder, preset in itertools.product(
+            parse_list(args.cameras, int), parse_list(args.resolutions, parse_resolution),
+            parse_list(args.fps, int), parse_list(args.chunk_seconds, int),
+            parse_list(args.formats, str.upper), parse_list(args.encoders), parse_list(args.presets) or [None])
+    ]
+    print(f"--- Pipeline completo: {len(sweep)} configuraciones de {args.seconds:.0f}s "
+          f"({os.cpu_count()} CPUs, commit {git_commit()}) ---")
+
+    server = StubServer(PORT, latency=args.server_latency).start()
+    results = []
+    try:
+        for index, params in enumerate(sweep, 1):
+            result = run_config(server, params, args.seconds, args.verbose)
+            results.append(result)
+            sync_error = result['sync']['error_ms']
+            sync_p95 = f"{sync_error['p95']:.1f} ms" if sync_error else "n/a"
+            print(f"[{index}/{len(sweep)}] {config_key(result)}: {result['achieved_fps_min']:.1f} fps, "
+                  f"{result['frames_lost']} perdidos, sincronización p95 {sync_p95}, "
+                  f"CPU {result['cpu_percent']:.0f}%", flush=True)
+    finally:
+        server.stop()
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    print_results(results)
+    if args.output:
+        report = {
+            'commit': git_commit(),
+            'date': datetime.now().isoformat(),
+            'machine': {'cpus': os.cpu_count(), 'platform': platform.platform(), 'python': platform.python_version()},
+            'results': results
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Resultados guardados en {args.output}")
+    if args.compare:
+        compare_results(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
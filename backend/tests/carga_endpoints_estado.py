@@ -0,0 +1,230 @@
+"""
+Prueba de carga de los endpoints de estado de la API local durante una grabación.
+- Arranca la API en un proceso aparte (como main.py) con cámaras simuladas, en cada modo de servidor
+  (waitress o Werkzeug), y un servidor de procesamiento simulado (stub_server.py) para los chunks.
+- Inicializa las cámaras, empieza a grabar y mantiene abiertos canales de eventos como navegadores.
+- Lanza N clientes concurrentes que consultan los endpoints de estado sin pausa y mide la latencia.
+- Por modo y número de clientes reporta peticiones/s, errores y p50/p95/p99/máximo por endpoint.
+- Uso: python backend/tests/carga_endpoints_estado.py [--modes production,development]
+       [--clients 1,8,32] [--seconds 10] [--cameras 3] [--event-streams 2]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import textwrap
+import threading
+import subprocess
+
+import requests
+
+# Añadir la raíz del proyecto al path para importar el paquete backend
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from stub_server import StubServer
+
+# --- Configuración ---
+API_PORT = 18411
+STUB_PORT = 18412
+DEFAULT_MODES = "production,development"
+DEFAULT_CLIENTS = "1,8,32"
+DEFAULT_SECONDS = 10
+DEFAULT_CAMERAS = 3
+DEFAULT_EVENT_STREAMS = 2
+STARTUP_TIMEOUT = 30
+FINALIZE_TIMEOUT = 60
+ENDPOINTS = [
+    '/api/recording/status',
+    '/api/cameras/status',
+    '/api/system/health',
+    '/api/system/metrics',
+]
+
+# Proceso de la API: mismas rutas que main.py, con directorios temporales y el servidor simulado
+SERVER_BOOTSTRAP = textwrap.dedent("""
+    import os, sys
+    sys.path.insert(0, {root!r})
+    from backend.config.settings import SystemConfig
+    SystemConfig.SERVER.base_url = {base_url!r}
+    SystemConfig.LOCAL_API_PORT = {port}
+    SystemConfig.TEMP_VIDEO_DIR = os.path.join({work_dir!r}, "temp_videos")
+    SystemConfig.PENDING_VIDEO_DIR = os.path.join({work_dir!r}, "pending_videos")
+    SystemConfig.LOGS_DIR = os.path.join({work_dir!r}, "logs")
+    SystemConfig.UPLOAD_JOURNAL_PATH = os.path.join({work_dir!r}, "upload_journal", "upload_journal.db")
+    from backend.api import run_server
+    run_server()
+""")
+
+
+def parse_list(value: str, cast=str) -> list:
+    return [cast(item.strip()) for item in value.split(',') if item.strip()]
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def start_api(mode: str, cameras: int, work_dir: str, log_file) -> subprocess.Popen:
+    """Arrancar la API en un proceso propio y esperar a que responda"""
+    env = dict(os.environ, CAMERA_BACKEND="simulated", SIMULATED_CAMERAS=str(cameras), API_SERVER_MODE=mode)
+    code = SERVER_BOOTSTRAP.format(root=ROOT_DIR, base_url=f"http://127.0.0.1:{STUB_PORT}", port=API_PORT,
+                                   work_dir=work_dir)
+    process = subprocess.Popen([sys.executable, "-c", code], env=env, stdout=log_file, stderr=subprocess.STDOUT)
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"La API terminó al arrancar (código {process.returncode})")
+        try:
+            requests.get(f"http://127.0.0.1:{API_PORT}/api/system/health", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("La API no respondió a tiempo")
+
+
+def open_event_stream(base_url: str, stop_event: threading.Event, counter: list):
+    """Navegador simulado: mantiene abierto /api/events y cuenta los eventos recibidos"""
+    try:
+        with requests.get(f"{base_url}/api/events", stream=True, timeout=30) as response:
+            for line in response.iter_lines():
+                if stop_event.is_set():
+                    break
+                if line.startswith(b"event:"):
+                    counter[0] += 1
+    except requests.RequestException:
+        pass
+
+
+def run_clients(base_url: str, clients: int, seconds: float) -> dict:
+    """N clientes con conexión keep-alive consultando los endpoints en rueda durante seconds"""
+    latencies = {endpoint: [] for endpoint in ENDPOINTS}
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(offset: int):
+        session = requests.Session()
+        local = {endpoint: [] for endpoint in ENDPOINTS}
+        local_errors = 0
+        position = offset
+        while time.perf_counter() < deadline:
+            endpoint = ENDPOINTS[position % len(ENDPOINTS)]
+            position += 1
+            start = time.perf_counter()
+            try:
+                response = session.get(base_url + endpoint, timeout=10)
+                response.content
+                if response.status_code != 200:
+                    local_errors += 1
+                    continue
+            except requests.RequestException:
+                local_errors += 1
+                continue
+            local[endpoint].append(time.perf_counter() - start)
+        session.close()
+        with lock:
+            for endpoint, values in local.items():
+                latencies[endpoint].extend(values)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'latencies': latencies, 'errors': errors[0]}
+
+
+def report(mode: str, clients: int, seconds: float, result: dict):
+    total = sum(len(values) for values in result['latencies'].values())
+    print(f"\n[{mode}] {clients} clientes: {total / seconds:.0f} peticiones/s, {result['errors']} errores")
+    print(f"  {'endpoint':<26} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for endpoint, values in result['latencies'].items():
+        if not values:
+            print(f"  {endpoint:<26} {0:>6}")
+            continue
+        values.sort()
+        print(f"  {endpoint:<26} {len(values):>6} {percentile(values, 0.5) * 1000:>8.1f} "
+              f"{percentile(values, 0.95) * 1000:>8.1f} {percentile(values, 0.99) * 1000:>8.1f} "
+              f"{values[-1] * 1000:>8.1f}")
+
+
+def run_mode(mode: str, args) -> bool:
+    base_url = f"http://127.0.0.1:{API_PORT}"
+    work_dir = tempfile.mkdtemp(prefix="carga_api_")
+    log_path = os.path.join(work_dir, "api.log")
+    stop_streams = threading.Event()
+    with open(log_path, "w") as log_file:
+        process = start_api(mode, args.cameras, work_dir, log_file)
+        try:
+            init = requests.post(f"{base_url}/api/cameras/initialize", json={}, timeout=30).json()
+            print(f"\n=== Modo {mode}: {init.get('total_initialized', 0)} cámaras simuladas "
+                  f"inicializadas en {init.get('total_ms')} ms ===")
+            start = requests.post(f"{base_url}/api/recording/start",
+                                  json={'patient_id': 'carga', 'session_id': mode}, timeout=30).json()
+            if not start.get('success'):
+                print(f"No se pudo iniciar la grabación: {start.get('error')}")
+                return False
+
+            event_counts = [[0] for _ in range(args.event_streams)]
+            for counter in event_counts:
+                threading.Thread(target=open_event_stream, args=(base_url, stop_streams, counter),
+                                 daemon=True).start()
+            time.sleep(1.0)  # Primer chunk en curso y canales conectados
+
+            for clients in parse_list(args.clients, int):
+                report(mode, clients, args.seconds, run_clients(base_url, clients, args.seconds))
+
+            started = time.perf_counter()
+            stop = requests.post(f"{base_url}/api/recording/stop", timeout=30)
+            stop_ms = (time.perf_counter() - started) * 1000
+            job_id = stop.json().get('job_id')
+            print(f"\n  /api/recording/stop respondió en {stop_ms:.0f} ms ({stop.status_code})")
+            deadline = time.time() + FINALIZE_TIMEOUT
+            job = {}
+            while job_id and time.time() < deadline:
+                job = requests.get(f"{base_url}/api/recording/jobs/{job_id}", timeout=10).json().get('job', {})
+                if job.get('state') != 'running':
+                    break
+                time.sleep(0.5)
+            print(f"  Finalización: {job.get('state')} en {job.get('elapsed_seconds')}s, "
+                  f"{job.get('chunks_acked')}/{job.get('chunks_total')} chunks confirmados; "
+                  f"eventos recibidos por canal: {[counter[0] for counter in event_counts]}")
+            return job.get('state') == 'completed'
+        finally:
+            stop_streams.set()
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de los endpoints de estado durante una grabación")
+    parser.add_argument("--modes", default=DEFAULT_MODES, help="Modos de servidor: production, development")
+    parser.add_argument("--clients", default=DEFAULT_CLIENTS, help="Clientes concurrentes (lista)")
+    parser.add_argument("--seconds", type=float, default=DEFAULT_SECONDS, help="Duración de cada ronda")
+    parser.add_argument("--cameras", type=int, default=DEFAULT_CAMERAS)
+    parser.add_argument("--event-streams", type=int, default=DEFAULT_EVENT_STREAMS,
+                        help="Canales /api/events abiertos durante la prueba")
+    args = parser.parse_args()
+
+    stub = StubServer(STUB_PORT).start()
+    try:
+        results = {mode: run_mode(mode, args) for mode in parse_list(args.modes)}
+    finally:
+        stub.stop()
+    print(f"\nChunks recibidos por el servidor simulado: {len(stub.received)}")
+    print("OK" if all(results.values()) else f"FALLOS: {[mode for mode, ok in results.items() if not ok]}")
+    sys.exit(0 if all(results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,438 @@
+"""
+Prueba del gestor de envíos (UploadManager) contra el servidor simulado de stub_server.py.
+- Encola chunks de varias cámaras en desorden; el servidor falla una fracción de los envíos.
+- Comprueba que todos llegan, que salen en orden de (secuencia, cámara) salvo reintentos,
+  y que las conexiones TCP se reutilizan (keep-alive).
+- Simula un reinicio con el servidor caído: el diario conserva los chunks (y el session_end pendiente)
+  y se reanudan al arrancar.
+- Modo sin conexión: sin servidor los chunks se acumulan con cuota ("drop_oldest") y, cuando el
+  servidor aparece, el backlog se vacía al ritmo configurado.
+- Límite de ancho de banda: los hilos de envío comparten el cubo de tokens y el total no pasa del límite;
+  muestra la espera en cola, la espera por el limitador y los bytes/s de cada chunk.
+- Envío reanudable: el servidor corta a mitad una fracción de los tramos y los chunks llegan íntegros
+  sin reenviarse enteros; con un servidor sin envío reanudable se envían los archivos enteros.
+- Envío por lotes: una petición por número de chunk con todas las cámaras; si una cámara se retrasa, su
+  secuencia se envía por separado tras la espera, y con un servidor sin lotes, chunk a chunk.
+- Uso: python backend/tests/prueba_envio_chunks.py [chunks_por_camara] [camaras] [fraccion_fallos]
+"""
+import os
+import sys
+import hashlib
+import random
+import tempfile
+import time
+import uuid
+from dataclasses import replace
+from datetime import datetime
+
+# Añadir la raíz del proyecto al path para importar el paquete backend
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from backend.config.settings import SystemConfig, StorageConfig
+from backend.upload_manager import UploadManager, UploadJournal
+from backend.video_processor.video_processor import VideoChunk
+from backend.video_processor.timestamp_sidecar import TimestampSidecar, sidecar_path
+from stub_server import StubServer
+
+# --- Configuración ---
+DEFAULT_CHUNKS = 20
+DEFAULT_CAMERAS = 3
+DEFAULT_FAILURE_RATE = 0.2
+PORT = 18299
+CHUNK_BYTES = 200 * 1024
+CHUNK_FRAMES = 150
+DRAIN_RATE = 2 * 1024 * 1024  # Ritmo de vaciado en la prueba sin conexión (bytes/s)
+BANDWIDTH_CAP = 1024 * 1024  # Límite de ancho de banda en la prueba del limitador (bytes/s)
+BANDWIDTH_BURST = 64 * 1024
+BANDWIDTH_CHUNKS = 3  # Chunks por cámara en la prueba del limitador
+RESUMABLE_CHUNKS = 4  # Chunks por cámara en la prueba del envío reanudable
+RESUMABLE_SEGMENT = 64 * 1024  # Tramos de ~1/3 de chunk
+INTERRUPT_RATE = 0.3  # Fracción de tramos que el servidor corta a mitad
+BATCH_WAIT = 0.3  # Espera máxima por las cámaras de un lote en la prueba por lotes
+
+
+def make_chunks(output_dir: str, chunks_per_camera: int, cameras: int) -> list:
+    """Archivos de chunk falsos, con sus timestamps por frame y sus metadatos"""
+    chunks = []
+    for sequence_number in range(chunks_per_camera):
+        for camera_id in range(cameras):
+            path = os.path.join(output_dir, f"camera{camera_id}_{sequence_number}.mp4")
+            with open(path, 'wb') as f:
+                f.write(os.urandom(CHUNK_BYTES))
+            timestamps = TimestampSidecar()
+            first_index = sequence_number * CHUNK_FRAMES
+            for frame_index in range(first_index, first_index + CHUNK_FRAMES):
+                timestamps.append(frame_index, time.time() + frame_index / 30, frame_index * 33333)
+            timestamps.write(sidecar_path(path))
+            chunks.append(VideoChunk(
+                chunk_id=str(uuid.uuid4()),
+                camera_id=camera_id,
+                session_id="prueba",
+                patient_id="1",
+                sequence_number=sequence_number,
+                file_path=path,
+                duration_seconds=5.0,
+                timestamp=datetime.now(),
+                file_size_bytes=CHUNK_BYTES,
+                first_frame_index=first_index,
+                last_frame_index=first_index + CHUNK_FRAMES - 1,
+                frame_count=CHUNK_FRAMES,
+                timestamps_path=sidecar_path(path)
+            ))
+    return chunks
+
+
+def run_uploads(server: StubServer, journal_path: str, output_dir: str, chunks: list) -> dict:
+    """Enviar los chunks con un gestor nuevo (diario propio) y resumir lo recibido"""
+    config = replace(SystemConfig.UPLOAD, retry_base_delay_seconds=0.05, retry_max_delay_seconds=0.5, max_retries=8)
+    manager = UploadManager(config, server.config, UploadJournal(journal_path))
+    received_before = len(server.received)
+    for chunk in chunks:
+        manager.enqueue(chunk)
+    idle = manager.wait_until_idle(timeout=120)
+    manager.stop()
+
+    received = [(int(fields['chunk_number']), int(fields['camera_id'])) for fields in server.received[received_before:]]
+    with_timestamps = sum(1 for fields in server.received[received_before:]
+                          if 'timestamps' in fields and len(fields['timestamps']) == int(fields['frame_count']))
+    stats = manager.get_stats()
+    return {
+        'idle': idle,
+        'received': len(set(received)),
+        'with_timestamps': with_timestamps,
+        'out_of_order': sum(1 for previous, current in zip(received, received[1:]) if current < previous),
+        'failed': stats['failed'],
+        'retries': stats['retries'],
+        'leftover_files': len(os.listdir(output_dir))
+    }
+
+
+def run_recovery(server: StubServer, journal_path: str, output_dir: str, chunks: list) -> dict:
+    """Simular un reinicio: los envíos fallan, y un gestor nuevo los reanuda desde el diario"""
+    server.failure_rate = 1.0
+    config = replace(SystemConfig.UPLOAD, retry_base_delay_seconds=0.01, max_retries=1)
+    manager = UploadManager(config, server.config, UploadJournal(journal_path))
+    for chunk in chunks:
+        manager.enqueue(chunk)
+    manager.wait_until_idle(timeout=60)
+    manager.stop()
+    # La sesión terminó mientras tanto: su session_end espera las confirmaciones
+    since = min(chunk.timestamp for chunk in chunks)
+    manager.remember_session_end("prueba", "1", since, 0)
+    manager.journal.close()
+    pending_after_failure = manager.journal.count_by_state().get('written', 0)
+
+    # "Reinicio": otro gestor y otra conexión al mismo diario, con el servidor ya disponible
+    server.failure_rate = 0.0
+    received_before = len(server.received)
+    manager = UploadManager(config, server.config, UploadJournal(journal_path))
+    recovered = manager.recover_pending()
+    idle = manager.wait_until_idle(timeout=60)
+    manager.stop()
+    session_ends = manager.pending_session_ends()
+    progress = manager.session_progress("prueba", "1", session_ends[0][2]) if session_ends else None
+    manager.forget_session_end("prueba", "1", since)
+    return {
+        'idle': idle,
+        'session_ends': session_ends,
+        'progress': progress,
+        'session_ends_after_sending': len(manager.pending_session_ends()),
+        'pending_after_failure': pending_after_failure,
+        'recovered': recovered,
+        'received': len(server.received) - received_before,
+        'journal': manager.journal.count_by_state(),
+        'leftover_files': len(os.listdir(output_dir))
+    }
+
+
+def run_rejected(server: StubServer, journal_path: str, chunks: list) -> dict:
+    """El servidor rechaza los chunks (422): no se reenvían tras un reinicio ni cuentan como pendientes"""
+    server.reject_status = 422
+    config = replace(SystemConfig.UPLOAD, resumable=False, retry_base_delay_seconds=0.01, max_retries=1)
+    manager = UploadManager(config, server.config, UploadJournal(journal_path))
+    for chunk in chunks:
+        manager.enqueue(chunk)
+    manager.wait_until_idle(timeout=60)
+    manager.stop()
+    progress = manager.session_progress("prueba", "1")
+    manager.journal.close()
+    server.reject_status = None
+
+    # "Reinicio" con el servidor ya aceptando chunks: los rechazados no vuelven a salir
+    received_before = len(server.received)
+    manager = UploadManager(config, server.config, UploadJournal(journal_path))
+    recovered = manager.recover_pending()
+    manager.wait_until_idle(timeout=60)
+    manager.stop()
+    result = {
+        'rejected': manager.journal.count_by_state().get('rejected', 0),
+        'failed': progress['failed'],
+        'recovered': recovered,
+        'resent': len(server.received) - received_before,
+        'pending_bytes': manager.journal.pending_bytes()[1]
+    }
+    manager.journal.forget_session("prueba")
+    return result
+
+
+def run_offline(journal_path: str, output_dir: str, chunks: list) -> dict:
+    """Encolar sin servidor, con cuota para la mitad de los chunks, y vaciar al arrancarlo"""
+    storage_config = StorageConfig(
+        quota_bytes=len(chunks) // 2 * CHUNK_BYTES,
+        quota_policy="drop_oldest",
+        drain_rate_bytes_per_second=DRAIN_RATE,
+        health_check_interval_seconds=0.2
+    )
+    server_config = replace(SystemConfig.SERVER, base_url=f"http://127.0.0.1:{PORT + 1}")  # Nadie escucha todavía
+    config = replace(SystemConfig.UPLOAD, retry_base_delay_seconds=0.01)
+    manager = UploadManager(config, server_config, UploadJournal(journal_path), storage_config)
+    for chunk in chunks:
+        manager.enqueue(chunk)
+        time.sleep(0.01)
+    offline_status = manager.get_storage_status()
+
+    offline_server = StubServer(PORT + 1).start()
+    start = time.time()
+    while time.time() - start < 60:
+        status = manager.get_storage_status()
+        if status['server_online'] and status['backlog_chunks'] == 0 and not status['draining']:
+            break
+        time.sleep(0.1)
+    drain_seconds = time.time() - start
+    manager.stop()
+    offline_server.stop()
+    return {
+        'went_offline': not offline_status['server_online'],
+        'backlog_chunks': offline_status['backlog_chunks'],
+        'backlog_bytes': offline_status['backlog_bytes'],
+        'evicted': offline_status['evicted_chunks'],
+        'received': len(offline_server.received),
+        'drain_seconds': drain_seconds,
+        'final': manager.get_storage_status()
+    }
+
+
+def run_bandwidth_cap(server: StubServer, journal_path: str, chunks: list) -> dict:
+    """Enviar con un límite de ancho de banda común a todos los hilos y medir el ritmo total"""
+    server.failure_rate = 0.0
+    config = replace(SystemConfig.UPLOAD, workers=3, max_bandwidth_bytes_per_second=BANDWIDTH_CAP,
+                     bandwidth_burst_bytes=BANDWIDTH_BURST)
+    manager = UploadManager(config, server.config, UploadJournal(journal_path))
+    received_before = len(server.received)
+    start = time.time()
+    for chunk in chunks:
+        manager.enqueue(chunk)
+    idle = manager.wait_until_idle(timeout=60)
+    elapsed = time.time() - start
+    stats = manager.get_stats()
+    manager.stop()
+    reports = stats['recent_uploads']
+    return {
+        'idle': idle,
+        'received': len(server.received) - received_before,
+        'elapsed': elapsed,
+        'body_bytes': sum(report['bytes'] for report in reports),
+        'throttled_seconds': stats['throttled_seconds'],
+        'reports': reports
+    }
+
+
+def run_resumable(server: StubServer, journal_path: str, chunks: list, resumable: bool) -> dict:
+    """Enviar con cortes a mitad de tramo (o a un servidor sin envío reanudable) y comprobar la integridad"""
+    server.failure_rate = 0.0
+    server.resumable = resumable
+    server.interrupt_rate = INTERRUPT_RATE if resumable else 0.0
+    digests = {}
+    for chunk in chunks:
+        with open(chunk.file_path, 'rb') as f:
+            digests[chunk.chunk_id] = hashlib.sha256(f.read()).hexdigest()
+    config = replace(SystemConfig.UPLOAD, retry_base_delay_seconds=0.01, resumable_segment_bytes=RESUMABLE_SEGMENT,
+                     max_bandwidth_bytes_per_second=0)
+    storage_config = StorageConfig(health_check_interval_seconds=0.1)  # Cada corte pasa a modo sin conexión
+    manager = UploadManager(config, server.config, UploadJournal(journal_path), storage_config)
+    received_before = len(server.received)
+    bytes_before = server.body_bytes
+    for chunk in chunks:
+        manager.enqueue(chunk)
+    start = time.time()
+    while time.time() - start < 60:
+        if manager.server_online and manager.wait_until_idle(timeout=0.5):
+            break
+        time.sleep(0.1)
+    stats = manager.get_stats()
+    manager.stop()
+    server.interrupt_rate = 0.0
+    server.resumable = True
+    received = server.received[received_before:]
+    return {
+        'received': len({fields['chunk_id'] for fields in received}),
+        'intact': sum(1 for fields in received if digests.get(fields['chunk_id']) == fields['sha256']),
+        'video_bytes': len(chunks) * CHUNK_BYTES,
+        'body_bytes': server.body_bytes - bytes_before,
+        'bytes_resumed': stats['bytes_resumed'],
+        'resumable_supported': stats['resumable_supported']
+    }
+
+
+def run_batches(server: StubServer, journal_path: str, chunks: list, cameras: int, batching: bool) -> dict:
+    """Enviar por lotes con la última cámara de la última secuencia retrasada más de BATCH_WAIT"""
+    server.failure_rate = 0.0
+    server.batching = batching
+    digests = {}
+    for chunk in chunks:
+        with open(chunk.file_path, 'rb') as f:
+            digests[chunk.chunk_id] = hashlib.sha256(f.read()).hexdigest()
+    config = replace(SystemConfig.UPLOAD, resumable=False, max_bandwidth_bytes_per_second=0)
+    server_config = replace(server.config, batch_uploads=True, batch_wait_seconds=BATCH_WAIT)
+    manager = UploadManager(config, server_config, UploadJournal(journal_path))
+    manager.set_active_session("prueba", list(range(cameras)))
+    received_before = len(server.received)
+    requests_before = server.upload_requests
+    rejected_before = server.batches_rejected
+    chunks = sorted(chunks, key=lambda chunk: (chunk.sequence_number, chunk.camera_id))
+    late = chunks[-1]
+    for chunk in chunks[:-1]:
+        manager.enqueue(chunk)
+    time.sleep(BATCH_WAIT + 0.2)
+    manager.enqueue(late)
+    idle = manager.wait_until_idle(timeout=60)
+    stats = manager.get_stats()
+    manager.stop()
+    server.batching = True
+    received = server.received[received_before:]
+    return {
+        'idle': idle,
+        'received': len({fields['chunk_id'] for fields in received}),
+        'intact': sum(1 for fields in received if digests.get(fields['chunk_id']) == fields['sha256']),
+        'in_batches': sum(1 for fields in received if int(fields.get('batch_size', 1)) > 1),
+        'requests': server.upload_requests - requests_before,
+        'batches_rejected': server.batches_rejected - rejected_before,
+        'batches_uploaded': stats['batches_uploaded'],
+        'batch_fallbacks': stats['batch_fallbacks'],
+        'batch_supported': stats['batch_supported']
+    }
+
+
+def main():
+    chunks_per_camera = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CHUNKS
+    cameras = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_CAMERAS
+    failure_rate = float(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_FAILURE_RATE
+
+    server = StubServer(PORT, failure_rate).start()
+    with tempfile.TemporaryDirectory() as output_dir:
+        journal_path = os.path.join(output_dir, "journal", "upload_journal.db")
+        video_dir = os.path.join(output_dir, "videos")
+        os.makedirs(video_dir)
+
+        chunks = make_chunks(video_dir, chunks_per_camera, cameras)
+        random.shuffle(chunks)
+        result = run_uploads(server, journal_path, video_dir, chunks)
+        print(f"--- Envío de {len(chunks)} chunks ({cameras} cámaras, fallos simulados {failure_rate:.0%}) ---")
+        print(f"Cola vacía al terminar: {result['idle']}")
+        print(f"Recibidos: {result['received']}/{len(chunks)} (fallidos {result['failed']}, reintentos {result['retries']})")
+        print(f"Fuera de orden: {result['out_of_order']} (solo esperables por reintentos o hilos en paralelo)")
+        print(f"Con timestamps por frame completos: {result['with_timestamps']}")
+        print(f"Conexiones TCP: {server.connections} para {len(server.received) + server.failures} peticiones")
+        print(f"Archivos locales sin borrar: {result['leftover_files']}")
+        ok = (result['idle'] and result['received'] == len(chunks) and result['leftover_files'] == 0
+              and result['with_timestamps'] >= len(chunks))
+
+        chunks = make_chunks(video_dir, chunks_per_camera, cameras)
+        recovery = run_recovery(server, journal_path, video_dir, chunks)
+        print(f"--- Reanudación tras reinicio ({len(chunks)} chunks con el servidor caído) ---")
+        print(f"Pendientes en el diario tras los fallos: {recovery['pending_after_failure']}")
+        print(f"Reencolados al arrancar: {recovery['recovered']}, recibidos: {recovery['received']}")
+        print(f"Diario al terminar: {recovery['journal']}, archivos locales sin borrar: {recovery['leftover_files']}")
+        print(f"session_end pendientes tras reiniciar: {len(recovery['session_ends'])}, "
+              f"progreso de la sesión: {recovery['progress']}")
+        ok = (ok and recovery['idle'] and recovery['received'] == len(chunks) and recovery['leftover_files'] == 0
+              and len(recovery['session_ends']) == 1 and recovery['progress']['acked'] == len(chunks)
+              and recovery['progress']['pending'] == 0 and recovery['session_ends_after_sending'] == 0)
+
+        chunks = make_chunks(video_dir, chunks_per_camera, cameras)
+        rejected = run_rejected(server, journal_path, chunks)
+        print(f"--- Chunks rechazados por el servidor ({len(chunks)}) ---")
+        print(f"Rechazados en el diario: {rejected['rejected']} (en el progreso de la sesión: {rejected['failed']}); "
+              f"tras reiniciar, reencolados: {rejected['recovered']}, reenviados: {rejected['resent']}, "
+              f"bytes pendientes: {rejected['pending_bytes']}")
+        ok = (ok and rejected['rejected'] == len(chunks) and rejected['failed'] == len(chunks)
+              and rejected['recovered'] == 0 and rejected['resent'] == 0 and rejected['pending_bytes'] == 0)
+        for name in os.listdir(video_dir):
+            os.remove(os.path.join(video_dir, name))  # Los rechazados se quedan en disco
+
+        chunks = make_chunks(video_dir, chunks_per_camera, cameras)
+        offline = run_offline(journal_path, video_dir, chunks)
+        # El limitador deja salir de golpe hasta bandwidth_burst_bytes; el resto va al ritmo de vaciado
+        expected_seconds = max(0, offline['backlog_bytes'] - SystemConfig.UPLOAD.bandwidth_burst_bytes) / DRAIN_RATE
+        print(f"--- Sin conexión ({len(chunks)} chunks, cuota para {len(chunks) // 2}) ---")
+        print(f"Modo sin conexión detectado: {offline['went_offline']}")
+        print(f"Backlog: {offline['backlog_chunks']} chunks ({offline['backlog_bytes'] / 1024 ** 2:.1f} MB), "
+              f"descartados por cuota: {offline['evicted']}")
+        print(f"Recibidos al reconectar: {offline['received']} en {offline['drain_seconds']:.1f}s "
+              f"(mínimo esperado por ritmo de vaciado: {expected_seconds:.1f}s)")
+        print(f"Backlog final: {offline['final']['backlog_chunks']} chunks")
+        ok = (ok and offline['went_offline'] and offline['evicted'] > 0
+              and offline['received'] == len(chunks) - offline['evicted']
+              and offline['final']['backlog_chunks'] == 0)
+
+        chunks = make_chunks(video_dir, BANDWIDTH_CHUNKS, cameras)
+        capped = run_bandwidth_cap(server, journal_path, chunks)
+        expected_seconds = max(0, capped['body_bytes'] - BANDWIDTH_BURST) / BANDWIDTH_CAP
+        print(f"--- Límite de ancho de banda ({BANDWIDTH_CAP / 1024 ** 2:.1f} MB/s, 3 hilos, {len(chunks)} chunks) ---")
+        print(f"Recibidos: {capped['received']} en {capped['elapsed']:.1f}s "
+              f"({capped['body_bytes'] / capped['elapsed'] / 1024 ** 2:.2f} MB/s; mínimo por el límite {expected_seconds:.1f}s)")
+        print(f"Espera total por el limitador: {capped['throttled_seconds']:.1f}s")
+        for report in capped['reports']:
+            print(f"  chunk {report['sequence_number']} cámara {report['camera_id']}: cola {report['queue_wait_seconds']:.2f}s, "
+                  f"limitador {report['throttled_seconds']:.2f}s, {report['throughput_bytes_per_second'] / 1024:.0f} KB/s")
+        ok = (ok and capped['idle'] and capped['received'] == len(chunks)
+              and capped['elapsed'] >= expected_seconds * 0.95)
+
+        chunks = make_chunks(video_dir, RESUMABLE_CHUNKS, cameras)
+        resumed = run_resumable(server, journal_path, chunks, resumable=True)
+        print(f"--- Envío reanudable ({len(chunks)} chunks, tramos de {RESUMABLE_SEGMENT // 1024} KB, "
+              f"{INTERRUPT_RATE:.0%} de tramos cortados) ---")
+        print(f"Recibidos: {resumed['received']}/{len(chunks)}, íntegros: {resumed['intact']}")
+        print(f"Bytes recibidos por el servidor: {resumed['body_bytes'] / 1024 ** 2:.2f} MB para "
+              f"{resumed['video_bytes'] / 1024 ** 2:.2f} MB de video; no reenviados: {resumed['bytes_resumed'] / 1024:.0f} KB")
+        ok = (ok and resumed['received'] == len(chunks) and resumed['intact'] == len(chunks)
+              and resumed['resumable_supported'] is True and resumed['bytes_resumed'] > 0)
+
+        chunks = make_chunks(video_dir, RESUMABLE_CHUNKS, cameras)
+        fallback = run_resumable(server, journal_path, chunks, resumable=False)
+        print(f"--- Servidor sin envío reanudable ({len(chunks)} chunks) ---")
+        print(f"Recibidos: {fallback['received']}/{len(chunks)}, íntegros: {fallback['intact']}, "
+              f"envío reanudable detectado: {fallback['resumable_supported']}")
+        ok = (ok and fallback['received'] == len(chunks) and fallback['intact'] == len(chunks)
+              and fallback['resumable_supported'] is False)
+
+        chunks = make_chunks(video_dir, RESUMABLE_CHUNKS, cameras)
+        batched = run_batches(server, journal_path, chunks, cameras, batching=True)
+        print(f"--- Envío por lotes ({len(chunks)} chunks de {cameras} cámaras, última cámara retrasada) ---")
+        print(f"Recibidos: {batched['received']}/{len(chunks)}, íntegros: {batched['intact']}, "
+              f"en lotes: {batched['in_batches']}")
+        print(f"Peticiones: {batched['requests']} (por chunk serían {len(chunks)}); lotes {batched['batches_uploaded']}, "
+              f"enviados por separado {batched['batch_fallbacks']}")
+        ok = (ok and batched['idle'] and batched['received'] == len(chunks) and batched['intact'] == len(chunks)
+              and batched['batches_uploaded'] == RESUMABLE_CHUNKS - 1 and batched['batch_fallbacks'] == 1
+              and batched['requests'] == RESUMABLE_CHUNKS - 1 + cameras)
+
+        chunks = make_chunks(video_dir, RESUMABLE_CHUNKS, cameras)
+        unbatched = run_batches(server, journal_path, chunks, cameras, batching=False)
+        print(f"--- Servidor sin envío por lotes ({len(chunks)} chunks) ---")
+        print(f"Recibidos: {unbatched['received']}/{len(chunks)}, íntegros: {unbatched['intact']}, "
+              f"envío por lotes detectado: {unbatched['batch_supported']}, "
+              f"lotes rechazados: {unbatched['batches_rejected']}")
+        # Solo los lotes ya en vuelo al llegar el primer 404 (uno por hilo de envío) llegan al servidor
+        ok = (ok and unbatched['idle'] and unbatched['received'] == len(chunks)
+              and unbatched['intact'] == len(chunks) and unbatched['batch_supported'] is False
+              and 1 <= unbatched['batches_rejected'] <= SystemConfig.UPLOAD.workers)
+    server.stop()
+
+    print("OK" if ok else "ERROR")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Servidor de procesamiento simulado para probar el envío de chunks sin el servidor real.
+- Acepta los endpoints de ServerConfig: recepción de chunks e inicio/fin/cancelación de sesión.
+- Lee los timestamps por frame que acompañan a cada chunk (TimestampSidecar).
+- HTTP/1.1 con keep-alive: cuenta las conexiones TCP abiertas para comprobar su reutilización.
+- Puede fallar (503) una fracción de los envíos y añadir latencia para probar reintentos, o rechazar
+  todos los chunks con un código definitivo (reject_status).
+- Implementación de referencia del envío reanudable (ResumableReceiver): negociación del offset por
+  chunk_id y tramos PATCH con Upload-Offset. Puede cortar una fracción de los tramos a mitad para
+  simular una red inestable, o no ofrecerlo (404) como un servidor antiguo.
+- Envío por lotes (/api/chunks/receive_batch): comprueba el SHA-256 de cada cámara y acepta todo o nada.
+- Uso: python backend/tests/stub_server.py [puerto] [fraccion_fallos] [latencia_s]
+"""
+import os
+import sys
+import json
+import hashlib
+import random
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from typing import Optional
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Añadir la raíz del proyecto al path para importar el paquete backend
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from backend.config.settings import ServerConfig
+from backend.video_processor.timestamp_sidecar import TimestampSidecar
+
+# --- Configuración ---
+DEFAULT_PORT = 11299
+DEFAULT_FAILURE_RATE = 0.0
+DEFAULT_LATENCY = 0.0
+READ_BLOCK_BYTES = 64 * 1024
+
+
+def parse_multipart(content_type: str, body: bytes) -> dict:
+    """Campos de un formulario multipart: texto -> str, archivos -> bytes"""
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        payload = part.get_payload(decode=True)
+        fields[name] = payload if part.get_filename() else payload.decode()
+    return fields
+
+
+class ResumableReceiver:
+    """Lado servidor del envío reanudable de chunks (referencia para el servidor de procesamiento)
+
+    1. POST resumable_upload_endpoint (multipart: metadatos del chunk, upload_length y timestamps)
+       -> 201 {upload_id, offset: 0, length} o, si ya hay una subida de ese chunk_id, 200 con su offset.
+    2. PATCH resumable_upload_endpoint/<upload_id> con Upload-Offset y los bytes siguientes del video.
+       Lo recibido se guarda aunque la conexión se corte a mitad. Responde 204 con el nuevo Upload-Offset,
+       409 {offset} si Upload-Offset no coincide y, con el último byte, la respuesta de /api/chunks/receive.
+       Un PATCH vacío en offset == length repite esa respuesta (la confirmación se perdió).
+    """
+
+    def __init__(self, on_complete):
+        self.on_complete = on_complete  # (metadatos, video) -> (código HTTP, respuesta JSON)
+        self.uploads = {}  # upload_id -> {'fields', 'length', 'data', 'result'}
+        self.by_chunk_id = {}
+        self.lock = threading.Lock()
+
+    def create(self, fields: dict):
+        try:
+            length = int(fields.pop('upload_length'))
+            chunk_id = fields['chunk_id']
+        except (KeyError, ValueError):
+            return 400, {'error': 'INVALID_UPLOAD'}
+        with self.lock:
+            upload_id = self.by_chunk_id.get(chunk_id)
+            upload = self.uploads.get(upload_id)
+            if upload is not None and upload['length'] == length:
+                return 200, {'upload_id': upload_id, 'offset': len(upload['data']), 'length': length}
+            upload_id = uuid.uuid4().hex
+            self.uploads[upload_id] = {'fields': fields, 'length': length, 'data': bytearray(), 'result': None}
+            self.by_chunk_id[chunk_id] = upload_id
+        return 201, {'upload_id': upload_id, 'offset': 0, 'length': length}
+
+    def write(self, upload_id: str, offset: int, stream, content_length: int, stop_after: int = -1):
+        """Añadir los bytes del PATCH. Retorna (código, respuesta JSON, offset) o None si se cortó
+
+        stop_after >= 0 simula un corte de red tras recibir esos bytes.
+        """
+        upload = self.uploads.get(upload_id)
+        if upload is None:
+            return 404, {'error': 'UPLOAD_NOT_FOUND'}, 0
+        data = upload['data']
+        if offset != len(data):
+            return 409, {'error': 'OFFSET_MISMATCH', 'offset': len(data)}, len(data)
+        remaining = min(content_length, upload['length'] - offset)
+        while remaining > 0:
+            block = stream.read(min(READ_BLOCK_BYTES, remaining))
+            if not block:
+                return None  # Conexión cortada: lo recibido hasta aquí se conserva
+            if 0 <= stop_after < len(block):
+                data.extend(block[:stop_after])
+                return None
+            data.extend(block)
+            remaining -= len(block)
+            stop_after -= len(block) if stop_after >= 0 else 0
+        if len(data) < upload['length']:
+            return 204, {}, len(data)
+        if upload['result'] is None:
+            status, payload = self.on_complete(dict(upload['fields']), bytes(data))
+            if status != 200:
+                return status, payload, len(data)  # Sin confirmar: el siguiente PATCH vacío lo reintenta
+            upload['result'] = (status, payload)
+        status, payload = upload['result']
+        return status, payload, len(data)
+
+
+class StubServer:
+    """Servidor simulado en un hilo; guarda los chunks recibidos en memoria"""
+
+    def __init__(self, port: int = DEFAULT_PORT, failure_rate: float = DEFAULT_FAILURE_RATE,
+                 latency: float = DEFAULT_LATENCY):
+        self.port = port
+        self.failure_rate = failure_rate
+        self.latency = latency
+        self.config = ServerConfig(base_url=f"http://127.0.0.1:{port}")
+        self.received = []  # Metadatos de cada chunk aceptado, en orden de llegada
+        self.session_events = []  # (endpoint, cuerpo JSON, instante) de inicio/fin/cancelación de sesión
+        self.failures = 0
+        self.connections = 0
+        self.resumable = True  # False = servidor sin envío reanudable (responde 404)
+        self.interrupt_rate = 0.0  # Fracción de tramos PATCH que se cortan a mitad
+        self.resumable_receiver = ResumableReceiver(self._complete_chunk)
+        self.batching = True  # False = servidor sin envío por lotes (responde 404)
+        self.body_bytes = 0  # Bytes de cuerpo recibidos en envíos de chunks (incluidos los repetidos)
+        self.upload_requests = 0  # Peticiones de envío de chunks (enteros, reanudables y lotes)
+        self.reject_status: Optional[int] = None  # Código con el que se rechaza cada chunk (None = se aceptan)
+        self.batches_rejected = 0  # Lotes recibidos con el envío por lotes desactivado (respondidos con 404)
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), self._make_handler())
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self) -> 'StubServer':
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _simulate_failure(self) -> bool:
+        if random.random() < self.failure_rate:
+            with self.lock:
+                self.failures += 1
+            return True
+        return False
+
+    def _complete_chunk(self, fields: dict, video: bytes):
+        """Aceptar un chunk completo (por envío entero o reanudable). Retorna (código, respuesta)"""
+        if self.reject_status is not None:
+            return self.reject_status, {'error': 'SIMULATED_REJECTION'}
+        if self._simulate_failure():
+            return 503, {'error': 'SIMULATED_FAILURE'}
+        self._store_chunk(fields, video)
+        return 200, {'success': True, 'chunk_id': fields.get('chunk_id')}
+
+    def _complete_batch(self, fields: dict):
+        """Aceptar los chunks de un lote (todos o ninguno). Retorna (código, respuesta)"""
+        chunks = []
+        for camera_id in fields.get('cameras', '').split(','):
+            try:
+                metadata = json.loads(fields[f"metadata_{camera_id}"])
+                video = fields[metadata.pop('file_field')]
+            except (KeyError, ValueError):
+                return 400, {'error': 'INVALID_BATCH', 'camera_id': camera_id}
+            if hashlib.sha256(video).hexdigest() != metadata.pop('sha256', None):
+                return 400, {'error': 'CHECKSUM_MISMATCH', 'camera_id': camera_id}
+            timestamps_field = metadata.pop('timestamps_field', None)
+            chunk_fields = {name: str(value) for name, value in metadata.items()}
+            if timestamps_field in fields:
+                chunk_fields['timestamps'] = fields[timestamps_field]
+            chunks.append((chunk_fields, video))
+        if self._simulate_failure():
+            return 503, {'error': 'SIMULATED_FAILURE'}
+        for chunk_fields, video in chunks:
+            chunk_fields['batch_size'] = len(chunks)
+            self._store_chunk(chunk_fields, video)
+        return 200, {'success': True, 'chunk_ids': [chunk_fields['chunk_id'] for chunk_fields, _ in chunks]}
+
+    def _store_chunk(self, fields: dict, video: bytes):
+        fields['received_bytes'] = len(video)
+        fields['sha256'] = hashlib.sha256(video).hexdigest()
+        timestamps = fields.pop('timestamps', None)
+        if isinstance(timestamps, bytes):
+            fields['timestamps'] = TimestampSidecar.from_bytes(timestamps)
+        fields['received_at'] = time.time()
+        with self.lock:
+            self.received.append(fields)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive
+
+            def setup(self):
+                super().setup()
+                with server.lock:
+                    server.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, payload: dict):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if server.latency:
+                    time.sleep(server.latency)
+
+                if self.path == server.config.upload_endpoint:
+                    with server.lock:
+                        server.body_bytes += len(body)
+                        server.upload_requests += 1
+                    fields = parse_multipart(self.headers['Content-Type'], body)
+                    video = fields.pop('file', b'')
+                    self._reply(*server._complete_chunk(fields, video))
+                elif self.path == server.config.batch_upload_endpoint and server.batching:
+                    with server.lock:
+                        server.body_bytes += len(body)
+                        server.upload_requests += 1
+                    self._reply(*server._complete_batch(parse_multipart(self.headers['Content-Type'], body)))
+                elif self.path == server.config.batch_upload_endpoint:
+                    with server.lock:
+                        server.batches_rejected += 1
+                    self._reply(404, {'error': 'NOT_FOUND'})
+                elif self.path == server.config.resumable_upload_endpoint and server.resumable:
+                    with server.lock:
+                        server.body_bytes += len(body)
+                        server.upload_requests += 1
+                    self._reply(*server.resumable_receiver.create(parse_multipart(self.headers['Content-Type'], body)))
+                elif self.path in (server.config.session_start_endpoint, server.config.session_end_endpoint,
+                                   server.config.session_cancel_endpoint):
+                    with server.lock:
+                        server.session_events.append((self.path, json.loads(body or b'{}'), time.time()))
+                    self._reply(200, {'success': True})
+                else:
+                    self._reply(404, {'error': 'NOT_FOUND'})
+
+            def do_PATCH(self):
+                prefix = server.config.resumable_upload_endpoint + "/"
+                content_length = int(self.headers.get('Content-Length', 0))
+                if not self.path.startswith(prefix) or not server.resumable:
+                    self.rfile.read(content_length)
+                    self._reply(404, {'error': 'NOT_FOUND'})
+                    return
+                stop_after = content_length // 2 if content_length and random.random() < server.interrupt_rate else -1
+                result = server.resumable_receiver.write(self.path[len(prefix):], int(self.headers.get('Upload-Offset', -1)),
+                                                         self.rfile, content_length, stop_after)
+                with server.lock:
+                    server.body_bytes += content_length if stop_after < 0 else stop_after
+                    server.upload_requests += 1
+                if result is None:
+                    self.close_connection = True  # Corte simulado: se cierra sin responder
+                    return
+                status, payload, offset = result
+                if status in (404, 409):
+                    self.rfile.read(content_length)  # No se leyó nada: vaciar el cuerpo para seguir con keep-alive
+                if status == 204:
+                    self.send_response(204)
+                    self.send_header('Upload-Offset', str(offset))
+                    self.end_headers()
+                else:
+                    self._reply(status, payload)
+
+        return Handler
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    failure_rate = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_FAILURE_RATE
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_LATENCY
+    server = StubServer(port, failure_rate, latency).start()
+    print(f"Servidor simulado en http://127.0.0.1:{port} (fallos {failure_rate:.0%}, latencia {latency}s). Ctrl+C para salir")
+    try:
+        while True:
+            time.sleep(5)
+            with server.lock:
+                print(f"Chunks recibidos: {len(server.received)}, fallos simulados: {server.failures}, "
+                      f"conexiones TCP: {server.connections}")
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
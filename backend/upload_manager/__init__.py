@@ -0,0 +1,8 @@
+from .upload_manager import UploadManager, upload_manager
+from .upload_journal import UploadJournal, upload_journal
+from .storage_quota import StorageQuota
+from .bandwidth_limiter import BandwidthLimiter
+from .multipart_stream import MultipartStream, FileRangeStream
+
+__all__ = ['UploadManager', 'upload_manager', 'UploadJournal', 'upload_journal', 'StorageQuota', 'BandwidthLimiter',
+           'MultipartStream', 'FileRangeStream']
@@ -0,0 +1,41 @@
+# Limitador de ancho de banda de los envíos (cubo de tokens)
+# Lo comparten todos los hilos de envío: en los cambios de chunk salen a la vez los de todas las
+# cámaras y, sin límite, saturan la red y la CPU justo cuando se capturan y codifican frames.
+# Cada bloque del cuerpo de una petición consume sus bytes del cubo; el cubo se rellena a `rate`
+# bytes/s hasta `burst` bytes. Si faltan tokens se reservan igualmente (saldo negativo) y el hilo
+# espera lo que tarda en cubrirse la deuda, así los hilos salen en orden de llegada.
+import threading
+import time
+from typing import Callable, Optional
+
+
+class BandwidthLimiter:
+    """Cubo de tokens en bytes con un ritmo que puede cambiar en cada consulta"""
+
+    def __init__(self, rate: Callable[[], float], burst_bytes: int, stop_event: Optional[threading.Event] = None):
+        self.rate = rate  # Bytes/s en este momento (<= 0 = sin límite); p. ej. más bajo al vaciar el backlog
+        self.burst_bytes = max(1, burst_bytes)
+        self.stop_event = stop_event or threading.Event()  # Interrumpe las esperas al detener el gestor
+        self.tokens = float(self.burst_bytes)
+        self.throttled_seconds = 0.0  # Espera total acumulada por todos los hilos
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes: int) -> float:
+        """Reservar nbytes y esperar hasta poder enviarlos. Retorna los segundos esperados"""
+        rate = self.rate()
+        with self._lock:
+            now = time.monotonic()
+            if rate <= 0:
+                # Sin límite: el cubo queda lleno para cuando vuelva a haberlo
+                self.tokens = float(self.burst_bytes)
+                self._updated_at = now
+                return 0.0
+            self.tokens = min(float(self.burst_bytes), self.tokens + (now - self._updated_at) * rate)
+            self._updated_at = now
+            self.tokens -= nbytes
+            delay = -self.tokens / rate if self.tokens < 0 else 0.0
+            self.throttled_seconds += delay
+        if delay > 0:
+            self.stop_event.wait(delay)
+        return delay
@@ -0,0 +1,131 @@
+# Cuerpos de petición que se leen por bloques desde los archivos mapeados en memoria
+# Con `files=` requests monta el cuerpo entero en memoria antes de enviarlo (una copia del chunk
+# por hilo de envío). Estos cuerpos conocen su longitud de antemano (Content-Length, sin chunked
+# encoding) y http.client los va leyendo en bloques pequeños: cada bloque sale de un mmap del archivo,
+# así que el chunk nunca se copia entero y cada bloque puede pasar por el limitador de ancho de banda.
+import mmap
+import os
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+
+class MappedBody:
+    """Secuencia de tramos (bytes o rangos de un mmap) leída como un archivo de solo lectura
+
+    `on_read(nbytes)` se llama antes de entregar cada bloque (p. ej. BandwidthLimiter.consume).
+    """
+
+    def __init__(self, on_read: Optional[Callable[[int], object]] = None):
+        self.on_read = on_read
+        self._parts: List[Tuple[Union[bytes, mmap.mmap], int, int]] = []  # (datos, inicio, fin)
+        self._handles = []
+        self._part_index = 0
+        self._position = 0
+        self.length = 0
+
+    def _add_bytes(self, data: bytes):
+        self._parts.append((data, 0, len(data)))
+        self.length += len(data)
+
+    def _add_file(self, path: str, offset: int = 0, length: Optional[int] = None):
+        """Añadir un rango del archivo mapeado en memoria (FileNotFoundError si ya se borró)"""
+        handle = open(path, 'rb')
+        self._handles.append(handle)
+        size = os.fstat(handle.fileno()).st_size
+        end = size if length is None else min(size, offset + length)
+        if end <= offset:
+            return  # Rango vacío (mmap no admite archivos vacíos)
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self._handles.append(mapped)
+        self._parts.append((mapped, offset, end))
+        self.length += end - offset
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self):
+        # requests trata como stream los objetos iterables; http.client usa read() igualmente
+        while True:
+            block = self.read(64 * 1024)
+            if not block:
+                return
+            yield block
+
+    def read(self, size: int = -1) -> bytes:
+        """Siguiente bloque del cuerpo (como mucho size bytes; nunca cruza el final de un tramo)"""
+        while self._part_index < len(self._parts):
+            data, start, end = self._parts[self._part_index]
+            position = max(start, self._position)
+            if position >= end:
+                self._part_index += 1
+                self._position = 0
+                continue
+            stop = end if size is None or size < 0 else min(end, position + size)
+            if self.on_read is not None:
+                self.on_read(stop - position)
+            self._position = stop
+            return data[position:stop]
+        return b""
+
+    def close(self):
+        """Cerrar los mapeos y archivos (en Windows no se pueden borrar mientras estén abiertos)"""
+        for handle in reversed(self._handles):
+            try:
+                handle.close()
+            except Exception:
+                pass
+        self._handles = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MultipartStream(MappedBody):
+    """Formulario multipart/form-data con campos de texto y archivos
+
+    `files` es una lista de (campo, nombre de archivo, ruta, content type).
+    """
+
+    def __init__(self, fields: Dict[str, object], files: List[Tuple[str, str, str, str]],
+                 on_read: Optional[Callable[[int], object]] = None):
+        super().__init__(on_read)
+        self.boundary = uuid.uuid4().hex
+        try:
+            for name, value in fields.items():
+                self._add_bytes(self._part_header(name) + str(value).encode() + b"\r\n")
+            for name, filename, path, content_type in files:
+                self._add_bytes(self._part_header(name, filename, content_type))
+                self._add_file(path)
+                self._add_bytes(b"\r\n")
+            self._add_bytes(f"--{self.boundary}--\r\n".encode())
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def _part_header(self, name: str, filename: Optional[str] = None, content_type: Optional[str] = None) -> bytes:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        header = f"--{self.boundary}\r\nContent-Disposition: {disposition}\r\n"
+        if content_type:
+            header += f"Content-Type: {content_type}\r\n"
+        return (header + "\r\n").encode()
+
+
+class FileRangeStream(MappedBody):
+    """Bytes [offset, offset + length) de un archivo (un tramo de un envío reanudable)"""
+
+    def __init__(self, path: str, offset: int, length: int, on_read: Optional[Callable[[int], object]] = None):
+        super().__init__(on_read)
+        try:
+            self._add_file(path, offset, length)
+        except Exception:
+            self.close()
+            raise
@@ -0,0 +1,107 @@
+# Cuota del almacén local de chunks pendientes (modo sin conexión)
+# Mientras el servidor no responde se sigue grabando en disco hasta quota_bytes.
+# Al llenarse se aplica la política configurada:
+# - "refuse_sessions": no se aceptan sesiones nuevas (la sesión en curso termina normalmente)
+# - "lower_bitrate": desde soft_quota_ratio los chunks nuevos se codifican con más CRF
+# - "drop_oldest": se borran los chunks pendientes más antiguos de sesiones ya terminadas
+# Con cualquier política, si tras aplicarla se sigue por encima de la cuota se rechazan sesiones nuevas.
+import os
+import shutil
+import threading
+from typing import Callable, Optional, Tuple
+
+from ..config.settings import SystemConfig, StorageConfig
+from .upload_journal import UploadJournal
+
+POLICY_REFUSE_SESSIONS = "refuse_sessions"
+POLICY_LOWER_BITRATE = "lower_bitrate"
+POLICY_DROP_OLDEST = "drop_oldest"
+
+
+class StorageQuota:
+    """Uso del almacén local según el diario de envíos y política al superar la cuota"""
+
+    def __init__(self, journal: UploadJournal, config: Optional[StorageConfig] = None,
+                 release: Optional[Callable[[str], bool]] = None):
+        self.journal = journal
+        self.config = config or SystemConfig.STORAGE
+        # Quita un chunk de la cola del gestor de envíos antes de borrarlo (False = se está enviando)
+        self.release = release
+        self.evicted_chunks = 0
+        self.evicted_bytes = 0
+        self._lock = threading.Lock()
+
+    def used_bytes(self) -> int:
+        """Bytes de chunks finalizados que aún se pueden enviar (los rechazados por el servidor no cuentan)"""
+        return self.journal.pending_bytes()[1]
+
+    def crf_offset(self) -> int:
+        """CRF extra para los chunks nuevos (solo con la política "lower_bitrate")"""
+        if self.config.quota_policy != POLICY_LOWER_BITRATE:
+            return 0
+        if self.used_bytes() < self.config.quota_bytes * self.config.soft_quota_ratio:
+            return 0
+        return self.config.reduced_crf_offset
+
+    def enforce(self, protected_session_id: Optional[str] = None) -> int:
+        """Aplicar la política "drop_oldest" si se supera la cuota. Retorna cuántos chunks se borraron
+
+        Los chunks de protected_session_id (la sesión en curso) no se borran nunca.
+        """
+        if self.config.quota_policy != POLICY_DROP_OLDEST:
+            return 0
+        with self._lock:
+            used = self.used_bytes()
+            evicted = 0
+            if used <= self.config.quota_bytes:
+                return 0
+            for chunk_id, file_path, file_size, timestamps_path in self.journal.oldest_pending(protected_session_id):
+                if used <= self.config.quota_bytes:
+                    break
+                if self.release is not None and not self.release(chunk_id):
+                    continue  # Un hilo de envío ya lo tiene
+                try:
+                    for path in (file_path, timestamps_path):
+                        if path and os.path.exists(path):
+                            os.remove(path)
+                except OSError as e:
+                    print(f"No se pudo borrar el chunk pendiente {file_path}: {e}")
+                    continue  # Probablemente se está enviando ahora mismo
+                self.journal.forget(chunk_id)
+                used -= file_size
+                evicted += 1
+                self.evicted_chunks += 1
+                self.evicted_bytes += file_size
+            if evicted:
+                print(f"Cuota de almacenamiento superada: {evicted} chunks pendientes antiguos eliminados")
+            return evicted
+
+    def can_start_session(self) -> Tuple[bool, Optional[str]]:
+        """Comprobar si se puede iniciar una sesión nueva. Retorna (permitido, motivo)"""
+        self.enforce()
+        used = self.used_bytes()
+        if used >= self.config.quota_bytes:
+            return False, (f"Almacenamiento local lleno: {used / 1024 ** 2:.0f} MB pendientes de envío "
+                           f"(cuota {self.config.quota_bytes / 1024 ** 2:.0f} MB). Espere a que se envíen al servidor.")
+        return True, None
+
+    def get_status(self) -> dict:
+        """Uso de disco y profundidad del backlog"""
+        backlog_chunks, backlog_bytes = self.journal.pending_bytes()
+        try:
+            disk_free = shutil.disk_usage(SystemConfig.BASE_DIR).free
+        except OSError:
+            disk_free = None
+        return {
+            'quota_bytes': self.config.quota_bytes,
+            'used_bytes': backlog_bytes,
+            'usage_ratio': backlog_bytes / self.config.quota_bytes if self.config.quota_bytes else 0.0,
+            'over_quota': backlog_bytes >= self.config.quota_bytes,
+            'quota_policy': self.config.quota_policy,
+            'reduced_quality': self.crf_offset() > 0,
+            'backlog_chunks': backlog_chunks,
+            'backlog_bytes': backlog_bytes,
+            'evicted_chunks': self.evicted_chunks,
+            'evicted_bytes': self.evicted_bytes,
+            'disk_free_bytes': disk_free
+        }
@@ -0,0 +1,283 @@
+# Diario en disco (SQLite) del estado de envío de cada chunk
+# Estados: written (en disco, sin encolar) -> queued -> uploading -> acked (confirmado por el servidor)
+# o rejected (rechazado definitivamente: no se reenvía ni cuenta como pendiente).
+# Al arrancar se vuelven a encolar los chunks pendientes: entrega "al menos una vez"
+# sin tener que recorrer los directorios de video.
+# También guarda los session_end que esperan a que se confirmen los chunks de su sesión.
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from ..config.settings import SystemConfig
+
+if TYPE_CHECKING:
+    from ..video_processor import VideoChunk
+
+STATE_WRITTEN = "written"
+STATE_QUEUED = "queued"
+STATE_UPLOADING = "uploading"
+STATE_ACKED = "acked"
+STATE_REJECTED = "rejected"
+FINAL_STATES = (STATE_ACKED, STATE_REJECTED)  # Estados en los que el chunk ya no se envía
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    chunk_id TEXT PRIMARY KEY,
+    session_id TEXT,
+    patient_id TEXT,
+    camera_id INTEGER NOT NULL,
+    sequence_number INTEGER NOT NULL,
+    file_path TEXT NOT NULL,
+    duration_seconds REAL NOT NULL,
+    timestamp TEXT NOT NULL,
+    file_size_bytes INTEGER NOT NULL,
+    first_frame_index INTEGER NOT NULL,
+    last_frame_index INTEGER NOT NULL,
+    frame_count INTEGER NOT NULL,
+    timestamps_path TEXT,
+    frames_duplicated INTEGER NOT NULL DEFAULT 0,
+    frames_dropped INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+)
+"""
+
+_SESSION_ENDS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_ends (
+    session_id TEXT NOT NULL,
+    patient_id TEXT NOT NULL,
+    since TEXT NOT NULL,
+    final_chunks INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (session_id, patient_id, since)
+)
+"""
+
+_CHUNK_COLUMNS = ("chunk_id", "session_id", "patient_id", "camera_id", "sequence_number", "file_path",
+                  "duration_seconds", "timestamp", "file_size_bytes", "first_frame_index", "last_frame_index",
+                  "frame_count", "timestamps_path", "frames_duplicated", "frames_dropped")
+
+# Columnas añadidas después de la primera versión del diario (se migran al abrirlo)
+_ADDED_COLUMNS = {
+    "timestamps_path": "TEXT",  # Timestamps por frame
+    "frames_duplicated": "INTEGER NOT NULL DEFAULT 0",  # Ritmo constante por chunk
+    "frames_dropped": "INTEGER NOT NULL DEFAULT 0",
+}
+
+
+class UploadJournal:
+    """Estado de envío de los chunks, persistido en SQLite (modo WAL)
+
+    Cada cambio de estado es una transacción corta: si el proceso muere, el diario
+    refleja el último estado confirmado de cada chunk.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._connection: Optional[sqlite3.Connection] = None  # Se abre en el primer uso
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            connection = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")  # Con WAL sigue siendo consistente ante caídas
+            connection.execute(_SCHEMA)
+            connection.execute(_SESSION_ENDS_SCHEMA)
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(chunks)")}
+            for name, definition in _ADDED_COLUMNS.items():
+                if name not in columns:
+                    connection.execute(f"ALTER TABLE chunks ADD COLUMN {name} {definition}")
+            self._connection = connection
+        return self._connection
+
+    def record(self, chunk: 'VideoChunk', state: str = STATE_WRITTEN):
+        """Registrar un chunk (o actualizar su estado si ya estaba registrado)"""
+        values = (chunk.chunk_id, chunk.session_id, chunk.patient_id, chunk.camera_id, chunk.sequence_number,
+                  chunk.file_path, chunk.duration_seconds, chunk.timestamp.isoformat(), chunk.file_size_bytes,
+                  chunk.first_frame_index, chunk.last_frame_index, chunk.frame_count, chunk.timestamps_path,
+                  chunk.frames_duplicated, chunk.frames_dropped)
+        with self._lock:
+            self.connection.execute(
+                f"INSERT INTO chunks ({', '.join(_CHUNK_COLUMNS)}, state, updated_at) "
+                f"VALUES ({', '.join('?' * len(_CHUNK_COLUMNS))}, ?, ?) "
+                "ON CONFLICT(chunk_id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+                values + (state, time.time())
+            )
+
+    def set_state(self, chunk_id: str, state: str):
+        """Cambiar el estado de un chunk registrado"""
+        with self._lock:
+            if state == STATE_UPLOADING:
+                self.connection.execute(
+                    "UPDATE chunks SET state = ?, attempts = attempts + 1, updated_at = ? WHERE chunk_id = ?",
+                    (state, time.time(), chunk_id)
+                )
+            else:
+                self.connection.execute(
+                    "UPDATE chunks SET state = ?, updated_at = ? WHERE chunk_id = ?",
+                    (state, time.time(), chunk_id)
+                )
+
+    def pending_chunks(self) -> List['VideoChunk']:
+        """Chunks pendientes de envío (ni confirmados ni rechazados), en orden de registro"""
+        from ..video_processor.video_processor import VideoChunk
+
+        with self._lock:
+            rows = self.connection.execute(
+                f"SELECT {', '.join(_CHUNK_COLUMNS)} FROM chunks WHERE state NOT IN (?, ?) "
+                "ORDER BY rowid",
+                FINAL_STATES
+            ).fetchall()
+        chunks = []
+        for row in rows:
+            values = dict(zip(_CHUNK_COLUMNS, row))
+            values['timestamp'] = datetime.fromisoformat(values['timestamp'])
+            chunks.append(VideoChunk(**values))
+        return chunks
+
+    def pending_paths(self) -> Dict[str, Tuple[str, int]]:
+        """Ruta de archivo -> (chunk_id, camera_id) de los chunks pendientes de envío"""
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT file_path, chunk_id, camera_id FROM chunks WHERE state NOT IN (?, ?)", FINAL_STATES
+            ).fetchall()
+        return {os.path.abspath(path): (chunk_id, camera_id) for path, chunk_id, camera_id in rows}
+
+    def pending_bytes(self) -> Tuple[int, int]:
+        """(chunks, bytes) pendientes de envío"""
+        with self._lock:
+            count, total = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(file_size_bytes), 0) FROM chunks WHERE state NOT IN (?, ?)",
+                FINAL_STATES
+            ).fetchone()
+        return count, total
+
+    def oldest_pending(self, exclude_session_id: Optional[str] = None) -> List[Tuple[str, str, int, Optional[str]]]:
+        """(chunk_id, file_path, file_size_bytes, timestamps_path) pendientes, del más antiguo al más reciente
+
+        Solo los que esperan en disco o en la cola (written, queued): nunca los que se están enviando.
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT chunk_id, file_path, file_size_bytes, timestamps_path FROM chunks "
+                "WHERE state IN (?, ?) AND (session_id IS NOT ? OR ? IS NULL) ORDER BY rowid",
+                (STATE_WRITTEN, STATE_QUEUED, exclude_session_id, exclude_session_id)
+            ).fetchall()
+        return rows
+
+    def relocate(self, chunk_id: str, file_path: str, camera_id: int,
+                 pending_dir: str) -> Tuple[str, Optional[str]]:
+        """Mover los archivos de un chunk pendiente fuera de los directorios de grabación
+
+        Los números de secuencia (y a veces el session_id) se repiten entre sesiones: sin moverlos,
+        la siguiente sesión sobrescribiría los archivos. Retorna las nuevas rutas (video, timestamps).
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT timestamps_path FROM chunks WHERE chunk_id = ?", (chunk_id,)
+            ).fetchone()
+        timestamps_path = row[0] if row else None
+        target_dir = os.path.join(pending_dir, f"camera{camera_id}")
+        os.makedirs(target_dir, exist_ok=True)
+        target_path = os.path.join(target_dir, f"{chunk_id}.mp4")
+        shutil.move(file_path, target_path)
+        if timestamps_path and os.path.exists(timestamps_path):
+            target_timestamps_path = os.path.join(target_dir, chunk_id + os.path.splitext(timestamps_path)[1])
+            shutil.move(timestamps_path, target_timestamps_path)
+            timestamps_path = target_timestamps_path
+        with self._lock:
+            self.connection.execute(
+                "UPDATE chunks SET file_path = ?, timestamps_path = ?, updated_at = ? WHERE chunk_id = ?",
+                (target_path, timestamps_path, time.time(), chunk_id)
+            )
+        return target_path, timestamps_path
+
+    def forget(self, chunk_id: str):
+        """Eliminar un chunk del diario (archivo perdido o sesión cancelada)"""
+        with self._lock:
+            self.connection.execute("DELETE FROM chunks WHERE chunk_id = ?", (chunk_id,))
+
+    def forget_session(self, session_id: str) -> int:
+        """Eliminar del diario los chunks (y el session_end pendiente) de una sesión cancelada
+
+        Retorna cuántos chunks se eliminaron.
+        """
+        with self._lock:
+            cursor = self.connection.execute("DELETE FROM chunks WHERE session_id = ?", (session_id,))
+            self.connection.execute("DELETE FROM session_ends WHERE session_id = ?", (session_id,))
+        return cursor.rowcount
+
+    def compact(self) -> int:
+        """Eliminar los chunks ya confirmados para que el diario no crezca sin límite
+
+        Se conservan los de sesiones con session_end pendiente: cuentan en el aviso al servidor.
+        """
+        with self._lock:
+            cursor = self.connection.execute(
+                "DELETE FROM chunks WHERE state = ? AND NOT EXISTS "
+                "(SELECT 1 FROM session_ends WHERE session_ends.session_id = chunks.session_id)",
+                (STATE_ACKED,)
+            )
+            self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return cursor.rowcount
+
+    def session_states(self, session_id: str, patient_id: str, since: Optional[datetime] = None) -> Dict[str, str]:
+        """chunk_id -> estado de los chunks de una sesión (desde since: el session_id se puede repetir)"""
+        since_text = since.isoformat() if since else ""
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT chunk_id, state FROM chunks WHERE session_id = ? AND patient_id = ? AND timestamp >= ?",
+                (session_id, patient_id, since_text)
+            ).fetchall()
+        return dict(rows)
+
+    def record_session_end(self, session_id: str, patient_id: str, since: Optional[datetime], final_chunks: int):
+        """Guardar un session_end que espera a que el servidor confirme (o rechace) los chunks de la sesión"""
+        since_text = since.isoformat() if since else ""
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO session_ends (session_id, patient_id, since, final_chunks, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (session_id, patient_id, since_text, final_chunks, time.time())
+            )
+
+    def forget_session_end(self, session_id: str, patient_id: str, since: Optional[datetime]):
+        """Eliminar un session_end ya enviado"""
+        since_text = since.isoformat() if since else ""
+        with self._lock:
+            self.connection.execute(
+                "DELETE FROM session_ends WHERE session_id = ? AND patient_id = ? AND since = ?",
+                (session_id, patient_id, since_text)
+            )
+
+    def pending_session_ends(self) -> List[Tuple[str, str, Optional[datetime], int]]:
+        """(session_id, patient_id, since, final_chunks) de los session_end sin enviar, del más antiguo al más reciente"""
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT session_id, patient_id, since, final_chunks FROM session_ends ORDER BY created_at"
+            ).fetchall()
+        return [(session_id, patient_id, datetime.fromisoformat(since) if since else None, final_chunks)
+                for session_id, patient_id, since, final_chunks in rows]
+
+    def count_by_state(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self.connection.execute("SELECT state, COUNT(*) FROM chunks GROUP BY state").fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+# Singleton del diario de envíos
+upload_journal = UploadJournal(SystemConfig.UPLOAD_JOURNAL_PATH)
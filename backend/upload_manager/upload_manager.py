@@ -0,0 +1,951 @@
+# Envío de chunks al servidor de procesamiento
+# Cola acotada + pool fijo de hilos, cada uno con su requests.Session (conexión keep-alive),
+# reintentos con espera exponencial y orden de envío por (secuencia, cámara).
+# Si el servidor no responde se pasa a modo sin conexión: los chunks se acumulan en disco
+# (con la cuota de StorageQuota) y se envían a ritmo controlado cuando el servidor vuelve.
+# El cuerpo de cada petición se lee por bloques desde el archivo mapeado en memoria (MultipartStream)
+# y cada bloque pasa por un limitador de ancho de banda común a todos los hilos (BandwidthLimiter).
+# Si el servidor lo admite, el envío es reanudable: tras un corte se negocia el offset y se sigue
+# desde el último byte recibido; si no, se envía el archivo entero.
+# En modo por lotes (ServerConfig.batch_uploads) los chunks de todas las cámaras con el mismo
+# sequence_number salen en una sola petición; si alguno se retrasa, se envían por separado.
+import hashlib
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..config.settings import SystemConfig, ServerConfig, UploadConfig, StorageConfig
+from .upload_journal import (UploadJournal, upload_journal, STATE_WRITTEN, STATE_QUEUED,
+                             STATE_UPLOADING, STATE_ACKED, STATE_REJECTED)
+from .storage_quota import StorageQuota
+from .bandwidth_limiter import BandwidthLimiter
+from .multipart_stream import MultipartStream, FileRangeStream
+from ..metrics import metrics, UPLOAD_BUCKETS, THROUGHPUT_BUCKETS
+
+if TYPE_CHECKING:
+    from ..video_processor import VideoChunk
+
+# Códigos HTTP que indican un problema temporal del servidor: se reintenta el envío
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Respuestas de un servidor sin envío reanudable o por lotes: se envía cada archivo entero por upload_endpoint
+UNSUPPORTED_ENDPOINT_STATUS_CODES = {404, 405, 501}
+MAX_OFFSET_CORRECTIONS = 3  # Respuestas 409 (offset distinto al del servidor) toleradas por intento
+
+RECENT_UPLOADS = 50  # Informes de envío por chunk que se conservan para get_stats()
+
+UPLOAD_REQUEST_SECONDS = metrics.histogram("upload_request_seconds", "Duración de la petición que confirmó un chunk",
+                                           UPLOAD_BUCKETS)
+UPLOAD_THROUGHPUT = metrics.histogram("upload_throughput_bytes_per_second",
+                                      "Bytes por segundo de cada envío confirmado", THROUGHPUT_BUCKETS)
+UPLOAD_QUEUE_WAIT_SECONDS = metrics.histogram("upload_queue_wait_seconds",
+                                              "Espera de un chunk en la cola hasta que un hilo empieza a enviarlo",
+                                              UPLOAD_BUCKETS)
+UPLOAD_THROTTLE_SECONDS = metrics.histogram("upload_throttle_seconds",
+                                            "Espera por el limitador de ancho de banda en cada envío confirmado",
+                                            UPLOAD_BUCKETS)
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 de un archivo, leído por bloques"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 ** 2), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class UploadManager:
+    """Cola de envío de chunks con un pool fijo de hilos
+
+    Se conecta al procesador de video con `video_processor.add_upload_callback(upload_manager.enqueue)`.
+    Los chunks salen en orden de (sequence_number, camera_id): todas las cámaras del chunk n
+    antes que las del chunk n + 1. Cada cambio de estado se guarda en el UploadJournal.
+    Un elemento de la cola es un chunk o, en modo por lotes, la lista de chunks de una secuencia.
+    """
+
+    def __init__(self, config: Optional[UploadConfig] = None, server: Optional[ServerConfig] = None,
+                 journal: Optional[UploadJournal] = None, storage_config: Optional[StorageConfig] = None):
+        self.config = config or SystemConfig.UPLOAD
+        self.server = server or SystemConfig.SERVER
+        self.journal = journal or upload_journal
+        self.storage = StorageQuota(self.journal, storage_config, self._release_for_eviction)
+        self.tracked_chunks: Dict[str, 'VideoChunk'] = {}  # chunk_id -> chunk en cola o en envío
+        self.rejected_chunks: Set[str] = set()  # Reintentos agotados: no se reintentan hasta el próximo arranque
+        self.active_session_id: Optional[str] = None  # Sus chunks no se borran al superar la cuota
+        self.draining = False  # Vaciando el backlog tras una desconexión (envío a ritmo limitado)
+        self.resumable_supported: Optional[bool] = None  # None = aún no se sabe si el servidor lo admite
+        self.batch_supported: Optional[bool] = None
+        self.batch_cameras: Set[int] = set()  # Cámaras de la sesión activa: un lote está completo con un chunk de cada una
+        self._batches: Dict[Tuple[str, int], Dict[int, 'VideoChunk']] = {}  # (sesión, secuencia) -> chunks que esperan al resto
+        self._batch_timers: Dict[Tuple[str, int], threading.Timer] = {}
+        self._late_batches: Set[Tuple[str, int]] = set()  # Lotes ya enviados por separado: sus rezagados no esperan
+        self.monitor_thread: Optional[threading.Thread] = None
+        self._online = threading.Event()  # Sin marcar = modo sin conexión
+        self._online.set()
+        self.upload_queue: queue.PriorityQueue = queue.PriorityQueue(maxsize=self.config.queue_size)
+        self.workers: List[threading.Thread] = []
+        self.error_callbacks: List[Callable[['VideoChunk', Optional[requests.Response]], None]] = []
+        self.success_callbacks: List[Callable[['VideoChunk'], None]] = []
+        self._order = itertools.count()  # Desempate FIFO entre chunks con la misma clave
+        self._stop_event = threading.Event()
+        # Límite de ancho de banda común a todos los hilos (más bajo mientras se vacía el backlog)
+        self.limiter = BandwidthLimiter(self._bandwidth_rate, self.config.bandwidth_burst_bytes, self._stop_event)
+        self._enqueued_at: Dict[str, float] = {}  # chunk_id -> instante en que entró en la cola
+        self.recent_uploads = deque(maxlen=RECENT_UPLOADS)  # Informe de cada envío confirmado, del más antiguo al último
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._idle = threading.Condition(self._stats_lock)
+        self.stats = {
+            'uploaded': 0,
+            'failed': 0,
+            'retries': 0,
+            'bytes_uploaded': 0,
+            'bytes_resumed': 0,  # Bytes que no se reenviaron gracias al envío reanudable
+            'batches_uploaded': 0,
+            'batch_fallbacks': 0,  # Lotes enviados chunk a chunk (cámara retrasada o lote no aceptado)
+            'last_error': None
+        }
+
+    @property
+    def upload_url(self) -> str:
+        return f"{self.server.base_url}{self.server.upload_endpoint}"
+
+    @property
+    def batch_url(self) -> str:
+        return f"{self.server.base_url}{self.server.batch_upload_endpoint}"
+
+    @property
+    def resumable_url(self) -> str:
+        return f"{self.server.base_url}{self.server.resumable_upload_endpoint}"
+
+    @property
+    def server_online(self) -> bool:
+        return self._online.is_set()
+
+    def start(self):
+        """Lanzar los hilos de envío (idempotente)"""
+        if any(worker.is_alive() for worker in self.workers):
+            return
+        self._stop_event.clear()
+        self.workers = [
+            threading.Thread(target=self._worker_loop, name=f"envio-chunks-{i}", daemon=True)
+            for i in range(self.config.workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+        self.monitor_thread = threading.Thread(target=self._connectivity_loop, name="envio-chunks-monitor", daemon=True)
+        self.monitor_thread.start()
+        print(f"Gestor de envíos iniciado: {self.config.workers} hilos, cola de {self.config.queue_size} chunks")
+
+    def stop(self, timeout: float = 30.0):
+        """Enviar lo pendiente y detener los hilos"""
+        # Los centinelas tienen la prioridad más baja: los hilos terminan después de vaciar la cola
+        for _ in self.workers:
+            self.upload_queue.put((float('inf'), 0, next(self._order), None))
+        deadline = time.time() + timeout
+        for worker in self.workers:
+            worker.join(timeout=max(0.0, deadline - time.time()))
+        self._stop_event.set()  # Interrumpir las esperas entre reintentos y de conexión que queden
+        if self.monitor_thread is not None:
+            self.monitor_thread.join(timeout=1)
+        self.workers = []
+        self.monitor_thread = None
+
+    def enqueue(self, chunk: 'VideoChunk') -> bool:
+        """Encolar un chunk para su envío (callback de VideoProcessor)
+
+        Si la cola está llena espera hasta enqueue_timeout_seconds; así el procesador de video
+        se frena en lugar de acumular envíos sin límite. Sin conexión no espera: el chunk
+        queda en disco y se encola cuando el servidor vuelva.
+        """
+        self.start()
+        with self._stats_lock:
+            self.tracked_chunks[chunk.chunk_id] = chunk  # Antes del diario: el monitor no debe encolarlo dos veces
+        self.journal.record(chunk, STATE_WRITTEN)
+        self.storage.enforce(self.active_session_id)
+        if self._collect_batch(chunk):
+            return True
+        timeout = self.config.enqueue_timeout_seconds if self.server_online else 0
+        return self._put(chunk, timeout)
+
+    def _collect_batch(self, chunk: 'VideoChunk') -> bool:
+        """Modo por lotes: guardar el chunk hasta tener el de cada cámara de su secuencia
+
+        El primer chunk de cada secuencia arranca una espera de batch_wait_seconds; al vencer, los
+        que haya se envían por separado. Retorna False si el chunk no va en un lote.
+        """
+        if (not self.server.batch_uploads or self.batch_supported is False or not self.server_online
+                or chunk.session_id != self.active_session_id or len(self.batch_cameras) < 2
+                or chunk.camera_id not in self.batch_cameras):
+            return False
+        key = (chunk.session_id, chunk.sequence_number)
+        with self._stats_lock:
+            batch = self._batches.setdefault(key, {})
+            if key in self._late_batches or chunk.camera_id in batch:
+                if not batch:
+                    del self._batches[key]
+                return False
+            batch[chunk.camera_id] = chunk
+            self._enqueued_at[chunk.chunk_id] = time.perf_counter()
+            if set(batch) < self.batch_cameras:
+                if len(batch) == 1:
+                    timer = threading.Timer(self.server.batch_wait_seconds, self._flush_batch, args=(key,))
+                    timer.daemon = True
+                    self._batch_timers[key] = timer
+                    timer.start()
+                return True
+            del self._batches[key]
+            timer = self._batch_timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        chunks = [batch[camera_id] for camera_id in sorted(batch)]
+        timeout = self.config.enqueue_timeout_seconds if self.server_online else 0
+        if self._put_batch(chunks, timeout):
+            return True
+        for other in chunks:
+            if other is not chunk:
+                self._put(other, 0)  # El monitor encola los que no quepan
+        return False
+
+    def _flush_batch(self, key: Tuple[str, int]):
+        """Vence la espera de un lote incompleto: sus chunks se envían por separado"""
+        with self._stats_lock:
+            batch = self._batches.pop(key, None)
+            self._batch_timers.pop(key, None)
+            if batch is None:
+                return
+            self._late_batches.add(key)
+            self.stats['batch_fallbacks'] += 1
+            missing = sorted(self.batch_cameras - set(batch))
+        print(f"Chunk {key[1]}: sin el de las cámaras {missing} tras {self.server.batch_wait_seconds:.1f}s, "
+              f"se envían por separado")
+        for camera_id in sorted(batch):
+            self._put(batch[camera_id], self.config.enqueue_timeout_seconds if self.server_online else 0)
+
+    def _put_batch(self, chunks: List['VideoChunk'], timeout: Optional[float]) -> bool:
+        """Meter en la cola los chunks de una secuencia como un solo elemento"""
+        try:
+            self.upload_queue.put(
+                (chunks[0].sequence_number, chunks[0].camera_id, next(self._order), chunks),
+                timeout=timeout
+            )
+        except queue.Full:
+            return False
+        for chunk in chunks:
+            self.journal.set_state(chunk.chunk_id, STATE_QUEUED)
+        return True
+
+    def _put(self, chunk: 'VideoChunk', timeout: Optional[float]) -> bool:
+        """Meter en la cola un chunk ya registrado en el diario"""
+        with self._stats_lock:
+            self.tracked_chunks[chunk.chunk_id] = chunk
+            self._enqueued_at.setdefault(chunk.chunk_id, time.perf_counter())
+        try:
+            self.upload_queue.put(
+                (chunk.sequence_number, chunk.camera_id, next(self._order), chunk),
+                timeout=timeout
+            )
+            self.journal.set_state(chunk.chunk_id, STATE_QUEUED)
+            return True
+        except queue.Full:
+            # Queda como "written" en el diario: el monitor lo encolará cuando haya hueco
+            with self._stats_lock:
+                self.tracked_chunks.pop(chunk.chunk_id, None)
+                self._enqueued_at.pop(chunk.chunk_id, None)
+            return False
+
+    def _requeue_pending(self, timeout: Optional[float]) -> int:
+        """Encolar los chunks del diario sin confirmar que no estén ya en cola o en envío
+
+        Se detiene en cuanto la cola se llena. Retorna cuántos chunks se encolaron.
+        """
+        requeued = 0
+        for chunk in self.journal.pending_chunks():
+            with self._stats_lock:
+                if chunk.chunk_id in self.tracked_chunks or chunk.chunk_id in self.rejected_chunks:
+                    continue
+                self.tracked_chunks[chunk.chunk_id] = chunk
+            if not os.path.exists(chunk.file_path):
+                print(f"Chunk pendiente {chunk.chunk_id} sin archivo ({chunk.file_path}): se elimina del diario")
+                self.journal.forget(chunk.chunk_id)
+                with self._stats_lock:
+                    self.tracked_chunks.pop(chunk.chunk_id, None)
+                continue
+            if not self._put(chunk, timeout):
+                break
+            requeued += 1
+        return requeued
+
+    def recover_pending(self) -> int:
+        """Volver a encolar los chunks que el diario tiene sin confirmar (p. ej. tras una caída)
+
+        Se llama al arrancar. Los archivos que siguen en los directorios de grabación se mueven
+        antes a PENDING_VIDEO_DIR. Retorna cuántos chunks se encolaron.
+        """
+        self.start()
+        removed = self.journal.compact()
+        if removed:
+            print(f"Diario de envíos compactado: {removed} chunks confirmados eliminados")
+        self.preserve_pending_files(SystemConfig.TEMP_VIDEO_DIR)
+        self.rejected_chunks.clear()
+        backlog_chunks, backlog_bytes = self.journal.pending_bytes()
+        if backlog_chunks:
+            print(f"Reanudando el envío de {backlog_chunks} chunks pendientes de sesiones anteriores "
+                  f"({backlog_bytes / 1024 ** 2:.1f} MB)")
+            self.draining = True
+        # Lo que no quepa ahora en la cola lo encola el monitor a medida que se vacía
+        return self._requeue_pending(timeout=1.0)
+
+    def preserve_pending_files(self, directory: str) -> int:
+        """Mover a PENDING_VIDEO_DIR los chunks sin confirmar que haya en `directory`
+
+        Se llama antes de borrar los directorios de grabación: solo se borran los chunks confirmados.
+        Retorna cuántos archivos se movieron.
+        """
+        directory = os.path.abspath(directory) + os.sep
+        moved = 0
+        for file_path, (chunk_id, camera_id) in self.journal.pending_paths().items():
+            if not file_path.startswith(directory) or not os.path.exists(file_path):
+                continue
+            with self._stats_lock:
+                chunk = self.tracked_chunks.get(chunk_id)
+            try:
+                new_path, timestamps_path = self.journal.relocate(chunk_id, file_path, camera_id,
+                                                                  SystemConfig.PENDING_VIDEO_DIR)
+                if chunk is not None:
+                    # El hilo de envío abre los archivos en la ruta nueva
+                    chunk.file_path = new_path
+                    chunk.timestamps_path = timestamps_path
+                moved += 1
+            except OSError as e:
+                print(f"No se pudo mover el chunk pendiente {file_path}: {e}")
+        if moved:
+            print(f"{moved} chunks sin confirmar movidos a {SystemConfig.PENDING_VIDEO_DIR}")
+        return moved
+
+    def discard_session(self, session_id: str) -> int:
+        """Quitar de la cola los chunks pendientes de una sesión cancelada. Retorna cuántos se quitaron"""
+        kept = []
+        discarded = 0
+        with self._stats_lock:
+            # Lotes que aún esperan a alguna cámara
+            for key in [key for key in self._batches if key[0] == session_id]:
+                timer = self._batch_timers.pop(key, None)
+                if timer is not None:
+                    timer.cancel()
+                for chunk in self._batches.pop(key).values():
+                    discarded += 1
+                    self.tracked_chunks.pop(chunk.chunk_id, None)
+                    self._enqueued_at.pop(chunk.chunk_id, None)
+        while True:
+            try:
+                item = self.upload_queue.get_nowait()
+            except queue.Empty:
+                break
+            chunks = item[3] if isinstance(item[3], list) else [item[3]]
+            if item[3] is not None and chunks[0].session_id == session_id:
+                discarded += len(chunks)
+                with self._stats_lock:
+                    for chunk in chunks:
+                        self.tracked_chunks.pop(chunk.chunk_id, None)
+                        self._enqueued_at.pop(chunk.chunk_id, None)
+            else:
+                kept.append(item)
+            self.upload_queue.task_done()
+        for item in kept:
+            self.upload_queue.put_nowait(item)
+        # La sesión cancelada no se reenvía en el próximo arranque
+        self.journal.forget_session(session_id)
+        if discarded:
+            print(f"Descartados {discarded} chunks pendientes de la sesión {session_id}")
+        return discarded
+
+    def _release_for_eviction(self, chunk_id: str) -> bool:
+        """Quitar de los lotes en espera y de la cola un chunk que la cuota va a borrar
+
+        Retorna False si un hilo de envío ya lo tiene (enviándolo o esperando conexión): no se borra.
+        """
+        with self._stats_lock:
+            if chunk_id not in self.tracked_chunks:
+                return True
+            for key, batch in list(self._batches.items()):
+                camera_id = next((camera_id for camera_id, chunk in batch.items() if chunk.chunk_id == chunk_id), None)
+                if camera_id is None:
+                    continue
+                del batch[camera_id]
+                if not batch:
+                    del self._batches[key]
+                    timer = self._batch_timers.pop(key, None)
+                    if timer is not None:
+                        timer.cancel()
+                self.tracked_chunks.pop(chunk_id, None)
+                self._enqueued_at.pop(chunk_id, None)
+                return True
+        kept = []
+        found = False
+        while True:
+            try:
+                item = self.upload_queue.get_nowait()
+            except queue.Empty:
+                break
+            chunks = item[3] if isinstance(item[3], list) else [item[3]]
+            if item[3] is not None and any(chunk.chunk_id == chunk_id for chunk in chunks):
+                found = True
+                rest = [chunk for chunk in chunks if chunk.chunk_id != chunk_id]
+                if rest:
+                    kept.append(item[:3] + (rest,))
+            else:
+                kept.append(item)
+        for item in kept:
+            self.upload_queue.put(item)
+        for _ in range(len(kept) + found):
+            self.upload_queue.task_done()  # Después de volver a meterlos: la cola nunca parece vacía
+        with self._stats_lock:
+            if found:
+                self.tracked_chunks.pop(chunk_id, None)
+                self._enqueued_at.pop(chunk_id, None)
+                return True
+            return chunk_id not in self.tracked_chunks
+
+    def wait_until_idle(self, timeout: float) -> bool:
+        """Esperar a que no queden chunks en cola, en envío ni esperando a completar un lote
+
+        Retorna False si vence el timeout o si no hay conexión con el servidor.
+        """
+        deadline = time.time() + timeout
+        with self._idle:
+            while self.upload_queue.unfinished_tasks > 0 or self._in_flight > 0 or self._batches:
+                if not self.server_online:
+                    return False
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(timeout=min(remaining, 0.1))
+        return True
+
+    def session_progress(self, session_id: str, patient_id: str, since: Optional[datetime] = None) -> Dict[str, int]:
+        """Chunks de una sesión confirmados, rechazados y pendientes de confirmar (según el diario)
+
+        Cuentan como rechazados los que el servidor rechazó y los que agotaron los reintentos.
+        """
+        states = self.journal.session_states(session_id, patient_id, since)
+        with self._stats_lock:
+            failed = sum(1 for chunk_id, state in states.items()
+                         if state == STATE_REJECTED or (state != STATE_ACKED and chunk_id in self.rejected_chunks))
+        acked = sum(1 for state in states.values() if state == STATE_ACKED)
+        return {'total': len(states), 'acked': acked, 'failed': failed, 'pending': len(states) - acked - failed}
+
+    def remember_session_end(self, session_id: str, patient_id: str, since: Optional[datetime], final_chunks: int):
+        """Guardar en el diario un session_end que espera confirmaciones: se envía aunque el cliente se reinicie"""
+        self.journal.record_session_end(session_id, patient_id, since, final_chunks)
+
+    def forget_session_end(self, session_id: str, patient_id: str, since: Optional[datetime]):
+        self.journal.forget_session_end(session_id, patient_id, since)
+
+    def pending_session_ends(self) -> List[Tuple[str, str, Optional[datetime], int]]:
+        """(session_id, patient_id, since, final_chunks) de los session_end que quedaron sin enviar"""
+        return self.journal.pending_session_ends()
+
+    def add_error_callback(self, callback: Callable[['VideoChunk', Optional[requests.Response]], None]):
+        """Callback para chunks que el servidor rechaza o que agotan los reintentos"""
+        self.error_callbacks.append(callback)
+
+    def add_success_callback(self, callback: Callable[['VideoChunk'], None]):
+        """Callback para chunks confirmados por el servidor"""
+        self.success_callbacks.append(callback)
+
+    def get_stats(self) -> dict:
+        """Estado de la cola y contadores de envío"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = self._in_flight
+            stats['recent_uploads'] = list(self.recent_uploads)
+        stats['bandwidth_limit_bytes_per_second'] = self._bandwidth_rate()
+        stats['throttled_seconds'] = round(self.limiter.throttled_seconds, 3)
+        stats['queued'] = self.upload_queue.qsize()
+        stats['journal'] = self.journal.count_by_state()
+        stats['workers'] = sum(1 for worker in self.workers if worker.is_alive())
+        stats['server_online'] = self.server_online
+        stats['draining'] = self.draining
+        stats['resumable_supported'] = self.resumable_supported
+        stats['batch_supported'] = self.batch_supported
+        return stats
+
+    def get_upload_report(self, chunk_id: str) -> Optional[dict]:
+        """Informe del envío confirmado de un chunk (si sigue entre los RECENT_UPLOADS últimos)"""
+        with self._stats_lock:
+            return next((report for report in reversed(self.recent_uploads) if report['chunk_id'] == chunk_id), None)
+
+    def set_active_session(self, session_id: Optional[str], camera_ids: Optional[List[int]] = None):
+        """Sesión en grabación: sus chunks nunca se descartan por la cuota
+
+        camera_ids son las cámaras que graban: en modo por lotes, cada lote espera un chunk de cada una.
+        """
+        with self._stats_lock:
+            self.active_session_id = session_id
+            self.batch_cameras = set(camera_ids or [])
+            self._late_batches.clear()
+
+    def get_storage_status(self) -> dict:
+        """Uso del almacén local, backlog y estado de la conexión con el servidor"""
+        status = self.storage.get_status()
+        status['server_online'] = self.server_online
+        status['draining'] = self.draining
+        status['queued'] = self.upload_queue.qsize()
+        return status
+
+    def _connectivity_loop(self):
+        """Sondear el servidor mientras no responde y encolar el backlog cuando vuelve"""
+        session = requests.Session()
+        interval = self.storage.config.health_check_interval_seconds
+        try:
+            while not self._stop_event.wait(interval):
+                if not self.server_online:
+                    if not self._probe_server(session):
+                        continue
+                    backlog_chunks, backlog_bytes = self.journal.pending_bytes()
+                    print(f"Servidor disponible de nuevo: vaciando {backlog_chunks} chunks pendientes "
+                          f"({backlog_bytes / 1024 ** 2:.1f} MB)")
+                    self.draining = True
+                    self.resumable_supported = None  # Puede ser otro servidor (o una versión nueva)
+                    self.batch_supported = None
+                    self._online.set()
+                # Chunks que no cupieron en la cola (o que se quedaron sin conexión)
+                requeued = self._requeue_pending(timeout=0)
+                self.storage.enforce(self.active_session_id)
+                if self.draining and requeued == 0 and self.upload_queue.qsize() == 0:
+                    print("Backlog de chunks pendientes vaciado")
+                    self.draining = False
+        except Exception as e:
+            print(f"Error en el monitor de conexión de envíos: {e}")
+        finally:
+            session.close()
+
+    def _probe_server(self, session: requests.Session) -> bool:
+        """Cualquier respuesta HTTP indica que el servidor vuelve a estar accesible"""
+        try:
+            session.get(self.server.base_url, timeout=5)
+            return True
+        except requests.RequestException:
+            return False
+
+    def _set_offline(self, error: str):
+        if self.server_online:
+            print(f"Servidor de procesamiento no disponible ({error}): modo sin conexión, "
+                  f"los chunks se guardan en disco")
+        self._online.clear()
+
+    def _wait_online(self) -> bool:
+        """Bloquear el hilo de envío mientras no haya conexión. Retorna False si se detiene el gestor"""
+        while not self._online.wait(timeout=0.5):
+            if self._stop_event.is_set():
+                return False
+        return True
+
+    def _bandwidth_rate(self) -> float:
+        """Bytes/s permitidos ahora: el límite de UploadConfig y, mientras se vacía el backlog, el de vaciado"""
+        limits = [self.config.max_bandwidth_bytes_per_second]
+        if self.draining:
+            limits.append(self.storage.config.drain_rate_bytes_per_second)
+        limits = [limit for limit in limits if limit > 0]
+        return min(limits) if limits else 0
+
+    def _worker_loop(self):
+        """Bucle de un hilo de envío: una sesión HTTP reutilizada para todos sus chunks"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        try:
+            while True:
+                _, _, _, item = self.upload_queue.get()
+                if item is None:
+                    self.upload_queue.task_done()
+                    break
+                chunks = item if isinstance(item, list) else [item]
+                now = time.perf_counter()
+                with self._stats_lock:
+                    self._in_flight += 1
+                    queue_waits = {chunk.chunk_id: now - self._enqueued_at.pop(chunk.chunk_id, now) for chunk in chunks}
+                self.upload_queue.task_done()
+                requeued: Set[str] = set()
+                try:
+                    if isinstance(item, list):
+                        requeued = self._upload_batch(session, item, queue_waits)
+                    elif self._upload_with_retries(session, item, queue_waits[item.chunk_id]):
+                        requeued = {item.chunk_id}
+                except Exception as e:
+                    print(f"Error enviando chunk {chunks[0].chunk_id}: {e}")
+                finally:
+                    with self._idle:
+                        for chunk in chunks:
+                            if chunk.chunk_id not in requeued:
+                                self.tracked_chunks.pop(chunk.chunk_id, None)
+                        self._in_flight -= 1
+                        self._idle.notify_all()
+        finally:
+            session.close()
+
+    def _upload_with_retries(self, session: requests.Session, chunk: 'VideoChunk', queue_wait: float = 0.0) -> bool:
+        """Enviar un chunk, reintentando con espera exponencial ante errores temporales
+
+        Si el servidor no es accesible el chunk vuelve a la cola (sin consumir reintentos)
+        y se envía cuando haya conexión. Retorna True si el chunk se volvió a encolar.
+        """
+        if not self._wait_online():
+            return False  # Gestor detenido: queda "queued" en el diario y se reanuda al arrancar
+        response = None
+        rejected = False  # Respuesta definitiva del servidor (no se reenvía nunca)
+        for attempt in range(self.config.max_retries + 1):
+            if attempt > 0:
+                delay = min(self.config.retry_max_delay_seconds,
+                            self.config.retry_base_delay_seconds * (2 ** (attempt - 1)))
+                print(f"Reintentando chunk {chunk.sequence_number} de cámara {chunk.camera_id} "
+                      f"en {delay:.1f}s (intento {attempt + 1})")
+                with self._stats_lock:
+                    self.stats['retries'] += 1
+                if self._stop_event.wait(delay):
+                    break
+
+            response = None
+            self.journal.set_state(chunk.chunk_id, STATE_UPLOADING)
+            started = time.perf_counter()
+            try:
+                response, body_bytes, throttled = self._send_chunk(session, chunk)
+            except FileNotFoundError:
+                # La sesión se canceló y sus archivos ya se borraron
+                print(f"Chunk {chunk.chunk_id} descartado: el archivo ya no existe")
+                self.journal.forget(chunk.chunk_id)
+                return False
+            except requests.ConnectionError as e:
+                self._record_error(f"{type(e).__name__}: {e}")
+                self._set_offline(type(e).__name__)
+                self.journal.set_state(chunk.chunk_id, STATE_WRITTEN)
+                return self._put(chunk, timeout=0)
+            except requests.RequestException as e:
+                self._record_error(f"{type(e).__name__}: {e}")
+                continue
+
+            if response.status_code == 200:
+                self._on_uploaded(chunk, time.perf_counter() - started, body_bytes, queue_wait, throttled)
+                return False
+            self._record_error(f"HTTP {response.status_code}")
+            if response.status_code not in RETRYABLE_STATUS_CODES or self._is_camera_failure(response):
+                rejected = True
+                break
+
+        # Rechazado: ni se reenvía tras reiniciar ni cuenta como pendiente.
+        # Reintentos agotados: queda en disco y se reintenta en el próximo arranque
+        self.journal.set_state(chunk.chunk_id, STATE_REJECTED if rejected else STATE_WRITTEN)
+        with self._stats_lock:
+            if not rejected:
+                self.rejected_chunks.add(chunk.chunk_id)
+            self.stats['failed'] += 1
+        status = f"{response.status_code} - {response.text}" if response is not None else self.stats['last_error']
+        print(f"Error enviando chunk {chunk.sequence_number} de cámara {chunk.camera_id}: {status}")
+        for callback in self.error_callbacks:
+            try:
+                callback(chunk, response)
+            except Exception as e:
+                print(f"Error en callback de envío fallido: {e}")
+        return False
+
+    def _upload_batch(self, session: requests.Session, chunks: List['VideoChunk'],
+                      queue_waits: Dict[str, float]) -> Set[str]:
+        """Enviar en una petición los chunks de todas las cámaras de una secuencia
+
+        Un solo intento: si el servidor no confirma el lote entero, cada chunk vuelve a la cola por
+        separado (con sus reintentos y su detección de fallo de cámaras). Retorna los chunk_id reencolados.
+        """
+        if not self._wait_online():
+            return set()  # Gestor detenido: quedan "queued" en el diario y se reanudan al arrancar
+        if self.batch_supported is False:
+            # Otro lote ya descubrió que el servidor no admite lotes: los encolados antes no se vuelven a intentar
+            return self._unbatch(chunks, "el servidor no admite lotes")
+        for chunk in chunks:
+            self.journal.set_state(chunk.chunk_id, STATE_UPLOADING)
+        started = time.perf_counter()
+        try:
+            response, body_bytes, throttled = self._post_batch(session, chunks)
+        except FileNotFoundError:
+            return self._unbatch(chunks, "falta algún archivo")  # Por separado se descarta solo el que falte
+        except requests.ConnectionError as e:
+            self._record_error(f"{type(e).__name__}: {e}")
+            self._set_offline(type(e).__name__)
+            requeued = set()
+            for chunk in chunks:
+                self.journal.set_state(chunk.chunk_id, STATE_WRITTEN)
+                if self._put(chunk, timeout=0):
+                    requeued.add(chunk.chunk_id)
+            return requeued
+        except requests.RequestException as e:
+            self._record_error(f"{type(e).__name__}: {e}")
+            return self._unbatch(chunks, type(e).__name__)
+
+        if response.status_code == 200:
+            self.batch_supported = True
+            request_seconds = time.perf_counter() - started
+            with self._stats_lock:
+                self.stats['batches_uploaded'] += 1
+            video_bytes = sum(chunk.file_size_bytes for chunk in chunks) or 1
+            for chunk in chunks:
+                # Bytes de la petición repartidos en proporción al video de cada cámara
+                self._on_uploaded(chunk, request_seconds, round(body_bytes * chunk.file_size_bytes / video_bytes),
+                                  queue_waits.get(chunk.chunk_id, 0.0), throttled)
+            return set()
+        if response.status_code in UNSUPPORTED_ENDPOINT_STATUS_CODES:
+            if self.batch_supported is not False:
+                print(f"El servidor no admite envíos por lotes (HTTP {response.status_code}): "
+                      f"se envía cada chunk por separado")
+            self.batch_supported = False
+        else:
+            self._record_error(f"HTTP {response.status_code}")
+        return self._unbatch(chunks, f"HTTP {response.status_code}")
+
+    def _unbatch(self, chunks: List['VideoChunk'], reason: str) -> Set[str]:
+        """Volver a encolar por separado los chunks de un lote no confirmado"""
+        print(f"Lote del chunk {chunks[0].sequence_number} no confirmado ({reason}): se envía cada cámara por separado")
+        with self._stats_lock:
+            self.stats['batch_fallbacks'] += 1
+        requeued = set()
+        for chunk in chunks:
+            self.journal.set_state(chunk.chunk_id, STATE_WRITTEN)
+            if self._put(chunk, timeout=0):  # Los que no quepan los encola el monitor
+                requeued.add(chunk.chunk_id)
+        return requeued
+
+    def _post_batch(self, session: requests.Session, chunks: List['VideoChunk']) -> Tuple[requests.Response, int, float]:
+        """Petición multipart con los chunks de una secuencia
+
+        Por cada cámara, un campo metadata_<cámara> (JSON con los metadatos del chunk, el SHA-256 del
+        video y los nombres de sus partes) y las partes file_<cámara> y timestamps_<cámara>.
+        Los metadatos van antes que los archivos para que el servidor los tenga al leer cada video.
+        """
+        fields = {
+            'session_id': chunks[0].session_id,
+            'patient_id': chunks[0].patient_id,
+            'chunk_number': chunks[0].sequence_number,
+            'cameras': ",".join(str(chunk.camera_id) for chunk in chunks)
+        }
+        files = []
+        for chunk in chunks:
+            metadata = dict(self._build_form_data(chunk), sha256=file_sha256(chunk.file_path),
+                            file_field=f"file_{chunk.camera_id}")
+            files.append((metadata['file_field'], f"{chunk.sequence_number}.mp4", chunk.file_path, 'video/mp4'))
+            if chunk.timestamps_path and os.path.exists(chunk.timestamps_path):
+                metadata['timestamps_field'] = f"timestamps_{chunk.camera_id}"
+                extension = os.path.splitext(chunk.timestamps_path)[1]
+                files.append((metadata['timestamps_field'], f"{chunk.sequence_number}{extension}",
+                              chunk.timestamps_path, 'application/octet-stream'))
+            fields[f"metadata_{chunk.camera_id}"] = json.dumps(metadata)
+        throttled = [0.0]
+
+        def shape(nbytes: int):
+            throttled[0] += self.limiter.consume(nbytes)
+
+        with MultipartStream(fields, files, on_read=shape) as body:
+            response = session.post(
+                self.batch_url,
+                data=body,
+                headers={'Content-Type': body.content_type},
+                timeout=self.config.request_timeout_seconds
+            )
+        return response, len(body), throttled[0]
+
+    def _send_chunk(self, session: requests.Session, chunk: 'VideoChunk') -> Tuple[requests.Response, int, float]:
+        """Envío reanudable si está activado y el servidor no lo ha rechazado; si no, el archivo entero"""
+        if self.config.resumable and self.resumable_supported is not False:
+            result = self._upload_resumable(session, chunk)
+            if result is not None:
+                return result
+        return self._post_chunk(session, chunk)
+
+    def _upload_resumable(self, session: requests.Session,
+                          chunk: 'VideoChunk') -> Optional[Tuple[requests.Response, int, float]]:
+        """Negociar desde qué byte seguir y enviar el resto del video en tramos PATCH
+
+        1. POST resumable_upload_endpoint con los metadatos, upload_length y los timestamps: el servidor
+           crea la subida o, si ya existe una de ese chunk_id, responde cuántos bytes tiene.
+        2. PATCH <endpoint>/<upload_id> con Upload-Offset y como mucho resumable_segment_bytes del video.
+           Responde 204 con el nuevo Upload-Offset, 409 con el offset correcto o, tras el último byte,
+           lo mismo que upload_endpoint.
+        Un corte o timeout en mitad de un tramo no pierde lo ya recibido: el reintento vuelve a negociar.
+        Retorna None si el servidor no admite envíos reanudables.
+        """
+        length = os.path.getsize(chunk.file_path)
+        throttled = [0.0]
+
+        def shape(nbytes: int):
+            throttled[0] += self.limiter.consume(nbytes)
+
+        files = []
+        if chunk.timestamps_path and os.path.exists(chunk.timestamps_path):
+            extension = os.path.splitext(chunk.timestamps_path)[1]
+            files.append(('timestamps', f"{chunk.sequence_number}{extension}", chunk.timestamps_path,
+                          'application/octet-stream'))
+        fields = dict(self._build_form_data(chunk), upload_length=length)
+        with MultipartStream(fields, files, on_read=shape) as body:
+            response = session.post(
+                self.resumable_url,
+                data=body,
+                headers={'Content-Type': body.content_type},
+                timeout=self.config.request_timeout_seconds
+            )
+        sent = len(body)
+        if response.status_code in UNSUPPORTED_ENDPOINT_STATUS_CODES:
+            return self._resumable_unsupported(f"HTTP {response.status_code}")
+        if response.status_code not in (200, 201):
+            return response, sent, throttled[0]
+        try:
+            negotiated = response.json()
+            upload_id = negotiated['upload_id']
+            offset = int(negotiated['offset'])
+        except (ValueError, KeyError, TypeError):
+            return self._resumable_unsupported("respuesta de negociación no válida")
+        self.resumable_supported = True
+        if offset > 0:
+            print(f"Reanudando chunk {chunk.sequence_number} de cámara {chunk.camera_id} "
+                  f"desde el byte {offset} de {length}")
+            with self._stats_lock:
+                self.stats['bytes_resumed'] += offset
+
+        upload_url = f"{self.resumable_url}/{upload_id}"
+        segment_bytes = max(1, self.config.resumable_segment_bytes)
+        for _ in range((length - offset) // segment_bytes + MAX_OFFSET_CORRECTIONS + 2):
+            segment = min(segment_bytes, max(0, length - offset))
+            headers = {'Content-Type': 'application/offset+octet-stream', 'Upload-Offset': str(offset)}
+            if segment == 0:
+                # Todo recibido (p. ej. se perdió la confirmación): el servidor repite la respuesta final
+                response = session.patch(upload_url, data=b"", headers=headers,
+                                         timeout=self.config.request_timeout_seconds)
+            else:
+                with FileRangeStream(chunk.file_path, offset, segment, on_read=shape) as body:
+                    response = session.patch(upload_url, data=body, headers=headers,
+                                             timeout=self.config.request_timeout_seconds)
+            sent += segment
+            if response.status_code == 204:
+                offset = int(response.headers.get('Upload-Offset', offset + segment))
+            elif response.status_code == 409:
+                try:
+                    offset = int(response.json()['offset'])
+                except (ValueError, KeyError, TypeError):
+                    return response, sent, throttled[0]
+            else:
+                return response, sent, throttled[0]
+        return response, sent, throttled[0]
+
+    def _resumable_unsupported(self, reason: str) -> None:
+        # Varios hilos pueden recibir la misma respuesta: el aviso solo lo da el que cambia el estado
+        with self._stats_lock:
+            changed = self.resumable_supported is not False
+            self.resumable_supported = False
+        if changed:
+            print(f"El servidor no admite envíos reanudables ({reason}): se envían los chunks enteros")
+        return None
+
+    def _post_chunk(self, session: requests.Session, chunk: 'VideoChunk') -> Tuple[requests.Response, int, float]:
+        """Petición multipart con el video, sus timestamps por frame y los metadatos del chunk
+
+        Retorna la respuesta, los bytes del cuerpo y los segundos de espera por el limitador.
+        """
+        # Server espera 'file'; el nombre no depende de dónde esté guardado el archivo
+        files = [('file', f"{chunk.sequence_number}.mp4", chunk.file_path, 'video/mp4')]
+        if chunk.timestamps_path and os.path.exists(chunk.timestamps_path):
+            extension = os.path.splitext(chunk.timestamps_path)[1]
+            files.append(('timestamps', f"{chunk.sequence_number}{extension}", chunk.timestamps_path,
+                          'application/octet-stream'))
+        throttled = [0.0]
+
+        def shape(nbytes: int):
+            throttled[0] += self.limiter.consume(nbytes)
+
+        with MultipartStream(self._build_form_data(chunk), files, on_read=shape) as body:
+            response = session.post(
+                self.upload_url,
+                data=body,
+                headers={'Content-Type': body.content_type},
+                timeout=self.config.request_timeout_seconds
+            )
+        return response, len(body), throttled[0]
+
+    @staticmethod
+    def _build_form_data(chunk: 'VideoChunk') -> dict:
+        return {
+            'chunk_id': chunk.chunk_id,
+            'camera_id': chunk.camera_id,
+            'session_id': chunk.session_id,
+            'patient_id': chunk.patient_id,
+            'chunk_number': chunk.sequence_number,  # Server espera chunk_number
+            'duration_seconds': chunk.duration_seconds,
+            'timestamp': chunk.timestamp.isoformat(),
+            'file_size_bytes': chunk.file_size_bytes,
+            'first_frame_index': chunk.first_frame_index,
+            'last_frame_index': chunk.last_frame_index,
+            'frame_count': chunk.frame_count,
+            'frames_duplicated': chunk.frames_duplicated,
+            'frames_dropped': chunk.frames_dropped
+        }
+
+    @staticmethod
+    def _is_camera_failure(response: requests.Response) -> bool:
+        """El servidor responde 500 con CAMERA_FAILURE_DETECTED cuando hay que cancelar la sesión"""
+        try:
+            return response.json().get('error') == 'CAMERA_FAILURE_DETECTED'
+        except ValueError:
+            return False
+
+    def _on_uploaded(self, chunk: 'VideoChunk', request_seconds: float, body_bytes: int = 0,
+                     queue_wait: float = 0.0, throttled: float = 0.0):
+        throughput = body_bytes / request_seconds if request_seconds > 0 else 0.0
+        print(f"Chunk enviado exitosamente: {chunk.chunk_id} ({body_bytes / 1024 ** 2:.2f} MB en "
+              f"{request_seconds:.2f}s, {throughput / 1024 ** 2:.2f} MB/s; cola {queue_wait:.2f}s, "
+              f"limitador {throttled:.2f}s)")
+        UPLOAD_REQUEST_SECONDS.observe(request_seconds, chunk.camera_id)
+        UPLOAD_QUEUE_WAIT_SECONDS.observe(queue_wait, chunk.camera_id)
+        UPLOAD_THROTTLE_SECONDS.observe(throttled, chunk.camera_id)
+        if request_seconds > 0:
+            UPLOAD_THROUGHPUT.observe(throughput, chunk.camera_id)
+        self.journal.set_state(chunk.chunk_id, STATE_ACKED)
+        with self._stats_lock:
+            self.stats['uploaded'] += 1
+            self.stats['bytes_uploaded'] += chunk.file_size_bytes
+            self.recent_uploads.append({
+                'chunk_id': chunk.chunk_id,
+                'camera_id': chunk.camera_id,
+                'sequence_number': chunk.sequence_number,
+                'bytes': body_bytes,
+                'queue_wait_seconds': round(queue_wait, 3),
+                'request_seconds': round(request_seconds, 3),
+                'throttled_seconds': round(throttled, 3),
+                'throughput_bytes_per_second': round(throughput)
+            })
+        # Eliminar los archivos locales después del envío exitoso
+        for path in (chunk.file_path, chunk.timestamps_path):
+            if not path:
+                continue
+            try:
+                os.remove(path)
+            except Exception as e:
+                print(f"Error eliminando archivo local: {e}")
+        for callback in self.success_callbacks:
+            try:
+                callback(chunk)
+            except Exception as e:
+                print(f"Error en callback de envío confirmado: {e}")
+
+    def _record_error(self, error: str):
+        with self._stats_lock:
+            self.stats['last_error'] = error
+
+
+# Singleton del gestor de envíos
+upload_manager = UploadManager()
@@ -2,5 +2,10 @@
 Módulo inicializador para video_processor
 """
 from .video_processor import VideoProcessor, video_processor, VideoChunk
+from .encoders import VideoEncoder, OpenCVEncoder, PyAVEncoder, MjpegPassthroughEncoder, create_encoder
+from .encoder_process import EncoderProcess, ProcessEncoder
+from .timestamp_sidecar import TimestampSidecar
+from .frame_pacer import FramePacer
 
-__all__ = ['VideoProcessor', 'video_processor', 'VideoChunk']
+__all__ = ['VideoProcessor', 'video_processor', 'VideoChunk', 'VideoEncoder', 'OpenCVEncoder', 'PyAVEncoder', 'MjpegPassthroughEncoder', 'create_encoder',
+           'EncoderProcess', 'ProcessEncoder', 'TimestampSidecar', 'FramePacer']
@@ -0,0 +1,285 @@
+# Codificación en procesos separados (uno por cámara) para que varias cámaras no compitan por el GIL
+# Los frames viajan por memoria compartida (multiprocessing.shared_memory): entre procesos solo
+# se envían índices de slot y timestamps, nunca arrays serializados.
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+import time
+from dataclasses import replace
+from multiprocessing import shared_memory
+from typing import Dict, Optional
+
+import numpy as np
+
+from ..config.settings import RecordingConfig
+from .encoders import VideoEncoder, create_encoder
+
+# spawn en todas las plataformas: los hijos no heredan los hilos de captura ni el estado del SDK
+_MP_CONTEXT = mp.get_context('spawn')
+
+RESPONSE_TIMEOUT_SECONDS = 30  # Espera máxima a que el proceso abra o cierre un archivo
+SLOT_WAIT_SECONDS = 0.1  # Espera por un slot libre antes de descartar el frame (con ritmo constante, de volver a comprobar el proceso)
+
+
+def _encoder_worker(camera_id: int, shm_name: str, num_slots: int, slot_bytes: int,
+                    config: RecordingConfig, commands, responses, free_slots):
+    """Bucle del proceso codificador de una cámara
+
+    Puede tener varios archivos abiertos a la vez (chunk en curso y siguiente),
+    identificados por la clave que asigna cada ProcessEncoder.
+    """
+    # Los hijos lanzados con spawn comparten el resource_tracker del padre: solo el padre hace unlink
+    shm = shared_memory.SharedMemory(name=shm_name)
+    slots = np.ndarray((num_slots, slot_bytes), dtype=np.uint8, buffer=shm.buf)
+    encoders: Dict[int, dict] = {}  # clave -> {encoder, shape, pixel_format, frames, latency}
+
+    try:
+        while True:
+            message = commands.get()
+            kind = message[0]
+
+            if kind == 'frame':
+                _, key, slot, timestamp, nbytes = message
+                state = encoders.get(key)
+                try:
+                    if state is not None:
+                        data = slots[slot, :nbytes]
+                        frame = data if state['pixel_format'] == "mjpeg" else data.reshape(state['shape'])
+                        if state['encoder'].encode(frame, state['pixel_format'], timestamp):
+                            state['frames'] += 1
+                            state['latency'] += time.time() - timestamp
+                        frame = data = None
+                except Exception as e:
+                    print(f"Proceso codificador cámara {camera_id}: Error codificando frame: {e}")
+                finally:
+                    free_slots.put(slot)
+
+            elif kind == 'format':
+                _, key, pixel_format = message
+                if key in encoders:
+                    encoders[key]['pixel_format'] = pixel_format
+
+            elif kind == 'open':
+                _, key, output_path, width, height, fps, backend, h264_crf = message
+                try:
+                    encoder_config = config if h264_crf is None else replace(config, h264_crf=h264_crf)
+                    encoder = create_encoder(encoder_config, backend)
+                    if encoder.open(output_path, width, height, fps):
+                        encoders[key] = {
+                            'encoder': encoder,
+                            'shape': (height, width, 3),
+                            'pixel_format': "bgr24",
+                            'frames': 0,
+                            'latency': 0.0
+                        }
+                except Exception as e:
+                    print(f"Proceso codificador cámara {camera_id}: Error abriendo {output_path}: {e}")
+                responses.put(('opened', key, key in encoders))
+
+            elif kind == 'close':
+                key = message[1]
+                state = encoders.pop(key, None)
+                success = state is not None
+                frames_encoded = state['frames'] if state else 0
+                try:
+                    if state is not None:
+                        state['encoder'].close()
+                except Exception as e:
+                    print(f"Proceso codificador cámara {camera_id}: Error cerrando archivo: {e}")
+                    success = False
+                mean_latency = state['latency'] / frames_encoded if frames_encoded else 0.0
+                responses.put(('closed', key, success, frames_encoded, mean_latency))
+
+            elif kind == 'stop':
+                break
+    finally:
+        for state in encoders.values():
+            try:
+                state['encoder'].close()
+            except Exception:
+                pass
+        del slots
+        shm.close()
+
+
+class EncoderProcess:
+    """Proceso codificador de una cámara con su anillo de slots en memoria compartida
+
+    Vive durante toda la grabación; cada chunk abre y cierra un archivo en el mismo proceso.
+    """
+
+    def __init__(self, camera_id: int, slot_bytes: int, config: RecordingConfig):
+        self.camera_id = camera_id
+        self.slot_bytes = slot_bytes
+        self.num_slots = config.process_frame_slots
+        self.config = config
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        self.slots: Optional[np.ndarray] = None
+        self.process = None
+        self.commands = None
+        self.responses = None
+        self.free_slots = None
+        self.frames_dropped = 0  # Frames descartados por no haber slot libre (proceso saturado)
+        self.slot_wait_seconds = 0.0  # Espera acumulada por un slot libre de los encoders con ritmo constante
+        self._keys = itertools.count()  # Clave de cada archivo abierto en el proceso
+        self._responses_lock = threading.Lock()
+        self._unclaimed_responses: Dict[tuple, tuple] = {}  # Respuestas que esperaba otro hilo
+
+    def start(self) -> bool:
+        """Crear la memoria compartida y lanzar el proceso"""
+        try:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.num_slots * self.slot_bytes)
+            self.slots = np.ndarray((self.num_slots, self.slot_bytes), dtype=np.uint8, buffer=self.shm.buf)
+            self.commands = _MP_CONTEXT.Queue()
+            self.responses = _MP_CONTEXT.Queue()
+            self.free_slots = _MP_CONTEXT.Queue()
+            for slot in range(self.num_slots):
+                self.free_slots.put(slot)
+
+            self.process = _MP_CONTEXT.Process(
+                target=_encoder_worker,
+                args=(self.camera_id, self.shm.name, self.num_slots, self.slot_bytes, self.config,
+                      self.commands, self.responses, self.free_slots),
+                name=f"codificador-camara{self.camera_id}",
+                daemon=True
+            )
+            self.process.start()
+            print(f"Proceso codificador iniciado para cámara {self.camera_id} (PID {self.process.pid})")
+            return True
+        except Exception as e:
+            print(f"Error iniciando proceso codificador de cámara {self.camera_id}: {e}")
+            self.stop()
+            return False
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def create_encoder(self, backend: Optional[str] = None, h264_crf: Optional[int] = None,
+                       blocking: bool = False) -> 'ProcessEncoder':
+        """Encoder que delega en este proceso (misma interfaz que los backends locales)
+
+        h264_crf sustituye al CRF de la configuración solo para este archivo.
+        Con blocking (ritmo constante) el encoder espera a que haya un slot libre en lugar de
+        descartar el frame: cada slot de la rejilla tiene que llegar al archivo.
+        """
+        return ProcessEncoder(self, backend or self.config.encoder, next(self._keys), h264_crf, blocking)
+
+    def wait_response(self, expected: str, key: int) -> Optional[tuple]:
+        """Esperar la respuesta del proceso a un comando de un archivo concreto
+
+        Varios hilos pueden esperar a la vez (apertura del siguiente chunk y cierre del anterior):
+        las respuestas ajenas se guardan para el hilo que las espera.
+        """
+        deadline = time.time() + RESPONSE_TIMEOUT_SECONDS
+        while time.time() < deadline:
+            with self._responses_lock:
+                response = self._unclaimed_responses.pop((expected, key), None)
+                if response is not None:
+                    return response
+                try:
+                    response = self.responses.get(timeout=0.1)
+                except queue.Empty:
+                    response = None
+                if response is not None:
+                    if response[0] == expected and response[1] == key:
+                        return response
+                    self._unclaimed_responses[(response[0], response[1])] = response
+                    continue
+            if not self.is_alive():
+                break
+        print(f"Proceso codificador cámara {self.camera_id}: Sin respuesta '{expected}'")
+        return None
+
+    def stop(self):
+        """Detener el proceso y liberar la memoria compartida"""
+        try:
+            if self.is_alive():
+                self.commands.put(('stop',))
+                self.process.join(timeout=5)
+                if self.process.is_alive():
+                    self.process.terminate()
+                    self.process.join(timeout=1)
+        except Exception as e:
+            print(f"Error deteniendo proceso codificador de cámara {self.camera_id}: {e}")
+        finally:
+            self.process = None
+            self.slots = None
+            if self.shm is not None:
+                try:
+                    self.shm.close()
+                    self.shm.unlink()
+                except Exception as e:
+                    print(f"Error liberando memoria compartida de cámara {self.camera_id}: {e}")
+                self.shm = None
+
+
+class ProcessEncoder(VideoEncoder):
+    """Proxy de un backend de codificación que se ejecuta en un EncoderProcess"""
+
+    def __init__(self, encoder_process: EncoderProcess, backend: str, key: int, h264_crf: Optional[int] = None,
+                 blocking: bool = False):
+        self.encoder_process = encoder_process
+        self.name = backend
+        self.key = key
+        self.h264_crf = h264_crf
+        self.blocking = blocking  # Esperar por un slot libre en lugar de descartar el frame
+        self.frames_sent = 0
+        self.last_stats: Optional[dict] = None  # Estadísticas del archivo una vez cerrado
+        self._open = False
+        self._pixel_format: Optional[str] = None
+
+    def open(self, output_path: str, width: int, height: int, fps: int) -> bool:
+        process = self.encoder_process
+        if not process.is_alive() or width * height * 3 > process.slot_bytes:
+            return False
+        process.commands.put(('open', self.key, output_path, width, height, fps, self.name, self.h264_crf))
+        response = process.wait_response('opened', self.key)
+        self._open = bool(response and response[2])
+        self._pixel_format = None
+        self.frames_sent = 0
+        return self._open
+
+    def encode(self, frame: np.ndarray, pixel_format: str = "bgr24", timestamp: Optional[float] = None) -> bool:
+        process = self.encoder_process
+        if frame.nbytes > process.slot_bytes:
+            return False
+        if pixel_format != self._pixel_format:
+            process.commands.put(('format', self.key, pixel_format))
+            self._pixel_format = pixel_format
+        started = time.monotonic()
+        while True:
+            try:
+                slot = process.free_slots.get(timeout=SLOT_WAIT_SECONDS)
+                break
+            except queue.Empty:
+                if not self.blocking or not process.is_alive():
+                    process.frames_dropped += 1
+                    return False
+        if self.blocking:
+            process.slot_wait_seconds += time.monotonic() - started
+        np.copyto(process.slots[slot, :frame.nbytes], frame.reshape(-1))
+        timestamp = timestamp if timestamp is not None else time.time()
+        process.commands.put(('frame', self.key, slot, timestamp, frame.nbytes))
+        self.frames_sent += 1
+        return True
+
+    def close(self):
+        if not self._open:
+            return
+        self._open = False
+        process = self.encoder_process
+        process.commands.put(('close', self.key))
+        response = process.wait_response('closed', self.key)
+        if response is None or not response[2]:
+            raise RuntimeError(f"El proceso codificador de la cámara {process.camera_id} no cerró el archivo")
+        _, _, _, frames_encoded, mean_latency = response
+        self.last_stats = {
+            'frames_sent': self.frames_sent,
+            'frames_encoded': frames_encoded,
+            'mean_latency_seconds': mean_latency
+        }
+
+    @property
+    def is_open(self) -> bool:
+        return self._open and self.encoder_process.is_alive()
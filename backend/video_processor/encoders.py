@@ -0,0 +1,227 @@
+# Backends de codificación de video para los chunks
+# - "h264": PyAV/libx264 (archivos mucho más pequeños, menos ancho de banda hacia el servidor)
+# - "mp4v": cv2.VideoWriter con fourcc 'mp4v' (MPEG-4 Part 2), disponible siempre como respaldo
+# - "mjpeg": passthrough de los JPEG que entrega la cámara, sin decodificar ni recodificar
+import cv2
+import numpy as np
+from fractions import Fraction
+from typing import Optional
+
+from ..config.settings import RecordingConfig
+
+# PyAV es opcional: si no está instalado se usa el backend de OpenCV
+try:
+    import av
+    AV_AVAILABLE = True
+except ImportError:
+    av = None
+    AV_AVAILABLE = False
+
+
+class VideoEncoder:
+    """Interfaz común de los backends de codificación"""
+
+    name = "base"
+
+    def open(self, output_path: str, width: int, height: int, fps: int) -> bool:
+        """Abrir el archivo de salida. Retorna False si el backend no puede usarse"""
+        raise NotImplementedError
+
+    def encode(self, frame: np.ndarray, pixel_format: str = "bgr24", timestamp: Optional[float] = None) -> bool:
+        """Codificar un frame (height, width, 3) en formato 'bgr24' o 'rgb24'
+
+        timestamp es el instante de captura (time.time()); los backends locales no lo necesitan.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Vaciar el codificador y cerrar el archivo"""
+        raise NotImplementedError
+
+    @property
+    def is_open(self) -> bool:
+        raise NotImplementedError
+
+
+class OpenCVEncoder(VideoEncoder):
+    """Codificación con cv2.VideoWriter y fourcc 'mp4v'"""
+
+    name = "mp4v"
+
+    def __init__(self):
+        self.writer: Optional[cv2.VideoWriter] = None
+        self._bgr_buffer: Optional[np.ndarray] = None  # Destino preasignado para frames RGB
+
+    def open(self, output_path: str, width: int, height: int, fps: int) -> bool:
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        self.writer = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        if not self.writer.isOpened():
+            self.writer = None
+            return False
+        self._bgr_buffer = np.empty((height, width, 3), dtype=np.uint8)
+        return True
+
+    def encode(self, frame: np.ndarray, pixel_format: str = "bgr24", timestamp: Optional[float] = None) -> bool:
+        if pixel_format == "rgb24":
+            # cv2.VideoWriter solo acepta BGR: convertir sobre el buffer del writer, sin reservar memoria
+            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=self._bgr_buffer)
+        elif pixel_format == "mjpeg":
+            # Respaldo cuando no se puede hacer passthrough (sin PyAV): decodificar y recodificar
+            frame = cv2.imdecode(frame, cv2.IMREAD_COLOR)
+            if frame is None:
+                return False
+        self.writer.write(frame)
+        return True
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.writer is not None and self.writer.isOpened()
+
+
+class PyAVEncoder(VideoEncoder):
+    """Codificación H.264 con PyAV/libx264"""
+
+    name = "h264"
+
+    def __init__(self, preset: str = "veryfast", crf: int = 23, gop_size: int = 30, threads: int = 0):
+        self.preset = preset
+        self.crf = crf
+        self.gop_size = gop_size
+        self.threads = threads
+        self.container = None
+        self.stream = None
+        self._pts = 0
+        self._wrap_buffer = getattr(av.VideoFrame, 'from_numpy_buffer', None) if AV_AVAILABLE else None
+
+    def open(self, output_path: str, width: int, height: int, fps: int) -> bool:
+        if not AV_AVAILABLE:
+            return False
+        try:
+            self.container = av.open(output_path, mode='w')
+            self.stream = self.container.add_stream('libx264', rate=fps)
+            self.stream.width = width
+            self.stream.height = height
+            self.stream.pix_fmt = 'yuv420p'
+            self.stream.options = {
+                'preset': self.preset,
+                'crf': str(self.crf)
+            }
+            self.stream.codec_context.gop_size = self.gop_size
+            self.stream.codec_context.thread_count = self.threads  # 0 = automático
+            self._pts = 0
+            return True
+        except Exception as e:
+            print(f"PyAV: No se pudo abrir el codificador H.264 para {output_path}: {e}")
+            self._close_container()
+            return False
+
+    def encode(self, frame: np.ndarray, pixel_format: str = "bgr24", timestamp: Optional[float] = None) -> bool:
+        # libx264 recibe RGB/BGR tal cual: la conversión a yuv420p la hace swscale al codificar.
+        # from_numpy_buffer envuelve el array sin copiarlo (PyAV >= 13)
+        if self._wrap_buffer is not None and frame.flags['C_CONTIGUOUS']:
+            video_frame = self._wrap_buffer(frame, format=pixel_format)
+        else:
+            video_frame = av.VideoFrame.from_ndarray(frame, format=pixel_format)
+        video_frame.pts = self._pts
+        self._pts += 1
+        for packet in self.stream.encode(video_frame):
+            self.container.mux(packet)
+        return True
+
+    def close(self):
+        if self.container is None:
+            return
+        try:
+            # Vaciar los frames retenidos por el codificador (B-frames / lookahead)
+            for packet in self.stream.encode(None):
+                self.container.mux(packet)
+        finally:
+            self._close_container()
+
+    def _close_container(self):
+        if self.container is not None:
+            self.container.close()
+        self.container = None
+        self.stream = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.container is not None
+
+
+class MjpegPassthroughEncoder(VideoEncoder):
+    """Mux directo de los frames MJPG de la cámara en el contenedor (sin decodificar ni recodificar)"""
+
+    name = "mjpeg"
+
+    def __init__(self):
+        self.container = None
+        self.stream = None
+        self._time_base: Optional[Fraction] = None
+        self._pts = 0
+
+    def open(self, output_path: str, width: int, height: int, fps: int) -> bool:
+        if not AV_AVAILABLE:
+            return False
+        try:
+            self.container = av.open(output_path, mode='w')
+            self.stream = self.container.add_stream('mjpeg', rate=fps)
+            self.stream.width = width
+            self.stream.height = height
+            self.stream.pix_fmt = 'yuvj420p'
+            self._time_base = Fraction(1, fps)
+            self._pts = 0
+            return True
+        except Exception as e:
+            print(f"PyAV: No se pudo abrir el contenedor MJPEG para {output_path}: {e}")
+            self._close_container()
+            return False
+
+    def encode(self, frame: np.ndarray, pixel_format: str = "mjpeg", timestamp: Optional[float] = None) -> bool:
+        if pixel_format != "mjpeg":
+            print(f"Passthrough MJPEG: formato de frame no soportado: {pixel_format}")
+            return False
+        packet = av.Packet(frame)
+        packet.stream = self.stream
+        packet.time_base = self._time_base
+        packet.pts = self._pts
+        packet.dts = self._pts
+        packet.is_keyframe = True  # Cada JPEG es una imagen completa
+        self._pts += 1
+        self.container.mux(packet)
+        return True
+
+    def close(self):
+        self._close_container()
+
+    def _close_container(self):
+        if self.container is not None:
+            self.container.close()
+        self.container = None
+        self.stream = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.container is not None
+
+
+def create_encoder(config: RecordingConfig, backend: Optional[str] = None) -> VideoEncoder:
+    """Crear el backend de codificación configurado (config.encoder o el indicado)"""
+    backend = backend or config.encoder
+    if backend == PyAVEncoder.name:
+        return PyAVEncoder(
+            preset=config.h264_preset,
+            crf=config.h264_crf,
+            gop_size=config.gop_size,
+            threads=config.encoder_threads
+        )
+    if backend == OpenCVEncoder.name:
+        return OpenCVEncoder()
+    if backend == MjpegPassthroughEncoder.name:
+        return MjpegPassthroughEncoder()
+    raise ValueError(f"Backend de codificación desconocido: {backend}")
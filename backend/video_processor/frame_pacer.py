@@ -0,0 +1,97 @@
+# Ritmo constante de frames por chunk
+# Cada cámara entrega frames a su ritmo (con jitter y pérdidas), pero el contenedor se declara a fps fijos.
+# El FramePacer reparte los frames capturados en una rejilla común (inicio + k / fps): cada slot recibe
+# exactamente un frame, duplicando o descartando según la política. Así un chunk dura lo que dice su
+# número de frames y todas las cámaras tienen los mismos frames por chunk.
+from typing import List, Optional, Tuple
+
+from ..camera_manager.frame_buffer import CapturedFrame
+
+PACING_OFF = "off"  # Sin rejilla: se escriben los frames tal como llegan
+PACING_NEAREST = "nearest"  # Cada slot recibe el frame capturado más cercano a su instante
+PACING_HOLD = "hold"  # Cada slot recibe el último frame capturado antes de su instante (menos latencia)
+
+
+class FramePacer:
+    """Rejilla de slots de una cámara (un solo hilo: el bucle de grabación)
+
+    push() retorna los slots que quedan decididos con la llegada de cada frame,
+    como (slot, frame, duplicado). Los frames que no ocupan ningún slot se cuentan
+    como descartados y se recogen con take_dropped().
+    """
+
+    def __init__(self, start_time: float, fps: float, policy: str = PACING_NEAREST):
+        self.start_time = start_time
+        self.fps = fps
+        self.policy = policy
+        self.next_slot = 0
+        self.end_slot: Optional[int] = None  # Primer slot fuera de la grabación (al detenerla)
+        self.frames_duplicated = 0
+        self.frames_dropped = 0
+        self._previous: Optional[CapturedFrame] = None
+        self._previous_uses = 0
+        self._pending_dropped = 0
+
+    def slot_time(self, slot: int) -> float:
+        return self.start_time + slot / self.fps
+
+    def slot_at(self, timestamp: float) -> int:
+        """Primer slot cuyo instante es posterior a timestamp"""
+        return max(0, int((timestamp - self.start_time) * self.fps) + 1)
+
+    def push(self, frame: CapturedFrame) -> List[Tuple[int, CapturedFrame, bool]]:
+        """Añadir el siguiente frame capturado de la cámara"""
+        if self.end_slot is not None and self.next_slot >= self.end_slot:
+            return []  # Rejilla completa: el frame es posterior a la grabación
+        paced = []
+        previous = self._previous
+        while self.end_slot is None or self.next_slot < self.end_slot:
+            slot_time = self.slot_time(self.next_slot)
+            if self.policy == PACING_HOLD:
+                if frame.timestamp <= slot_time:
+                    break  # Puede llegar otro frame anterior al slot
+                use_frame = previous is None
+            else:
+                if frame.timestamp < slot_time:
+                    break
+                use_frame = previous is None or frame.timestamp - slot_time <= slot_time - previous.timestamp
+            if use_frame:
+                paced.append((self.next_slot, frame, bool(paced) and paced[-1][1] is frame))
+            else:
+                paced.append((self.next_slot, previous, self._previous_uses > 0))
+                self._previous_uses += 1
+            self.next_slot += 1
+
+        if previous is not None:
+            self._retire(self._previous_uses)
+        self._previous = frame
+        self._previous_uses = sum(1 for _, paced_frame, _ in paced if paced_frame is frame)
+        return paced
+
+    def finish(self, end_slot: int) -> List[Tuple[int, CapturedFrame, bool]]:
+        """Cerrar la rejilla en end_slot: los slots que faltan repiten el último frame"""
+        self.end_slot = end_slot
+        paced = []
+        previous = self._previous
+        if previous is not None:
+            while self.next_slot < end_slot:
+                paced.append((self.next_slot, previous, self._previous_uses > 0))
+                self._previous_uses += 1
+                self.next_slot += 1
+            if self._previous_uses or previous.timestamp < self.slot_time(end_slot):
+                self._retire(self._previous_uses)
+            self._previous = None
+        return paced
+
+    def take_dropped(self) -> int:
+        """Frames descartados desde la última llamada"""
+        dropped, self._pending_dropped = self._pending_dropped, 0
+        return dropped
+
+    def _retire(self, uses: int):
+        """Contabilizar un frame que ya no puede ocupar más slots"""
+        if uses == 0:
+            self.frames_dropped += 1
+            self._pending_dropped += 1
+        else:
+            self.frames_duplicated += uses - 1
@@ -0,0 +1,92 @@
+# Timestamps por frame de cada chunk (archivo binario junto al video)
+# El servidor realinea las cámaras con estos timestamps sin volver a analizar los videos.
+# Formato (little-endian): cabecera "<4sHHI" (magia, versión, columnas, frames) seguida de
+# cada columna completa como int64: índice de frame, timestamp del host (us) y timestamp de la cámara (us, -1 si no hay).
+import os
+import struct
+import sys
+from array import array
+from typing import Optional
+
+SIDECAR_EXTENSION = ".frames"
+SIDECAR_CONTENT_TYPE = "application/octet-stream"
+
+
+def sidecar_path(video_path: str) -> str:
+    """Ruta del archivo de timestamps de un chunk de video"""
+    return os.path.splitext(video_path)[0] + SIDECAR_EXTENSION
+
+
+class TimestampSidecar:
+    """Timestamps por frame de un chunk, en arrays de int64"""
+
+    MAGIC = b"GTSC"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHHI")
+    COLUMNS = ("frame_index", "timestamp_us", "device_timestamp_us")
+
+    def __init__(self):
+        self.frame_index = array('q')
+        self.timestamp_us = array('q')  # Instante de captura en el reloj del host (epoch)
+        self.device_timestamp_us = array('q')  # Reloj de la cámara (-1 si el SDK no lo da)
+
+    def __len__(self) -> int:
+        return len(self.frame_index)
+
+    def append(self, frame_index: int, timestamp: float, device_timestamp_us: Optional[int] = None):
+        """Añadir un frame escrito en el chunk (timestamp en segundos, como time.time())"""
+        self.frame_index.append(frame_index)
+        self.timestamp_us.append(int(timestamp * 1_000_000))
+        self.device_timestamp_us.append(device_timestamp_us if device_timestamp_us is not None else -1)
+
+    def duration_seconds(self, nominal_fps: float) -> float:
+        """Duración real del chunk: N frames ocupan N intervalos medios entre frames
+
+        Con un solo frame se usa el intervalo nominal.
+        """
+        count = len(self)
+        if count == 0:
+            return 0.0
+        if count == 1:
+            return 1.0 / nominal_fps
+        span = (self.timestamp_us[-1] - self.timestamp_us[0]) / 1_000_000
+        return span * count / (count - 1)
+
+    def to_bytes(self) -> bytes:
+        columns = [self.frame_index, self.timestamp_us, self.device_timestamp_us]
+        if sys.byteorder != 'little':
+            columns = [array('q', column) for column in columns]
+            for column in columns:
+                column.byteswap()
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, len(columns), len(self))
+        return header + b"".join(column.tobytes() for column in columns)
+
+    def write(self, path: str) -> int:
+        """Guardar en disco. Retorna los bytes escritos"""
+        data = self.to_bytes()
+        with open(path, 'wb') as f:
+            f.write(data)
+        return len(data)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'TimestampSidecar':
+        """Leer un sidecar (p. ej. en el servidor)"""
+        magic, version, columns, count = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION or columns != len(cls.COLUMNS):
+            raise ValueError("Archivo de timestamps no válido")
+        sidecar = cls()
+        offset = cls.HEADER.size
+        for name in cls.COLUMNS:
+            column = getattr(sidecar, name)
+            column.frombytes(data[offset:offset + count * column.itemsize])
+            if sys.byteorder != 'little':
+                column.byteswap()
+            offset += count * column.itemsize
+        if len(sidecar) != count or any(len(getattr(sidecar, name)) != count for name in cls.COLUMNS):
+            raise ValueError("Archivo de timestamps truncado")
+        return sidecar
+
+    @classmethod
+    def read(cls, path: str) -> 'TimestampSidecar':
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
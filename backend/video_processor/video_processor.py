@@ -1,14 +1,29 @@
 import os
 import threading
 import time
-import cv2
 import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Callable
-from dataclasses import dataclass
+import math
+from typing import Dict, List, Optional, Callable, Tuple
+from dataclasses import dataclass, replace
 
-from ..config.settings import SystemConfig
-from ..camera_manager import camera_manager
+from ..config.settings import SystemConfig, RecordingConfig
+from ..camera_manager import camera_manager, FrameSynchronizer
+from ..camera_manager.frame_synchronizer import resolve_timestamp_source
+from ..upload_manager import upload_manager
+from ..metrics import metrics, FRAME_STAGE_BUCKETS, FINALIZE_BUCKETS
+from .encoders import VideoEncoder, OpenCVEncoder, MjpegPassthroughEncoder, create_encoder
+from .encoder_process import EncoderProcess
+from .timestamp_sidecar import TimestampSidecar, sidecar_path
+from .frame_pacer import FramePacer, PACING_OFF
+
+FRAME_ENCODE_SECONDS = metrics.histogram("frame_encode_seconds",
+                                         "Codificación de un frame (en modo process: copia a memoria compartida)",
+                                         FRAME_STAGE_BUCKETS)
+CHUNK_FINALIZE_SECONDS = metrics.histogram("chunk_finalize_seconds",
+                                           "Cierre del contenedor, sidecar de timestamps y verificación de un chunk",
+                                           FINALIZE_BUCKETS)
 
 
 @dataclass
@@ -23,62 +38,107 @@ class VideoChunk:
     duration_seconds: float
     timestamp: datetime
     file_size_bytes: int
+    first_frame_index: int = -1  # Índice de captura del primer frame del chunk
+    last_frame_index: int = -1  # Índice de captura del último frame (el siguiente chunk empieza en last + 1)
+    frame_count: int = 0
+    timestamps_path: Optional[str] = None  # Timestamps por frame (TimestampSidecar), se envía junto al video
+    frames_duplicated: int = 0  # Frames repetidos para mantener el ritmo constante (FramePacer)
+    frames_dropped: int = 0  # Frames capturados que no ocuparon ningún slot del chunk
 
 
 class VideoWriter:
     """Manejador de escritura de video para una cámara"""
     
-    def __init__(self, camera_id: int, output_path: str):
+    def __init__(self, camera_id: int, output_path: str,
+                 encoder_factory: Optional[Callable[[Optional[str]], VideoEncoder]] = None,
+                 sequence_number: int = 0, paced: bool = False):
         self.camera_id = camera_id
         self.output_path = output_path
-        self.writer: Optional[cv2.VideoWriter] = None
+        self.sequence_number = sequence_number
+        # Fábrica de backends: por defecto codifica en este proceso; en modo "process" delega en un EncoderProcess
+        self.encoder_factory = encoder_factory or (lambda backend: create_encoder(SystemConfig.RECORDING, backend))
+        self.encoder: Optional[VideoEncoder] = None
         self.frame_count = 0
-        self.start_time: Optional[datetime] = None
+        self.fps = 30
+        self.start_time: Optional[datetime] = None  # Instante de captura del primer frame escrito
+        self.first_frame_index = -1
+        self.last_frame_index = -1
+        self.timestamps = TimestampSidecar()
+        self.paced = paced  # Un frame por slot de la rejilla: la duración es frame_count / fps
+        self.frames_duplicated = 0
+        self.frames_dropped = 0
         
-    def initialize(self, frame_width: int, frame_height: int, fps: int) -> bool:
-        """Inicializar el writer de video"""
+    def initialize(self, frame_width: int, frame_height: int, fps: int, pixel_format: str = "bgr24") -> bool:
+        """Inicializar el writer de video con el backend configurado (mp4v como respaldo)
+
+        Si la cámara entrega MJPG los frames se copian al contenedor sin recodificar.
+        """
         try:
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            self.writer = cv2.VideoWriter(
-                self.output_path,
-                fourcc,
-                fps,
-                (frame_width, frame_height)
-            )
+            backend = MjpegPassthroughEncoder.name if pixel_format == "mjpeg" else None
+            encoder = self.encoder_factory(backend)
+            if not encoder.open(self.output_path, frame_width, frame_height, fps):
+                if encoder.name == OpenCVEncoder.name:
+                    print(f"Error: No se pudo crear el video writer para cámara {self.camera_id}")
+                    return False
+                print(f"Cámara {self.camera_id}: Backend '{encoder.name}' no disponible, usando 'mp4v'")
+                encoder = self.encoder_factory(OpenCVEncoder.name)
+                if not encoder.open(self.output_path, frame_width, frame_height, fps):
+                    print(f"Error: No se pudo crear el video writer para cámara {self.camera_id}")
+                    return False
             
-            if not self.writer.isOpened():
-                print(f"Error: No se pudo crear el video writer para cámara {self.camera_id}")
-                return False
-                
-            self.start_time = datetime.now()
-            print(f"Video writer inicializado para cámara {self.camera_id}: {self.output_path}")
+            self.encoder = encoder
+            self.fps = fps
+            print(f"Video writer ({encoder.name}) inicializado para cámara {self.camera_id}: {self.output_path}")
             return True
             
         except Exception as e:
             print(f"Error inicializando video writer para cámara {self.camera_id}: {e}")
             return False
     
-    def write_frame(self, frame) -> bool:
-        """Escribir un frame al video"""
-        if self.writer is None or not self.writer.isOpened():
+    def write_frame(self, frame, pixel_format: str = "bgr24", timestamp: Optional[float] = None,
+                    frame_index: int = -1, device_timestamp_us: Optional[int] = None,
+                    duplicate: bool = False) -> bool:
+        """Escribir un frame al video ("bgr24", "rgb24" o "mjpeg")
+
+        duplicate indica que el frame ya se escribió en el slot anterior (ritmo constante).
+        """
+        if self.encoder is None or not self.encoder.is_open:
             return False
             
         try:
-            self.writer.write(frame)
+            timestamp = timestamp if timestamp is not None else time.time()
+            started = time.perf_counter()
+            if not self.encoder.encode(frame, pixel_format, timestamp):
+                return False
+            FRAME_ENCODE_SECONDS.observe(time.perf_counter() - started, self.camera_id)
+            if self.frame_count == 0:
+                self.first_frame_index = frame_index
+                self.start_time = datetime.fromtimestamp(timestamp)
+            self.last_frame_index = frame_index
+            self.timestamps.append(frame_index, timestamp, device_timestamp_us)
             self.frame_count += 1
+            if duplicate:
+                self.frames_duplicated += 1
             return True
         except Exception as e:
             print(f"Error escribiendo frame en cámara {self.camera_id}: {e}")
             return False
     
+    def release(self):
+        """Cerrar el codificador sin generar chunk"""
+        if self.encoder is not None:
+            try:
+                self.encoder.close()
+            finally:
+                self.encoder = None
+    
     def finalize(self) -> Optional[VideoChunk]:
         """Finalizar el video y retornar información del chunk"""
-        if self.writer is None:
+        if self.encoder is None:
             return None
             
         try:
-            self.writer.release()
-            self.writer = None
+            self.release()
             
             # Verificar que el archivo se creó correctamente
             if not os.path.exists(self.output_path):
@@ -86,7 +146,14 @@ class VideoWriter:
                 return None
             
             file_size = os.path.getsize(self.output_path)
-            duration = (datetime.now() - self.start_time).total_seconds() if self.start_time else 0
+            # Con ritmo constante cada frame ocupa exactamente 1/fps; si no, según los instantes de captura
+            # (el chunk se finaliza en segundo plano, más tarde)
+            if self.paced:
+                duration = self.frame_count / self.fps
+            else:
+                duration = self.timestamps.duration_seconds(self.fps)
+            timestamps_path = sidecar_path(self.output_path)
+            self.timestamps.write(timestamps_path)
             
             # Generar información del chunk
             chunk_info = VideoChunk(
@@ -94,14 +161,22 @@ class VideoWriter:
                 camera_id=self.camera_id,
                 session_id="",  # Se asignará externamente
                 patient_id="",  # Se asignará externamente
-                sequence_number=0,  # Se asignará externamente
+                sequence_number=self.sequence_number,
                 file_path=self.output_path,
                 duration_seconds=duration,
                 timestamp=self.start_time or datetime.now(),
-                file_size_bytes=file_size
+                file_size_bytes=file_size,
+                first_frame_index=self.first_frame_index,
+                last_frame_index=self.last_frame_index,
+                frame_count=self.frame_count,
+                timestamps_path=timestamps_path,
+                frames_duplicated=self.frames_duplicated,
+                frames_dropped=self.frames_dropped
             )
             
-            print(f"Chunk finalizado para cámara {self.camera_id}: {file_size} bytes, {duration:.2f}s")
+            print(f"Chunk finalizado para cámara {self.camera_id}: {file_size} bytes, {duration:.2f}s, "
+                  f"frames {self.first_frame_index}-{self.last_frame_index}"
+                  + (f" ({self.frames_duplicated} duplicados, {self.frames_dropped} descartados)" if self.paced else ""))
             return chunk_info
             
         except Exception as e:
@@ -112,14 +187,33 @@ class VideoWriter:
 class VideoProcessor:
     """Procesador principal de video multi-cámara"""
     
+    POLL_INTERVAL = 0.005  # Espera (s) cuando ningún buffer de captura tiene frames nuevos
+    WRITER_OPEN_TIMEOUT = 5  # Espera máxima (s) por el writer del siguiente chunk preparado en segundo plano
+    
     def __init__(self):
         self.recording_active = False
         self.session_id: Optional[str] = None
         self.patient_id: Optional[str] = None
         self.current_writers: Dict[int, VideoWriter] = {}
-        self.chunk_sequence: Dict[int, int] = {}  # Indica, para cada cámara (identificada por el índice del diccionario), el número de secuencia del chunk que se está grabando
+        self.chunk_sequence: Dict[int, int] = {}  # Indica, para cada cámara (identificada por el índice del diccionario), el siguiente número de secuencia a asignar
+        self.next_writers: Dict[int, Tuple[int, Future]] = {}  # Writer del siguiente chunk (secuencia, apertura en segundo plano)
+        self.chunk_deadlines: Dict[int, float] = {}  # Fin (time.time()) del chunk en curso de cada cámara
+        self.pacers: Dict[int, FramePacer] = {}  # Rejilla de ritmo constante de cada cámara (vacío si pacing_policy es "off")
+        self.pacing_fps = 0  # FPS de la rejilla común (0 = sin ritmo constante)
+        self.chunk_end_slots: Dict[int, int] = {}  # Primer slot del siguiente chunk de cada cámara (con ritmo constante)
+        self.last_chunk_frame: Dict[int, int] = {}  # Último índice de frame del último chunk finalizado, para verificar continuidad
+        self.recording_start_time: Optional[float] = None
         self.recording_thread: Optional[threading.Thread] = None
+        self.frame_cursors: Dict[int, int] = {}  # Último índice de frame leído del buffer de cada cámara
+        self.encoder_processes: Dict[int, EncoderProcess] = {}  # Solo en modo de codificación "process"
+        self._encoder_processes_lock = threading.Lock()
+        self._writer_executor: Optional[ThreadPoolExecutor] = None  # Abre los writers del siguiente chunk
+        self._finalize_executor: Optional[ThreadPoolExecutor] = None  # Finaliza chunks fuera del bucle de grabación (en orden)
         self.upload_callbacks: List[Callable[[VideoChunk], None]] = []
+        # Frames duplicados/descartados por cámara desde el arranque (no se reinician entre sesiones: métricas)
+        self.frame_totals: Dict[int, Dict[str, int]] = {}
+        # Emparejamiento de frames entre cámaras por timestamp (mide el error de sincronización)
+        self.synchronizer = FrameSynchronizer(SystemConfig.SYNC.tolerance_ms, resolve_timestamp_source(SystemConfig.SYNC))
         
         # Configuración
         self.config = SystemConfig.RECORDING
@@ -133,6 +227,7 @@ class VideoProcessor:
         self.session_id = session_id  # Usar el session_id proporcionado
         self.patient_id = patient_id
         self.chunk_sequence.clear()
+        self.last_chunk_frame.clear()
         
         # Limpiar directorios de cámaras existentes
         self._cleanup_camera_directories()
@@ -156,6 +251,25 @@ class VideoProcessor:
             if not camera_manager.start_recording_all():
                 self.recording_active = False
                 return False
+            # Empezar a leer desde el último frame capturado (los anteriores no pertenecen a la sesión)
+            self.frame_cursors = {
+                camera_id: camera_manager.get_latest_frame_index(camera_id)
+                for camera_id in camera_manager.cameras
+            }
+            self.synchronizer = FrameSynchronizer(SystemConfig.SYNC.tolerance_ms, resolve_timestamp_source(SystemConfig.SYNC))
+            self.synchronizer.set_cameras(self.frame_cursors)
+            # Los límites de chunk son comunes a todas las cámaras: inicio + k * duración
+            self.recording_start_time = time.time()
+            self.chunk_deadlines.clear()
+            # Con ritmo constante todas las cámaras comparten la rejilla inicio + k / fps
+            self.pacing_fps = self._resolve_pacing_fps()
+            self.pacers = {
+                camera_id: FramePacer(self.recording_start_time, self.pacing_fps, self.config.pacing_policy)
+                for camera_id in self.frame_cursors
+            } if self.pacing_fps else {}
+            self.chunk_end_slots.clear()
+            self._writer_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="preparar-writer")
+            self._finalize_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="finalizar-chunk")
             # Iniciar hilo de grabación por chunks
             self.recording_thread = threading.Thread(target=self._recording_loop, daemon=True)
             self.recording_thread.start()
@@ -172,6 +286,11 @@ class VideoProcessor:
             return []
         print("Deteniendo grabación...")
         print("Generando chunks finales con frames restantes...")
+        # Con ritmo constante la grabación termina en el mismo slot para todas las cámaras
+        if self.pacers:
+            end_slot = math.ceil((time.time() - self.recording_start_time) * self.pacing_fps)
+            for pacer in self.pacers.values():
+                pacer.end_slot = end_slot
         # Marcar que debe detenerse la grabación, pero permitir que termine el chunk actual
         self.recording_active = False
         # Esperar a que termine el hilo de grabación
@@ -180,36 +299,35 @@ class VideoProcessor:
             self.recording_thread.join(timeout=15)  # Aumentar timeout para permitir finalización
         # Generar chunks finales con cualquier frame restante
         final_chunks = []
-        # Capturar algunos frames adicionales para el chunk final si hay writers activos
+        # Volcar en los writers activos los frames que quedan en los buffers de captura
         if self.current_writers:
-            print(f"Capturando frames finales para {len(self.current_writers)} cámaras...")
-            # Capturar hasta 1 segundo adicional de frames para el chunk final
-            frames_captured = 0
-            max_final_frames = 30  # Aproximadamente 1 segundo a 30fps
+            print(f"Volcando frames finales para {len(self.current_writers)} cámaras...")
             try:
-                for _ in range(max_final_frames):
-                    frames_written_this_cycle = 0
-                    for camera_id in list(self.current_writers.keys()):
-                        frame = camera_manager.get_frame(camera_id)
-                        if frame is not None and camera_id in self.current_writers:
-                            if self.current_writers[camera_id].write_frame(frame):
-                                frames_written_this_cycle += 1
-                    if frames_written_this_cycle == 0:
-                        break  # No hay más frames disponibles
-                    frames_captured += frames_written_this_cycle
-                    time.sleep(1/30)  # Aproximadamente 30fps
+                frames_captured = sum(self._write_pending_frames().values())
+                # Completar los slots que faltan hasta el final con el último frame de cada cámara
+                for camera_id, pacer in self.pacers.items():
+                    for slot, frame, duplicate in pacer.finish(end_slot):
+                        if self._write_paced_frame(camera_id, slot, frame, duplicate):
+                            frames_captured += 1
                 if frames_captured > 0:
-                    print(f"Capturados {frames_captured} frames adicionales para chunks finales")
+                    print(f"Escritos {frames_captured} frames adicionales para chunks finales")
             except Exception as e:
-                print(f"Error capturando frames finales: {e}")
-        # Finalizar writers actuales
+                print(f"Error escribiendo frames finales: {e}")
+        # Descartar los writers preparados para un chunk que ya no existirá y esperar a las finalizaciones pendientes
+        self._discard_next_writers()
+        self._shutdown_executors()
+        # Finalizar writers actuales, en paralelo (vaciar el codificador es lo más lento y libera el GIL)
         print("Finalizando writers actuales...")
-        for camera_id, writer in self.current_writers.items():
-            chunk = self._finalize_writer(camera_id, writer)
-            if chunk:
-                final_chunks.append(chunk)
-                print(f"Chunk final generado para cámara {camera_id}: {chunk.duration_seconds:.2f}s")
+        writers = list(self.current_writers.items())
+        if writers:
+            with ThreadPoolExecutor(max_workers=len(writers), thread_name_prefix="finalizar-ultimo") as executor:
+                chunks = list(executor.map(lambda item: self._finalize_writer(*item), writers))
+            for (camera_id, _), chunk in zip(writers, chunks):
+                if chunk:
+                    final_chunks.append(chunk)
+                    print(f"Chunk final generado para cámara {camera_id}: {chunk.duration_seconds:.2f}s")
         self.current_writers.clear()
+        self._stop_encoder_processes()
         camera_manager.stop_recording_all()
         print(f"Grabación detenida. {len(final_chunks)} chunks finales generados")
         return final_chunks
@@ -226,11 +344,14 @@ class VideoProcessor:
         if self.recording_thread and self.recording_thread.is_alive():
             self.recording_thread.join(timeout=10)
         
+        self._discard_next_writers()
+        self._shutdown_executors()
+        
         # Cerrar writers y eliminar archivos
         for camera_id, writer in self.current_writers.items():
             try:
-                if writer.writer:
-                    writer.writer.release()
+                if writer.encoder:
+                    writer.release()
                     time.sleep(0.1) # Pequeña espera para asegurar cierre
                 if os.path.exists(writer.output_path):
                     os.remove(writer.output_path)
@@ -239,6 +360,7 @@ class VideoProcessor:
                 print(f"Error eliminando archivo de cámara {camera_id}: {e}")
         
         self.current_writers.clear()
+        self._stop_encoder_processes()
         camera_manager.stop_recording_all()
         
         # Limpiar directorio temporal de la sesión
@@ -248,45 +370,28 @@ class VideoProcessor:
         return True
     
     def _recording_loop(self):
-        """Bucle principal de grabación"""
+        """Bucle principal de grabación
+
+        Cada cámara cambia de chunk en el primer frame que cruza el límite común:
+        el writer siguiente ya está abierto y el anterior se finaliza en segundo plano,
+        así que no se pierde ningún frame entre chunks.
+        """
         try:
             print("Iniciando bucle de grabación...", flush=True)
+            print(f"Chunks de {self.config.chunk_duration_seconds} segundos - cámaras disponibles: {list(camera_manager.cameras.keys())}")
+            idle_polls = 0
             while self.recording_active:
-                print(f"Nuevo ciclo de grabación - cámaras disponibles: {list(camera_manager.cameras.keys())}")
-
-                # Crear nuevos writers si es necesario
-                self._create_new_writers()
+                # Leer los frames que cada hilo de captura ha dejado en su buffer (los timestamps del SDK los emparejan)
+                written = self._write_pending_frames()
                 
-                start_time = time.time()
-                frames_written = {camera_id: 0 for camera_id in camera_manager.cameras} # Cada id de cámara tendrá asignado el cero al principio, y conforme cree frames, se irán aumentando
-                
-                # Grabar durante la duración del chunk
-                print(f"Iniciando grabación de chunk de {self.config.chunk_duration_seconds} segundos...")
-                frame_count = 0
-                while (time.time() - start_time) < self.config.chunk_duration_seconds and self.recording_active:
-                    # Capturar frames de todas las cámaras (sincronización por software)
-                    
-                    for camera_id in camera_manager.cameras:
-                        frame = camera_manager.get_frame(camera_id)
-                        if frame is not None and camera_id in self.current_writers:
-                            if self.current_writers[camera_id].write_frame(frame):
-                                frames_written[camera_id] += 1
-                        elif frame is None:
-                            if frame_count % 30 == 0:  # Log cada segundo aproximadamente
-                                print(f"Cámara {camera_id}: No se pudo obtener frame")
-
-                    frame_count += 1
-                
-                elapsed = time.time() - start_time
-                print(f"Chunk completado en {elapsed:.2f}s - Frames escritos por cámara: {frames_written}")
-                
-                # Finalizar chunk actual y crear el siguiente
-                if self.recording_active:
-                    print("Finalizando chunks actuales...")
-                    self._finalize_current_chunks()
-                    print(f"Estado después de finalizar - chunk_sequence: {self.chunk_sequence}")
+                if not any(written.values()):
+                    # Ninguna cámara tiene frames nuevos: esperar en lugar de girar en vacío
+                    idle_polls += 1
+                    if idle_polls % 200 == 0:  # Log cada segundo aproximadamente
+                        print(f"Sin frames nuevos de las cámaras desde hace {idle_polls * self.POLL_INTERVAL:.1f}s")
+                    time.sleep(self.POLL_INTERVAL)
                 else:
-                    print("Grabación detenida, no se creará siguiente chunk")
+                    idle_polls = 0
 
         except Exception as e:
             print(f"Error en bucle de grabación: {e}")
@@ -296,87 +401,271 @@ class VideoProcessor:
             print("Bucle de grabación terminado")
             self.recording_active = False
     
-    def _create_new_writers(self):
-        """Crear nuevos writers para el siguiente chunk"""
-        print(f"Creando writers para cámaras: {list(camera_manager.cameras.keys())}")
+    def _write_pending_frames(self) -> Dict[int, int]:
+        """Escribir en los writers los frames nuevos de cada cámara. Retorna frames escritos por cámara"""
+        written = {}
+        for camera_id in list(camera_manager.cameras):
+            last_index = self.frame_cursors.get(camera_id, camera_manager.get_latest_frame_index(camera_id))
+            frames = camera_manager.read_frames(camera_id, last_index)
+            self.synchronizer.add_frames(camera_id, frames)
+            count = 0
+            pacer = self.pacers.get(camera_id)
+            if pacer is not None:
+                # Ritmo constante: cada slot de la rejilla recibe un frame (duplicado o elegido entre varios)
+                for captured in frames:
+                    self.frame_cursors[camera_id] = captured.index
+                    for slot, frame, duplicate in pacer.push(captured):
+                        if self._write_paced_frame(camera_id, slot, frame, duplicate):
+                            count += 1
+                dropped = pacer.take_dropped()
+                writer = self.current_writers.get(camera_id)
+                if dropped and writer is not None:
+                    writer.frames_dropped += dropped
+                written[camera_id] = count
+                continue
+            for captured in frames:
+                self.frame_cursors[camera_id] = captured.index
+                # El frame que cruza el límite abre el siguiente chunk: cada chunk empieza en el frame siguiente al anterior
+                deadline = self.chunk_deadlines.get(camera_id)
+                if deadline is None or captured.timestamp >= deadline:
+                    self._rotate_writer(camera_id, captured.timestamp)
+                writer = self.current_writers.get(camera_id)
+                if writer is not None and writer.write_frame(captured.image, captured.pixel_format, captured.timestamp,
+                                                             captured.index, captured.device_timestamp_us):
+                    camera_manager.check_frame(camera_id, captured)
+                    count += 1
+            written[camera_id] = count
+        self.synchronizer.match()
+        return written
+    
+    def _write_paced_frame(self, camera_id: int, slot: int, frame, duplicate: bool) -> bool:
+        """Escribir el frame de un slot de la rejilla; los chunks cambian cada chunk_duration_seconds * fps slots"""
+        if slot >= self.chunk_end_slots.get(camera_id, 0):
+            slots_per_chunk = max(1, round(self.config.chunk_duration_seconds * self.pacing_fps))
+            self._rotate_writer(camera_id, self.pacers[camera_id].slot_time(slot))
+            self.chunk_end_slots[camera_id] = (slot // slots_per_chunk + 1) * slots_per_chunk
+            duplicate = False  # Primer frame del chunk nuevo
+        writer = self.current_writers.get(camera_id)
+        if writer is None or not writer.write_frame(frame.image, frame.pixel_format, frame.timestamp,
+                                                    frame.index, frame.device_timestamp_us, duplicate):
+            return False
+        camera_manager.check_frame(camera_id, frame)
+        return True
+    
+    def _resolve_pacing_fps(self) -> int:
+        """FPS de la rejilla de ritmo constante (0 si está desactivado)"""
+        if self.config.pacing_policy == PACING_OFF:
+            return 0
+        if self.config.pacing_fps > 0:
+            return self.config.pacing_fps
+        return max((camera.get_real_fps() for camera in camera_manager.cameras.values()), default=0)
+    
+    def _rotate_writer(self, camera_id: int, timestamp: float) -> Optional[VideoWriter]:
+        """Pasar una cámara al siguiente chunk: el writer en curso se finaliza en segundo plano"""
+        previous = self.current_writers.pop(camera_id, None)
+        if previous is not None and self._finalize_executor is not None:
+            self._finalize_executor.submit(self._finalize_and_upload, camera_id, previous)
         
-        for camera_id in camera_manager.cameras:
-            if camera_id not in self.current_writers:
-                output_path = self._generate_chunk_path(camera_id)
-                print(f"Generando archivo para cámara {camera_id}: {output_path}")
-                
-                writer = VideoWriter(camera_id, output_path)
-                
-                # Obtener un frame para determinar dimensiones
-                frame = camera_manager.get_frame(camera_id)
-                if frame is not None:
-                    height, width = frame.shape[:2]
-                    # Obtener FPS real de la cámara
-                    fps = camera_manager.cameras[camera_id].get_real_fps()
-                    print(f"Inicializando writer para cámara {camera_id}: {width}x{height}@{fps}fps (FPS real)")
-                    
-                    if writer.initialize(width, height, fps):
-                        self.current_writers[camera_id] = writer
-                        print(f"Writer creado exitosamente para cámara {camera_id}")
-                    else:
-                        print(f"Error inicializando writer para cámara {camera_id}")
-                else:
-                    print(f"No se pudo obtener frame de prueba para cámara {camera_id}")
+        writer = self._take_next_writer(camera_id)
+        if writer is not None:
+            self.current_writers[camera_id] = writer
         
-        print(f"Writers activos: {list(self.current_writers.keys())}")
+        # Siguiente límite común a todas las cámaras (aunque esta cámara se haya saltado alguno)
+        duration = self.config.chunk_duration_seconds
+        elapsed = max(0.0, timestamp - self.recording_start_time)
+        self.chunk_deadlines[camera_id] = self.recording_start_time + (int(elapsed // duration) + 1) * duration
+        
+        # Abrir ya el writer del chunk siguiente, fuera del camino de captura
+        self._prepare_next_writer(camera_id)
+        return writer
+    
+    def _next_sequence_number(self, camera_id: int) -> int:
+        """Reservar el siguiente número de secuencia de una cámara"""
+        sequence_number = self.chunk_sequence.get(camera_id, 0)
+        self.chunk_sequence[camera_id] = sequence_number + 1
+        return sequence_number
     
-    def _finalize_current_chunks(self):
-        """Finalizar chunks actuales y enviarlos"""
-        chunks_to_upload = []
+    def _prepare_next_writer(self, camera_id: int):
+        """Abrir en segundo plano el writer del siguiente chunk de una cámara"""
+        if camera_id in self.next_writers or self._writer_executor is None:
+            return
+        sequence_number = self._next_sequence_number(camera_id)
+        future = self._writer_executor.submit(self._open_writer, camera_id, sequence_number)
+        self.next_writers[camera_id] = (sequence_number, future)
+    
+    def _take_next_writer(self, camera_id: int) -> Optional[VideoWriter]:
+        """Obtener el writer preparado para el siguiente chunk (o abrirlo ahora si no lo hay)"""
+        prepared = self.next_writers.pop(camera_id, None)
+        if prepared is not None:
+            sequence_number, future = prepared
+            try:
+                writer = future.result(timeout=self.WRITER_OPEN_TIMEOUT)
+                if writer is not None:
+                    return writer
+            except Exception as e:
+                print(f"Cámara {camera_id}: El writer preparado no está disponible: {e}")
+        else:
+            sequence_number = self._next_sequence_number(camera_id)
+        # Primer chunk o fallo del writer preparado: abrirlo de forma síncrona
+        return self._open_writer(camera_id, sequence_number)
+    
+    def _open_writer(self, camera_id: int, sequence_number: int) -> Optional[VideoWriter]:
+        """Crear e inicializar el writer de un chunk, sin consumir frames de la cámara"""
+        camera = camera_manager.cameras.get(camera_id)
+        if camera is None:
+            return None
         
-        for camera_id, writer in list(self.current_writers.items()):
-            chunk = self._finalize_writer(camera_id, writer)
-            if chunk:
-                chunks_to_upload.append(chunk)
+        frame_size = camera.get_frame_size()
+        pixel_format = camera.get_pixel_format()
+        if frame_size is None or pixel_format is None:
+            print(f"Cámara {camera_id}: Sin frames capturados, no se puede crear el writer")
+            return None
         
-        self.current_writers.clear()
+        width, height = frame_size
+        fps = self.pacing_fps or camera.get_real_fps()  # Rejilla común o FPS real de la cámara
+        output_path = self._generate_chunk_path(camera_id, sequence_number)
+        print(f"Inicializando writer para cámara {camera_id}: {width}x{height}@{fps}fps "
+              f"({'ritmo constante' if self.pacing_fps else 'FPS real'}, {pixel_format})")
+        
+        # Con el almacén local casi lleno (política "lower_bitrate") los chunks nuevos se codifican con más CRF
+        recording_config = self.config
+        crf_offset = upload_manager.storage.crf_offset()
+        if crf_offset:
+            recording_config = replace(self.config, h264_crf=self.config.h264_crf + crf_offset)
+            print(f"Cámara {camera_id}: Almacenamiento local casi lleno, grabando con CRF {recording_config.h264_crf}")
+        
+        encoder_factory = self._get_encoder_factory(camera_id, width, height, recording_config)
+        writer = VideoWriter(camera_id, output_path, encoder_factory, sequence_number, paced=bool(self.pacing_fps))
+        if writer.initialize(width, height, fps, pixel_format):
+            return writer
+        print(f"Error inicializando writer para cámara {camera_id}")
+        return None
+    
+    def _discard_next_writers(self):
+        """Cerrar y borrar los writers preparados que no llegaron a usarse"""
+        for camera_id, (sequence_number, future) in list(self.next_writers.items()):
+            try:
+                writer = future.result(timeout=self.WRITER_OPEN_TIMEOUT)
+                if writer is not None:
+                    writer.release()
+                    if os.path.exists(writer.output_path):
+                        os.remove(writer.output_path)
+            except Exception as e:
+                print(f"Error descartando writer preparado de cámara {camera_id}: {e}")
+        self.next_writers.clear()
+    
+    def _shutdown_executors(self):
+        """Esperar a que terminen las aperturas y finalizaciones en segundo plano"""
+        for executor in (self._writer_executor, self._finalize_executor):
+            if executor is not None:
+                executor.shutdown(wait=True)
+        self._writer_executor = None
+        self._finalize_executor = None
+    
+    def _get_encoder_factory(self, camera_id: int, width: int, height: int,
+                             recording_config: RecordingConfig) -> Callable[[Optional[str]], VideoEncoder]:
+        """Fábrica de encoders para una cámara según RecordingConfig.encoder_mode
+
+        En modo "process" reutiliza (o arranca) el proceso codificador de la cámara.
+        Si no se puede arrancar, se codifica en el hilo de grabación.
+        """
+        local_factory = lambda backend: create_encoder(recording_config, backend)
+        if self.config.encoder_mode != "process":
+            return local_factory
         
-        # Enviar chunks en paralelo
-        for chunk in chunks_to_upload:
-            threading.Thread(target=self._upload_chunk, args=(chunk,), daemon=True).start()
+        frame_bytes = width * height * 3
+        with self._encoder_processes_lock:
+            encoder_process = self.encoder_processes.get(camera_id)
+            if encoder_process is not None and (not encoder_process.is_alive() or encoder_process.slot_bytes < frame_bytes):
+                self._count_frames(camera_id, 'encoder_dropped', encoder_process.frames_dropped)
+                encoder_process.stop()
+                encoder_process = None
+            if encoder_process is None:
+                encoder_process = EncoderProcess(camera_id, frame_bytes, self.config)
+                if not encoder_process.start():
+                    print(f"Cámara {camera_id}: Codificando en el hilo de grabación")
+                    return local_factory
+                self.encoder_processes[camera_id] = encoder_process
+        # Con ritmo constante el proceso no puede descartar frames: cada slot de la rejilla llega al archivo
+        blocking = bool(self.pacing_fps)
+        return lambda backend: encoder_process.create_encoder(backend, recording_config.h264_crf, blocking)
+    
+    def _stop_encoder_processes(self):
+        """Detener los procesos codificadores (modo "process")"""
+        with self._encoder_processes_lock:
+            for camera_id, encoder_process in list(self.encoder_processes.items()):
+                if encoder_process.frames_dropped:
+                    print(f"Cámara {camera_id}: {encoder_process.frames_dropped} frames descartados por el proceso codificador saturado")
+                    self._count_frames(camera_id, 'encoder_dropped', encoder_process.frames_dropped)
+                if encoder_process.slot_wait_seconds >= 0.1:
+                    print(f"Cámara {camera_id}: La grabación esperó {encoder_process.slot_wait_seconds:.1f}s "
+                          f"a que el proceso codificador liberase slots")
+                encoder_process.stop()
+            self.encoder_processes.clear()
+    
+    def _finalize_and_upload(self, camera_id: int, writer: VideoWriter):
+        """Finalizar un chunk en segundo plano y pasarlo a los callbacks de envío (en orden de finalización)"""
+        chunk = self._finalize_writer(camera_id, writer)
+        if chunk:
+            self._upload_chunk(chunk)
     
     def _finalize_writer(self, camera_id: int, writer: VideoWriter) -> Optional[VideoChunk]:
         """Finalizar un writer específico"""
-        chunk = writer.finalize()
+        with CHUNK_FINALIZE_SECONDS.time(camera_id):
+            chunk = writer.finalize()
         if chunk:
             chunk.session_id = self.session_id
             chunk.patient_id = self.patient_id
-            chunk.sequence_number = self.chunk_sequence[camera_id]
-            # Incrementar DESPUÉS de asignar el número al chunk
-            self.chunk_sequence[camera_id] += 1
+            # Verificar que el chunk empieza justo después del anterior de la misma cámara
+            # (con ritmo constante el primer frame puede repetir el último del anterior o saltar uno descartado)
+            previous_last = self.last_chunk_frame.get(camera_id)
+            if writer.paced:
+                expected = previous_last is None or previous_last <= chunk.first_frame_index <= previous_last + 1 + chunk.frames_dropped
+            else:
+                expected = previous_last is None or chunk.first_frame_index == previous_last + 1
+            if not expected:
+                print(f"Cámara {camera_id}: Discontinuidad entre chunks - el anterior terminó en el frame "
+                      f"{previous_last} y el chunk {chunk.sequence_number} empieza en {chunk.first_frame_index}")
+            if chunk.frame_count:
+                self.last_chunk_frame[camera_id] = chunk.last_frame_index
+            self._count_frames(camera_id, 'paced_duplicated', chunk.frames_duplicated)
+            self._count_frames(camera_id, 'paced_dropped', chunk.frames_dropped)
         
         return chunk
     
+    def _count_frames(self, camera_id: int, key: str, count: int):
+        totals = self.frame_totals.setdefault(camera_id, {'paced_duplicated': 0, 'paced_dropped': 0, 'encoder_dropped': 0})
+        totals[key] += count
+    
+    def get_frame_totals(self) -> Dict[int, Dict[str, int]]:
+        """Frames duplicados y descartados por cámara (ritmo constante y proceso codificador saturado)"""
+        totals = {camera_id: dict(counts) for camera_id, counts in self.frame_totals.items()}
+        with self._encoder_processes_lock:
+            for camera_id, encoder_process in self.encoder_processes.items():
+                # Proceso en marcha: aún no sumado a los totales
+                counts = totals.setdefault(camera_id, {'paced_duplicated': 0, 'paced_dropped': 0, 'encoder_dropped': 0})
+                counts['encoder_dropped'] += encoder_process.frames_dropped
+        return totals
+    
     def _upload_chunk(self, chunk: VideoChunk):
-        """Subir chunk al servidor (placeholder)"""
+        """Entregar el chunk a los callbacks de envío (p. ej. la cola de upload_manager)"""
         try:
             # Llamar callbacks registrados
             for callback in self.upload_callbacks:
                 callback(chunk)
                 
-            print(f"Chunk enviado: Cámara {chunk.camera_id}, Secuencia {chunk.sequence_number}")
+            print(f"Chunk entregado para envío: Cámara {chunk.camera_id}, Secuencia {chunk.sequence_number}")
             
         except Exception as e:
             print(f"Error enviando chunk: {e}")
     
-    def _generate_chunk_path(self, camera_id: int) -> str:
+    def _generate_chunk_path(self, camera_id: int, sequence_number: int) -> str:
         """Generar ruta para un nuevo chunk"""
         camera_dir = os.path.join(SystemConfig.TEMP_VIDEO_DIR, f"camera{camera_id}")
         
         # Crear directorio de cámara si no existe
         os.makedirs(camera_dir, exist_ok=True)
         
-        # Obtener el número de secuencia para esta cámara
-        # Asegurar que la cámara tenga una entrada en chunk_sequence
-        if camera_id not in self.chunk_sequence:
-            self.chunk_sequence[camera_id] = 0
-        
-        sequence_number = self.chunk_sequence[camera_id]
         filename = f"{sequence_number}.mp4"
         
         print(f"Generando chunk para cámara {camera_id}: secuencia {sequence_number} → {filename}")
@@ -397,9 +686,13 @@ class VideoProcessor:
             print(f"Error eliminando directorios de cámaras: {e}")
     
     def _cleanup_camera_directories(self): # Se emplea en start_session de VideoProcessor
-        """Limpiar todos los directorios de cámaras existentes"""
+        """Limpiar todos los directorios de cámaras existentes
+
+        Los chunks que el servidor aún no ha confirmado se mueven antes a PENDING_VIDEO_DIR.
+        """
         try:
             import shutil
+            upload_manager.preserve_pending_files(SystemConfig.TEMP_VIDEO_DIR)
             # Buscar y eliminar todos los directorios camera0, camera1, camera2, etc.
             for i in range(SystemConfig.MAX_CAMERAS):
                 camera_dir = os.path.join(SystemConfig.TEMP_VIDEO_DIR, f"camera{i}")
@@ -409,6 +702,10 @@ class VideoProcessor:
         except Exception as e:
             print(f"Error limpiando directorios de cámaras: {e}")
     
+    def get_sync_stats(self) -> dict:
+        """Error de sincronización entre cámaras de la grabación en curso (o de la última)"""
+        return self.synchronizer.get_stats()
+    
     def add_upload_callback(self, callback: Callable[[VideoChunk], None]):
         """Añadir callback para cuando se genere un chunk"""
         self.upload_callbacks.append(callback)
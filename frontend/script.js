@@ -10,6 +10,8 @@ document.addEventListener('DOMContentLoaded', () => {
         const recordingControls = document.getElementById('recording-controls');
         const patientIdInput = document.getElementById('patient-id');
         const sessionIdInput = document.getElementById('session-id');
+        const previewGrid = document.getElementById('preview-grid');
+        const finalizeStatus = document.getElementById('finalize-status');
         
         // Verificar que todos los elementos existan
         console.log(' Verificando elementos del DOM:');
@@ -27,7 +29,11 @@ document.addEventListener('DOMContentLoaded', () => {
         isRecording: false,
         sessionId: null,
         patientId: null,
-        statusPollingInterval: null //--- Esto es para comprobar periódicamente si han fallado las cámaras
+        statusPollingInterval: null, //--- Esto es para comprobar periódicamente si han fallado las cámaras (solo sin canal de eventos)
+        eventSource: null,
+        eventsConnected: false,
+        finalizeJobId: null, // Sesión que se termina de enviar en segundo plano
+        finalizePollingInterval: null
     };
 
     // --- API Endpoints ---
@@ -38,9 +44,17 @@ document.addEventListener('DOMContentLoaded', () => {
         startRecording: '/api/recording/start',
         stopRecording: '/api/recording/stop',
         cancelRecording: '/api/recording/cancel',
-        recordingStatus: '/api/recording/status'
+        recordingStatus: '/api/recording/status',
+        events: '/api/events',
+        snapshot: (cameraId) => `/api/cameras/${cameraId}/snapshot`,
+        finalizeJob: (jobId) => `/api/recording/jobs/${jobId}`
     };
 
+    // --- Vista previa ---
+    const PREVIEW_REFRESH_MS = 200; // Pausa entre instantáneas (PreviewConfig.fps = 5)
+    const PREVIEW_RETRY_MS = 3000;
+    const PREVIEW_HIDDEN_RETRY_MS = 1000;
+
     // --- Log de ayuda ---
     
     function showMessage(message, type = 'info') {
@@ -57,14 +71,156 @@ document.addEventListener('DOMContentLoaded', () => {
         patientIdInput.disabled = isRecording;
         sessionIdInput.disabled = isRecording;
         
-        // Iniciar/detener polling de estado
-        if (isRecording) {
+        // Iniciar/detener polling de estado (solo si no llegan eventos del servidor)
+        if (isRecording && !state.eventsConnected) {
             startStatusPolling();
         } else {
             stopStatusPolling();
         }
     }
 
+    /**
+     * Conectar al canal de eventos del servidor (Server-Sent Events)
+     * Mientras está conectado no hace falta el polling; si se cae, se vuelve al polling
+     * hasta que EventSource se reconecte por sí mismo.
+     */
+    function startEventStream() {
+        if (!window.EventSource) {
+            console.log('EventSource no disponible en este navegador: se usará polling');
+            return;
+        }
+        
+        const source = new EventSource(API.events);
+        state.eventSource = source;
+        
+        source.onopen = () => {
+            console.log('Canal de eventos conectado');
+            state.eventsConnected = true;
+            stopStatusPolling();
+        };
+        
+        source.onerror = () => {
+            if (state.eventsConnected) {
+                console.log('Canal de eventos no disponible, volviendo al polling');
+            }
+            state.eventsConnected = false;
+            if (state.isRecording) {
+                startStatusPolling();
+            }
+        };
+        
+        source.addEventListener('session_cancelled', (event) => {
+            const data = JSON.parse(event.data);
+            console.log('Sesión cancelada:', data);
+            if (data.reason === 'camera_failure') {
+                handleCameraFailure();
+            } else if (state.isRecording && data.session_id === state.sessionId) {
+                showMessage('La sesión fue cancelada', 'warning');
+                resetRecordingState();
+            }
+        });
+        
+        source.addEventListener('camera_stalled', (event) => {
+            const data = JSON.parse(event.data);
+            showMessage(`Cámara ${data.camera_id} sin frames desde hace ${data.last_frame_age_seconds}s`, 'warning');
+        });
+        
+        source.addEventListener('fps_update', (event) => {
+            const data = JSON.parse(event.data);
+            if (data.recording) {
+                console.log('FPS por cámara:', data.cameras);
+            }
+        });
+        
+        source.addEventListener('chunk_finalized', (event) => {
+            const data = JSON.parse(event.data);
+            console.log(`Chunk ${data.sequence_number} de cámara ${data.camera_id} finalizado (${data.frame_count} frames)`);
+        });
+        
+        source.addEventListener('chunk_uploaded', (event) => {
+            const data = JSON.parse(event.data);
+            console.log(`Chunk ${data.sequence_number} de cámara ${data.camera_id} enviado`);
+        });
+        
+        source.addEventListener('upload_failed', (event) => {
+            const data = JSON.parse(event.data);
+            showMessage(`Error enviando chunk ${data.sequence_number} de cámara ${data.camera_id}: ${data.error || data.status_code}`, 'error');
+        });
+        
+        source.addEventListener('finalize_progress', (event) => {
+            handleFinalizeProgress(JSON.parse(event.data));
+        });
+    }
+
+    /**
+     * Muestra el progreso de la finalización en segundo plano de una sesión
+     */
+    function handleFinalizeProgress(job) {
+        if (job.job_id !== state.finalizeJobId) {
+            return;
+        }
+        
+        const stages = {
+            stopping: 'cerrando los últimos chunks',
+            uploading: `${job.chunks_acked}/${job.chunks_total} chunks confirmados`,
+            waiting_for_server: 'servidor no disponible, los chunks esperan en disco',
+            notifying: 'cerrando la sesión en el servidor'
+        };
+        if (job.state === 'running') {
+            finalizeStatus.textContent = `Enviando sesión ${job.session_id}: ${stages[job.stage] || job.stage}`;
+            finalizeStatus.classList.remove('hidden');
+            return;
+        }
+        
+        stopFinalizePolling();
+        state.finalizeJobId = null;
+        if (job.state === 'completed') {
+            const failed = job.chunks_failed ? ` (${job.chunks_failed} rechazados)` : '';
+            finalizeStatus.textContent = `Sesión ${job.session_id} enviada: ${job.chunks_acked} chunks${failed}`;
+            showMessage(`Sesión ${job.session_id} finalizada en ${job.elapsed_seconds}s`, 'success');
+        } else if (job.state === 'cancelled') {
+            finalizeStatus.textContent = `Sesión ${job.session_id} cancelada`;
+        } else {
+            finalizeStatus.textContent = `Error finalizando la sesión ${job.session_id}: ${job.error}`;
+            showMessage(finalizeStatus.textContent, 'error');
+        }
+    }
+
+    /**
+     * Sin canal de eventos: consulta el trabajo de finalización cada 2 segundos
+     */
+    function startFinalizePolling() {
+        stopFinalizePolling();
+        refreshFinalizeJob(); // Por si terminó antes de conocer su job_id
+        state.finalizePollingInterval = setInterval(() => {
+            if (!state.eventsConnected) {
+                refreshFinalizeJob();
+            }
+        }, 2000);
+    }
+
+    async function refreshFinalizeJob() {
+        if (!state.finalizeJobId) {
+            return;
+        }
+        try {
+            const response = await fetch(API.finalizeJob(state.finalizeJobId));
+            if (response.ok) {
+                const data = await response.json();
+                handleFinalizeProgress(data.job);
+            }
+        } catch (error) {
+            console.error('Error consultando la finalización:', error);
+        }
+    }
+
+    function stopFinalizePolling() {
+        if (state.finalizePollingInterval) {
+            clearInterval(state.finalizePollingInterval);
+            state.finalizePollingInterval = null;
+        }
+    }
+
     /**
      * Iniciar verificación periódica del estado de grabación
      */
@@ -243,6 +399,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     const initData = await initResponse.json();
                     if (initData.success) {
                         showMessage(`${initData.total_initialized} cámaras inicializadas`);
+                        renderPreviews(initData.initialized_cameras);
                     }
                 }
             }
@@ -258,6 +415,43 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    /**
+     * Muestra la vista previa en vivo de las cámaras inicializadas
+     *
+     * Cada imagen pide la siguiente instantánea JPEG cuando termina de cargar la anterior. Con HTTP/1.1 el
+     * navegador abre como mucho 6 conexiones por host: un MJPEG por cámara más el canal de eventos las
+     * ocupaban todas y el resto de peticiones se quedaban esperando. Así solo queda abierta la de eventos.
+     */
+    function renderPreviews(cameraIds) {
+        const current = Array.from(previewGrid.querySelectorAll('img')).map(img => Number(img.dataset.cameraId));
+        if (current.join(',') === cameraIds.join(',')) {
+            return; // Mismas cámaras: las imágenes siguen conectadas
+        }
+        
+        previewGrid.innerHTML = ''; // Las imágenes retiradas dejan de pedir instantáneas
+        cameraIds.forEach(cameraId => {
+            const img = document.createElement('img');
+            img.className = 'camera-preview';
+            img.alt = `Cámara ${cameraId}`;
+            img.dataset.cameraId = cameraId;
+            const refresh = (delay) => setTimeout(() => {
+                if (!img.isConnected) {
+                    return;
+                }
+                if (document.hidden) {
+                    refresh(PREVIEW_HIDDEN_RETRY_MS); // Pestaña oculta: no pedir imágenes que nadie ve
+                    return;
+                }
+                img.src = `${API.snapshot(cameraId)}?t=${Date.now()}`;
+            }, delay);
+            img.onload = () => refresh(PREVIEW_REFRESH_MS);
+            // Sin instantánea (cámaras reinicializándose), reintentar en unos segundos
+            img.onerror = () => refresh(PREVIEW_RETRY_MS);
+            refresh(0);
+            previewGrid.appendChild(img);
+        });
+    }
+
     /**
      * Actualiza el estado de las cámaras en la UI
      */
@@ -322,6 +516,7 @@ document.addEventListener('DOMContentLoaded', () => {
             }
             
             console.log(`${initData.initialized_cameras.length} cámaras inicializadas para grabación`);
+            renderPreviews(initData.initialized_cameras);
             
             // 2. Iniciar grabación
             console.log('Enviando request a:', API.startRecording);
@@ -405,8 +600,11 @@ document.addEventListener('DOMContentLoaded', () => {
                 throw new Error(data.error || 'Error al finalizar grabación');
             }
             
-            showMessage(`Grabación finalizada. Chunks procesados: ${data.final_chunks_count || 0}`, 'success');
-            alert("¡Grabación finalizada y procesada con éxito!");
+            // El backend termina de cerrar y enviar la sesión en segundo plano
+            showMessage(`Grabación finalizada. Enviando la sesión ${data.session_id} en segundo plano`, 'success');
+            state.finalizeJobId = data.job_id;
+            handleFinalizeProgress(data.job);
+            startFinalizePolling();
             
             // Reset state usando la nueva función
             resetRecordingState();
@@ -491,6 +689,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // --- Inicialización ---
     showMessage('Cargando aplicación...');
+    startEventStream();
     initializeSystem();
     
     // Actualizar estado cada 30 segundos
@@ -502,6 +701,10 @@ document.addEventListener('DOMContentLoaded', () => {
     // Limpiar intervals al cerrar la página
     window.addEventListener('beforeunload', () => {
         stopStatusPolling();
+        stopFinalizePolling();
+        if (state.eventSource) {
+            state.eventSource.close();
+        }
     });
     
     } catch (error) {